@@ -11,6 +11,9 @@
 #define type 7
 #define numReadings 10
 
+// Set to 1 to send compact binary frames (see wire_protocol.py) instead of CSV lines
+#define BINARY_FRAMES 0
+
 // Bluetooth Serial
 SoftwareSerial bluetooth(9, 11); // RX, TX
 
@@ -22,6 +25,7 @@ DHT dht(A0, DHT11); // Using DHT11 sensor
 float heatIndexValues[numReadings];
 float airQualityIndexValues[numReadings];
 int currentIndex = 0;
+uint16_t frameSequence = 0;
 
 void setup() {
   Serial.begin(9600);
@@ -71,7 +75,11 @@ void loop() {
   }
 
   // Send data over Bluetooth
+#if BINARY_FRAMES
+  sendBluetoothFrame(temperatureC, humidity, coLevel, heatIndex, airQualityIndex, meanHeatIndex, stdDevHeatIndex, meanAQI, stdDevAQI);
+#else
   sendBluetoothData(temperatureC, humidity, coLevel, heatIndex, airQualityIndex, meanHeatIndex, stdDevHeatIndex, meanAQI, stdDevAQI);
+#endif
 
   // Print data to Serial Monitor
   printSerialData(temperatureC, humidity, coLevel, heatIndex, airQualityIndex);
@@ -132,6 +140,36 @@ void sendBluetoothData(float temperatureC, float humidity, float coLevel, float
   bluetooth.println(stdDevAQI);
 }
 
+// CRC-16/CCITT-FALSE, matching crc16() in wire_protocol.py
+uint16_t crc16(const uint8_t *data, size_t length) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Binary frame: 0xAA 0x55 | uint16 sequence | nine float32 fields | uint16 CRC, all little-endian
+void sendBluetoothFrame(float temperatureC, float humidity, float coLevel, float heatIndex, int airQualityIndex,
+                        float meanHeatIndex, float stdDevHeatIndex, float meanAQI, float stdDevAQI) {
+  float fields[9] = {temperatureC, humidity, coLevel, heatIndex, (float)airQualityIndex,
+                     meanHeatIndex, stdDevHeatIndex, meanAQI, stdDevAQI};
+  uint8_t frame[42];
+  frame[0] = 0xAA;
+  frame[1] = 0x55;
+  frame[2] = frameSequence & 0xFF;
+  frame[3] = frameSequence >> 8;
+  memcpy(&frame[4], fields, sizeof(fields));  // AVR floats are little-endian IEEE 754
+  uint16_t crc = crc16(&frame[2], 38);
+  frame[40] = crc & 0xFF;
+  frame[41] = crc >> 8;
+  bluetooth.write(frame, sizeof(frame));
+  frameSequence++;
+}
+
 void printSerialData(float temperatureC, float humidity, float coLevel, float heatIndex, int airQualityIndex) {
   Serial.print("Temperature: "); Serial.print(temperatureC); Serial.print(" C | ");
   Serial.print("Humidity: "); Serial.print(humidity); Serial.print(" % | ");
@@ -1,45 +1,531 @@
+import argparse
+import base64
+import json
 import os
 import io
+import csv
+import functools
+import importlib.machinery
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
 import dash
-from dash import dcc, html, Output, Input, callback, ctx
+from dash import dcc, html, Output, Input, State, callback, ctx, no_update
 from dash.dependencies import Input, Output
 import pandas as pd
-import sqlite3
 import plotly.graph_objs as go
 from dash import Dash, html, dcc, Input, Output
+from flask import Response, jsonify, request, stream_with_context
+from urllib.parse import urlencode
+import numpy as np
+from datetime import datetime, timedelta
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Arrow export is optional
+    pa = pq = None
+from sensor_db import (DB_PATH, COMMIT_NOTIFY_PORT, READING_COLUMNS, ROLLUPS, ROLLING_WINDOWS,
+                       ROLLING_STATS, archive_dir_for, connect_readonly, local_datetimes, select_resolution)
+from sensor_storage import (FRAME_COLUMNS, STORAGE_BACKEND, STORAGE_BACKENDS, MmapStorage, SQLiteStorage,
+                            storage_dir_for)
 
-# Function to convert Fahrenheit to Celsius
-def fahrenheit_to_celsius(fahrenheit):
-    return (fahrenheit - 32) / 1.8
-
-# Function to return the air quality threshold
-def air_quality_threshold():
-    return 50
-
-# Define thresholds for each sensor
-THRESHOLDS = {
-    'temperature': fahrenheit_to_celsius(100),
-    'humidity': 80,
-    'co_level': 200,
-    'heat_index': 45,
-    'air_quality_index': air_quality_threshold()
+from alerts import THRESHOLDS, ALARM_LEVEL, state_name
+import metrics
+import sensor_analytics
+from sensor_schema import ARROW_TYPES, FIELDS
+
+# Shared query result cache, reused by every callback and every open browser.
+# Entries are keyed by (query name, *parameters), with start/end in epoch milliseconds,
+# and dropped as soon as the database changes. Each holds a Future, so a query still running
+# is waited for rather than repeated, and the lock is only held to look entries up.
+# Least recently used entries are evicted beyond QUERY_CACHE_SIZE, since API bodies are cached per URL.
+QUERY_CACHE_SIZE = int(os.environ.get('SENSOR_DASHBOARD_QUERY_CACHE_SIZE', 256))
+_cache_lock = threading.Lock()
+_query_cache = OrderedDict()
+_cache_version = None
+_version_conn = None
+
+# Prometheus metrics served at /metrics. Callbacks slower than SLOW_CALLBACK_MS are also logged.
+SLOW_CALLBACK_MS = float(os.environ.get('SENSOR_DASHBOARD_SLOW_CALLBACK_MS', 500))
+CALLBACK_SECONDS = metrics.Histogram('sensor_dashboard_callback_seconds', "Dash callback execution time", ['callback'])
+QUERY_SECONDS = metrics.Histogram('sensor_dashboard_query_seconds',
+                                  "Storage query time on query cache misses", ['query'])
+metrics.Gauge('sensor_dashboard_query_cache_size', "Results held in the query cache", lambda: len(_query_cache))
+
+# Per-process pool of read-only connections shared by every callback and route.
+# Reusing them skips connection setup and keeps each connection's prepared statement cache warm.
+READ_POOL_SIZE = int(os.environ.get('SENSOR_DASHBOARD_POOL_SIZE', 8))
+_read_pool = queue.LifoQueue()
+_pool_pid = os.getpid()
+
+
+def _check_fork():
+    # SQLite connections must not be used across fork(), e.g. by gunicorn --preload workers
+    global _pool_pid, _read_pool, _version_conn
+    if os.getpid() != _pool_pid:
+        _pool_pid = os.getpid()
+        _read_pool = queue.LifoQueue()
+        _version_conn = None
+
+
+# Raw readings backend, chosen with SENSOR_STORAGE or --storage. Rollups and rolling statistics
+# always come from SQLite; the mmap backend's row count is part of data_version() as well.
+storage_backend = STORAGE_BACKEND
+_storage = None
+
+
+def storage():
+    global _storage
+    if _storage is None:
+        if storage_backend == 'mmap':
+            _storage = MmapStorage(storage_dir_for(DB_PATH))
+        else:
+            _storage = SQLiteStorage(read_connection, archive_dir_for(DB_PATH))
+    return _storage
+
+
+@contextmanager
+def read_connection():
+    """Borrow a read-only connection from the pool, opening one if none is idle."""
+    _check_fork()
+    try:
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        conn = connect_readonly(DB_PATH)
+    try:
+        yield conn
+    finally:
+        if _read_pool.qsize() < READ_POOL_SIZE:
+            _read_pool.put(conn)
+        else:
+            conn.close()
+
+
+def data_version():
+    """
+    Return SQLite's data_version for a long-lived connection.
+    The value changes whenever another connection (the ingest script) commits.
+    With the mmap backend it is paired with the committed row count, since the ingest script
+    publishes those rows only after its SQLite commit.
+    """
+    global _version_conn
+    _check_fork()
+    if _version_conn is None:
+        _version_conn = connect_readonly(DB_PATH)
+    version = _version_conn.execute("PRAGMA data_version").fetchone()[0]
+    if storage_backend == 'mmap':
+        return version, sum(storage().committed(device) for device in storage().devices())
+    return version
+
+
+def query_data(limit=50, start=None, end=None, devices=None):
+    """
+    Run the readings query against the storage backend, bypassing the cache.
+    Latest-N and range reads are index walks in SQLite (plus its archive when needed)
+    and array slices in the mmap backend. With devices given, the latest `limit` rows are read for each device so they can be overlaid.
+    """
+    if devices and len(devices) > 1:
+        frames = [query_data(limit, start, end, [device]) for device in devices]
+        return pd.concat(frames).sort_values(by='ts_ms')
+
+    df = storage().latest_n(limit, start, end, devices)
+
+    # Backends return rows oldest first for correct plotting
+    return df.rename(columns={'real_time': 'timestamp'})
+
+
+def compute_future(future, compute, cache, lock, key):
+    """
+    Run compute() for the caller that added future to cache, outside the lock, and hand its result
+    to everyone waiting on the future. A failure is passed on too, and the entry dropped for a retry.
+    """
+    try:
+        result = compute()
+    except BaseException as e:
+        with lock:
+            if cache.get(key) is future:
+                del cache[key]
+        future.set_exception(e)
+        raise
+    future.set_result(result)
+    return result
+
+
+def cached(key, compute):
+    """Return the cached result for key, computing it at most once per database change."""
+    global _cache_version
+    with _cache_lock:
+        version = data_version()
+        if version != _cache_version:
+            _query_cache.clear()
+            _cache_version = version
+        future = _query_cache.get(key)
+        waiting = future is not None
+        if waiting:
+            _query_cache.move_to_end(key)
+        else:
+            future = _query_cache[key] = Future()
+            while len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+    if waiting:
+        return future.result()
+
+    def timed_compute():
+        start = time.perf_counter()
+        result = compute()
+        QUERY_SECONDS.labels(key[0]).observe(time.perf_counter() - start)
+        return result
+    return compute_future(future, timed_compute, _query_cache, _cache_lock, key)
+
+
+# Fetch the latest data, sharing one query per database change across all callbacks.
+# The returned DataFrame is shared between callers and must not be modified in place.
+def fetch_data(limit=50, start=None, end=None, devices=None):
+    devices = tuple(sorted(devices)) if devices else None
+    return cached(('data', limit, start, end, devices), lambda: query_data(limit, start, end, devices))
+
+
+# A history query uses the coarsest resolution that still returns at least this many points
+HISTORY_MIN_POINTS = 500
+
+
+def query_history(table, start, end, devices=None):
+    """
+    Read [start, end] (epoch ms) from one resolution, oldest first.
+    Rollup rows carry ts_ms at the bucket start, per-column min/max/mean/last statistics,
+    and the mean under the plain column name so they plot like raw readings.
+    """
+    if table == 'sensor_readings':
+        df = storage().range(start, end, devices).drop(columns='real_time')
+        df['timestamp'] = local_timestamps(df['ts_ms'])
+        return df
+
+    df = storage().aggregate(start, end, ROLLUPS[table], devices)
+    for column in READING_COLUMNS:
+        df[column] = df[f"{column}_mean"]
+    df['timestamp'] = local_timestamps(df['ts_ms'])
+    return df
+
+
+# Convert epoch milliseconds to naive local datetimes, matching the real_time column across DST changes
+def local_timestamps(ts_ms):
+    return pd.Series(local_datetimes(ts_ms), index=ts_ms.index if isinstance(ts_ms, pd.Series) else None)
+
+
+# Convert a DatePickerRange selection to an inclusive [start, end] range in epoch milliseconds
+def date_range_ms(start_date, end_date):
+    start = datetime.fromisoformat(start_date[:10])
+    end = datetime.fromisoformat(end_date[:10]) + timedelta(days=1)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000) - 1
+
+
+# Points per trace the history view is reduced to, roughly one per horizontal pixel
+PIXEL_BUDGET = 1000
+
+RESOLUTION_LABELS = {
+    'sensor_readings': 'raw readings',
+    'sensor_readings_1m': '1 minute buckets',
+    'sensor_readings_1h': '1 hour buckets',
+    'sensor_readings_1d': '1 day buckets',
 }
 
-# Connect to the SQLite database and fetch the latest data
-def fetch_data(limit=50):
-    conn = sqlite3.connect(os.path.expanduser('~/SensorsReadings.db'))
-    query = f"SELECT * FROM sensor_readings ORDER BY real_time DESC LIMIT {limit}"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    
-    # Sort by timestamp for correct plotting
-    df = df.rename(columns={'real_time': 'timestamp'})
-    df = df.sort_values(by='timestamp')
+
+def history_series(df, table, column):
+    """
+    Return (ts_ms, values) arrays for one column of a fetch_history result.
+    Rollup buckets are expanded into their min and max so short excursions are not averaged away.
+    """
+    ts_ms = df['ts_ms'].to_numpy()
+    if table == 'sensor_readings':
+        return ts_ms, df[column].to_numpy()
+    half_bucket = ROLLUPS[table] // 2
+    x = np.column_stack([ts_ms, ts_ms + half_bucket]).ravel()
+    y = np.column_stack([df[f"{column}_min"].to_numpy(), df[f"{column}_max"].to_numpy()]).ravel()
+    return x, y
+
+
+def downsample_minmax(x, y, n_out):
+    """
+    Reduce a series to at most n_out points, keeping the minimum and maximum of each of n_out / 2
+    equal-count buckets in their original order. Fully vectorized.
+    """
+    n = len(y)
+    if n <= n_out:
+        return x, y
+    n_buckets = n_out // 2
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # Sorting by (bucket, value) puts each bucket's minimum first and maximum last in its slice
+    order = np.lexsort((y, bucket))
+    keep = np.unique(np.concatenate([order[edges[:-1]], order[edges[1:] - 1]]))
+    return x[keep], y[keep]
+
+
+# Fetch readings over a time range, automatically served from the 1 min / 1 h / 1 day rollups when
+# the range is long enough. Returns (table, DataFrame); the DataFrame is shared and read-only.
+def fetch_history(start, end, devices=None, min_points=HISTORY_MIN_POINTS):
+    devices = tuple(sorted(devices)) if devices else None
+    table = select_resolution(start, end, min_points)
+    df = cached(('history', table, start, end, devices), lambda: query_history(table, start, end, devices))
+    return table, df
+
+
+# List the device ids that have stored readings
+def fetch_devices():
+    return cached(('devices',), lambda: storage().devices())
+
+
+# Current state of every alert, i.e. the latest alert_events row per device and alert
+def query_alert_state(devices=None):
+    where = f"WHERE device_id IN ({', '.join('?' * len(devices))})" if devices else ""
+    with read_connection() as conn:
+        return pd.read_sql_query(f'''
+            SELECT * FROM alert_events
+            WHERE id IN (SELECT max(id) FROM alert_events {where} GROUP BY device_id, alert)
+        ''', conn, params=list(devices or []))
+
+
+def fetch_alert_state(devices=None):
+    devices = tuple(sorted(devices)) if devices else None
+    return cached(('alert-state', devices), lambda: query_alert_state(devices))
+
+
+# Most recent alert transitions, newest first
+def fetch_alert_history(devices=None, limit=20):
+    devices = tuple(sorted(devices)) if devices else None
+
+    def query_alert_history():
+        where = f"WHERE device_id IN ({', '.join('?' * len(devices))})" if devices else ""
+        with read_connection() as conn:
+            return pd.read_sql_query(f"SELECT * FROM alert_events {where} ORDER BY id DESC LIMIT ?",
+                                     conn, params=[*(devices or []), limit])
+    return cached(('alert-history', devices, limit), query_alert_history)
+
+
+# Heat index danger level of the selected devices as (level, label), worst device first.
+# The level is tracked by the ingest script's alert engine rather than re-derived here.
+def heat_index_danger_level(devices=None):
+    state = fetch_alert_state(devices)
+    danger = state[state['alert'] == 'heat_index_danger']
+    if danger.empty:
+        return 0, f"Heat Index Danger Level: {state_name('heat_index_danger', 0)}"
+    worst = danger.loc[danger['level'].idxmax()]
+    level = int(worst['level'])
+    label = f"Heat Index Danger Level: {worst['state']}"
+    if level >= ALARM_LEVEL:
+        label += " (Alarm)"
+    if len(danger) > 1 and level:
+        label += f" [{worst['device_id']}]"
+    return level, label
+
+
+# Latest rolling window statistics published by the ingest script, one row per device and column
+def fetch_rolling_stats(window_ms, devices=None):
+    devices = tuple(sorted(devices)) if devices else None
+
+    def query_rolling_stats():
+        where = f"AND device_id IN ({', '.join('?' * len(devices))})" if devices else ""
+        with read_connection() as conn:
+            return pd.read_sql_query(
+                f"SELECT * FROM rolling_stats WHERE window_ms = ? {where} ORDER BY device_id, column_name",
+                conn, params=[window_ms, *(devices or [])]
+            )
+    return cached(('rolling', window_ms, devices), query_rolling_stats)
+
+
+# Split readings into (device, legend suffix, rows) groups so several stations can be overlaid
+def device_groups(df):
+    groups = list(df.groupby('device_id'))
+    if len(groups) <= 1:
+        return [(device, "", group) for device, group in groups]
+    return [(device, f" [{device}]", group) for device, group in groups]
+
+
+# Maximum points kept per trace when graphs are extended in place
+MAX_POINTS = 50
+
+
+def new_rows(state, inputs, devices):
+    """
+    Return the rows a client has not seen yet (possibly empty), or None when its figure must be
+    rebuilt: first load, changed inputs, or a device that is not on the figure yet.
+    """
+    if not state or state.get('inputs') != inputs or ctx.triggered_id not in ('live-update', 'interval-fallback'):
+        return None
+    df = fetch_data(limit=MAX_POINTS, start=state['last_ts'] + 1, devices=devices)
+    known = state.get('devices')
+    if known is not None and not set(df['device_id']) <= set(known):
+        return None
     return df
 
+
+# Outputs of full figure rebuilds, shared by every client: keyed on (data version, callback, inputs),
+# so each figure is built once per database change however many browsers show it.
+# Least recently used entries are evicted beyond FIGURE_CACHE_SIZE.
+FIGURE_CACHE_SIZE = int(os.environ.get('SENSOR_DASHBOARD_FIGURE_CACHE_SIZE', 64))
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+figure_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def memoize_figure(callback, inputs, build):
+    """
+    Return build()'s callback outputs for these inputs at the current data version, building them
+    at most once. Figures are stored pre-serialized as plain JSON dicts, so cache hits skip both the
+    Plotly validation and the numpy/pandas encoding. Returned outputs are shared and must not be modified.
+    """
+    with _cache_lock:
+        key = (data_version(), callback, repr(inputs))
+    with _figure_cache_lock:
+        future = _figure_cache.get(key)
+        waiting = future is not None
+        if waiting:
+            _figure_cache.move_to_end(key)
+            figure_cache_stats['hits'] += 1
+        else:
+            figure_cache_stats['misses'] += 1
+            future = _figure_cache[key] = Future()
+            while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.popitem(last=False)
+                figure_cache_stats['evictions'] += 1
+    if waiting:
+        return future.result()
+    # Built outside the lock, so a slow figure only holds up the clients waiting for that same figure
+    return compute_future(future, lambda: tuple(json.loads(output.to_json()) if isinstance(output, go.Figure)
+                                                else output for output in build()),
+                          _figure_cache, _figure_cache_lock, key)
+
+
+def figure_cache_info():
+    with _figure_cache_lock:
+        lookups = figure_cache_stats['hits'] + figure_cache_stats['misses']
+        return dict(figure_cache_stats, size=len(_figure_cache), max_size=FIGURE_CACHE_SIZE,
+                    hit_rate=round(figure_cache_stats['hits'] / lookups, 4) if lookups else None)
+
+
+for _name in ('hits', 'misses', 'evictions'):
+    metrics.Gauge(f'sensor_dashboard_figure_cache_{_name}_total', f"Figure cache {_name}",
+                  lambda name=_name: figure_cache_stats[name], kind='counter')
+metrics.Gauge('sensor_dashboard_figure_cache_size', "Figures held in the figure cache", lambda: len(_figure_cache))
+
+
+def timed_callback(function):
+    """Record a callback's execution time, logging calls slower than SLOW_CALLBACK_MS."""
+    histogram = CALLBACK_SECONDS.labels(function.__name__)
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            histogram.observe(elapsed)
+            if elapsed * 1000 >= SLOW_CALLBACK_MS:
+                print(f"Slow callback {function.__name__}: {elapsed * 1000:.0f} ms "
+                      f"(triggered by {ctx.triggered_id}, inputs {repr(args)[:200]})")
+    return wrapper
+
 # Initialize the Dash app
 app = dash.Dash(__name__)
 
+# Browsers connected to /events, each with a one-slot queue holding the newest commit
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_listener_started = False
+
+
+def publish_commit(version):
+    """Fan a commit out to every subscriber."""
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for events in subscribers:
+        # Clients only need the latest version, so a pending older one is replaced
+        try:
+            events.get_nowait()
+        except queue.Empty:
+            pass
+        events.put_nowait(version)
+
+
+def listen_for_commits():
+    """Receive commit notifications from the ingest script and fan them out to every subscriber."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.bind(('127.0.0.1', COMMIT_NOTIFY_PORT))
+    except OSError as e:
+        # Typically another worker process already owns the port
+        print(f"Commit notifications unavailable ({e}), watching the database instead.")
+        poll_for_commits()
+        return
+    while True:
+        publish_commit(sock.recv(64).decode())
+
+
+def poll_for_commits(interval=0.5):
+    """Publish a commit whenever the database's data_version changes."""
+    last = None
+    while True:
+        with _cache_lock:
+            version = data_version()
+        if last is not None and version != last:
+            publish_commit(str(int(time.time() * 1000)))
+        last = version
+        time.sleep(interval)
+
+
+def start_commit_listener():
+    # Started on the first /events request so only the serving process binds the port
+    global _listener_started
+    with _subscribers_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+    threading.Thread(target=listen_for_commits, daemon=True).start()
+
+
+# Server-sent events endpoint: pushes the ts_ms of every commit so idle clients never poll
+@app.server.route('/events')
+def live_events():
+    start_commit_listener()
+    events = queue.Queue(maxsize=1)
+
+    def stream():
+        with _subscribers_lock:
+            _subscribers.add(events)
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    version = events.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"  # Lets the server notice closed connections
+                    continue
+                yield f"data: {version}\n\n"
+        finally:
+            with _subscribers_lock:
+                _subscribers.discard(events)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Figure cache size and hit rate, as JSON
+@app.server.route('/figure-cache')
+def figure_cache():
+    return jsonify(figure_cache_info())
+
+
+# Prometheus metrics of this dashboard process
+@app.server.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # App layout
 app.layout = html.Div(
     style={'backgroundColor': 'black', 'padding': '20px', 'fontFamily': 'Arial, sans-serif'},
@@ -53,6 +539,36 @@ app.layout = html.Div(
             style={'padding': '10px', 'borderBottom': '1px solid cyan'}
         ),
 
+        # Live updates: assets/live_updates.js writes each commit pushed over /events into live-update.
+        # The slow fallback interval is disabled while the event stream is connected.
+        dcc.Store(id='live-update'),
+        dcc.Interval(id='interval-fallback', interval=60 * 1000, n_intervals=0),
+
+        # Device filter shared by all tabs; empty means every device
+        html.Div(
+            [
+                html.Label(
+                    "Devices:",
+                    style={'color': 'white', 'display': 'inline-block', 'width': '150px'}
+                ),
+                dcc.Dropdown(
+                    id='device-dropdown',
+                    multi=True,
+                    placeholder='All devices',
+                    style={
+                        'backgroundColor': '#505357',
+                        'color': 'black',
+                        'border': '1px solid cyan',
+                        'borderRadius': '5px',
+                        'width': '300px',
+                        'display': 'inline-block',
+                        'verticalAlign': 'middle'
+                    }
+                )
+            ],
+            style={'textAlign': 'center', 'margin': '20px 0'}
+        ),
+
         # Tabs for different sections
         dcc.Tabs(
             style={
@@ -75,7 +591,7 @@ app.layout = html.Div(
                                     style={'color': 'white', 'textAlign': 'center', 'marginTop': '10px'}
                                 ),
                                 html.P(
-                                    "Select a sensor to view live data as a line graph, with real-time updates every 10 seconds.",
+                                    "Select a sensor to view live data as a line graph, updated live as readings arrive.",
                                     style={'color': 'grey', 'textAlign': 'center'}
                                 ),
                                 html.Div(
@@ -86,7 +602,8 @@ app.layout = html.Div(
                                         ),
                                         dcc.Dropdown(
                                             id='sensor-dropdown',
-                                            options=[{'label': sensor.capitalize(), 'value': sensor} for sensor in THRESHOLDS.keys()],
+                                            options=[{'label': f"{field.title} ({field.unit})", 'value': field.name}
+                                                     for field in FIELDS if field.name in THRESHOLDS],
                                             value='temperature',
                                             style={
                                                 'backgroundColor': '#505357',  # Dropdown background
@@ -108,11 +625,8 @@ app.layout = html.Div(
                                         'borderRadius': '10px'
                                     }
                                 ),
-                                dcc.Interval(
-                                    id='interval-line-graphs',
-                                    interval=10 * 1000,
-                                    n_intervals=0
-                                ),
+                                # Last reading this client has drawn
+                                dcc.Store(id='line-graphs-state'),
                                 html.Div(
                                     id='line-real-time',
                                     style={'fontSize': '18px', 'fontWeight': 'bold', 'color': 'cyan', 'textAlign': 'center', 'marginTop': '10px'}
@@ -124,19 +638,22 @@ app.layout = html.Div(
                                 # Download button for Line Graphs tab
                                 html.Div(
                                     [
-                                        html.Button(
-                                            "Download CSV",
-                                            id='download-button-line-graphs',
-                                            style={
-                                                'color': 'black',
-                                                'backgroundColor': 'cyan',
-                                                'borderRadius': '5px',
-                                                'padding': '10px',
-                                                'border': 'none',
-                                                'cursor': 'pointer'
-                                            }
-                                        ),
-                                        dcc.Download(id='download-dataframe-csv-line-graphs')
+                                        html.A(
+                                            html.Button(
+                                                "Download CSV",
+                                                id='download-button-line-graphs',
+                                                style={
+                                                    'color': 'black',
+                                                    'backgroundColor': 'cyan',
+                                                    'borderRadius': '5px',
+                                                    'padding': '10px',
+                                                    'border': 'none',
+                                                    'cursor': 'pointer'
+                                                }
+                                            ),
+                                            id='export-link-line-graphs',
+                                            href='/export'
+                                        )
                                     ],
                                     style={'position': 'absolute', 'top': '20px', 'right': '20px'}
                                 )
@@ -158,7 +675,7 @@ app.layout = html.Div(
                                     style={'color': 'white', 'textAlign': 'center', 'marginTop': '10px'}
                                 ),
                                 html.P(
-                                    "Displays bar graphs of current sensor readings with thresholds, updated every 10 seconds.",
+                                    "Displays bar graphs of current sensor readings with thresholds, updated live as readings arrive.",
                                     style={'color': 'grey', 'textAlign': 'center'}
                                 ),
                                 dcc.Graph(
@@ -169,11 +686,8 @@ app.layout = html.Div(
                                         'borderRadius': '10px'
                                     }
                                 ),
-                                dcc.Interval(
-                                    id='interval-instantaneous-readings',
-                                    interval=10 * 1000,
-                                    n_intervals=0
-                                ),
+                                # Last reading this client has drawn
+                                dcc.Store(id='instantaneous-readings-state'),
                                 html.Div(
                                     id='instantaneous-real-time',
                                     style={'fontSize': '18px', 'fontWeight': 'bold', 'color': 'cyan', 'textAlign': 'center', 'marginTop': '10px'}
@@ -182,22 +696,37 @@ app.layout = html.Div(
                                     id='instantaneous-heat-index-danger-label',
                                     style={'fontSize': '16px', 'fontWeight': 'bold', 'color': 'red', 'textAlign': 'center', 'marginTop': '10px'}
                                 ),
+                                # Rolling statistics maintained by the ingest script
+                                dcc.RadioItems(
+                                    id='rolling-window',
+                                    options=[{'label': f" {name}", 'value': width} for name, width in ROLLING_WINDOWS.items()],
+                                    value=ROLLING_WINDOWS['15m'],
+                                    inline=True,
+                                    style={'color': 'white', 'textAlign': 'center', 'marginTop': '20px'},
+                                    inputStyle={'marginLeft': '15px'}
+                                ),
+                                html.Div(id='rolling-stats-table', style={'marginTop': '10px'}),
+                                # Recent alert transitions recorded by the ingest script
+                                html.Div(id='alert-history', style={'marginTop': '20px'}),
                                 # Download button for Instantaneous Readings tab
                                 html.Div(
                                     [
-                                        html.Button(
-                                            "Download CSV",
-                                            id='download-button-instantaneous-readings',
-                                            style={
-                                                'color': 'black',
-                                                'backgroundColor': 'cyan',
-                                                'borderRadius': '5px',
-                                                'padding': '10px',
-                                                'border': 'none',
-                                                'cursor': 'pointer'
-                                            }
-                                        ),
-                                        dcc.Download(id='download-dataframe-csv-instantaneous-readings')
+                                        html.A(
+                                            html.Button(
+                                                "Download CSV",
+                                                id='download-button-instantaneous-readings',
+                                                style={
+                                                    'color': 'black',
+                                                    'backgroundColor': 'cyan',
+                                                    'borderRadius': '5px',
+                                                    'padding': '10px',
+                                                    'border': 'none',
+                                                    'cursor': 'pointer'
+                                                }
+                                            ),
+                                            id='export-link-instantaneous-readings',
+                                            href='/export'
+                                        )
                                     ],
                                     style={'position': 'absolute', 'top': '20px', 'right': '20px'}
                                 )
@@ -222,6 +751,21 @@ app.layout = html.Div(
                                     "Displays all collected sensor data in a multi-line graph, showing historical trends for each sensor.",
                                     style={'color': 'grey', 'textAlign': 'center'}
                                 ),
+                                html.Div(
+                                    [
+                                        html.Label(
+                                            "Date Range:",
+                                            style={'color': 'white', 'display': 'inline-block', 'width': '150px'}
+                                        ),
+                                        # Leave empty for the live view of the latest readings
+                                        dcc.DatePickerRange(
+                                            id='all-data-range',
+                                            clearable=True,
+                                            display_format='YYYY-MM-DD'
+                                        )
+                                    ],
+                                    style={'textAlign': 'center', 'marginBottom': '20px'}
+                                ),
                                 dcc.Graph(
                                     id='all-data-graphs',
                                     style={
@@ -230,11 +774,8 @@ app.layout = html.Div(
                                         'borderRadius': '10px'
                                     }
                                 ),
-                                dcc.Interval(
-                                    id='interval-all-data-graphs',
-                                    interval=10 * 1000,
-                                    n_intervals=0
-                                ),
+                                # Last reading this client has drawn
+                                dcc.Store(id='all-data-graphs-state'),
                                 html.Div(
                                     id='all-real-time',
                                     style={'fontSize': '18px', 'fontWeight': 'bold', 'color': 'cyan', 'textAlign': 'center', 'marginTop': '10px'}
@@ -246,19 +787,39 @@ app.layout = html.Div(
                                 # Download button for All Data Collected tab
                                 html.Div(
                                     [
-                                        html.Button(
-                                            "Download CSV",
-                                            id='download-button-all-data-collected',
-                                            style={
-                                                'color': 'black',
-                                                'backgroundColor': 'cyan',
-                                                'borderRadius': '5px',
-                                                'padding': '10px',
-                                                'border': 'none',
-                                                'cursor': 'pointer'
-                                            }
+                                        html.A(
+                                            html.Button(
+                                                "Download CSV",
+                                                id='download-button-all-data-collected',
+                                                style={
+                                                    'color': 'black',
+                                                    'backgroundColor': 'cyan',
+                                                    'borderRadius': '5px',
+                                                    'padding': '10px',
+                                                    'border': 'none',
+                                                    'cursor': 'pointer'
+                                                }
+                                            ),
+                                            id='export-link-all-data-collected',
+                                            href='/export'
                                         ),
-                                        dcc.Download(id='download-dataframe-csv-all-data-collected')
+                                        html.A(
+                                            html.Button(
+                                                "Download Parquet",
+                                                id='download-button-all-data-collected-parquet',
+                                                style={
+                                                    'color': 'black',
+                                                    'backgroundColor': 'cyan',
+                                                    'borderRadius': '5px',
+                                                    'padding': '10px',
+                                                    'border': 'none',
+                                                    'cursor': 'pointer'
+                                                }
+                                            ),
+                                            id='export-link-all-data-collected-parquet',
+                                            href='/export?format=parquet',
+                                            style={'marginLeft': '10px'}
+                                        )
                                     ],
                                     style={'position': 'absolute', 'top': '20px', 'right': '20px'}
                                 )
@@ -291,11 +852,8 @@ app.layout = html.Div(
                                         'borderRadius': '10px'
                                     }
                                 ),
-                                 dcc.Interval(
-                                    id='interval-radial-progress',
-                                    interval=5 * 1000,  # Reduced interval to 5 seconds for faster updates
-                                    n_intervals=0
-                                ),
+                                # Last reading this client has drawn
+                                dcc.Store(id='radial-progress-state'),
                                 html.Div(
                                     id='radial-real-time',
                                     style={'fontSize': '20px', 'fontWeight': 'bold', 'color': 'lime', 'textAlign': 'center', 'marginTop': '10px'}
@@ -308,73 +866,197 @@ app.layout = html.Div(
                                 # Download button for Radial Progress Indicators tab
                                 html.Div(
                                     [
-                                        html.Button(
-                                            "Download CSV",
-                                            id='download-button',
+                                        html.A(
+                                            html.Button(
+                                                "Download CSV",
+                                                id='download-button',
+                                                style={
+                                                    'color': 'black',
+                                                    'backgroundColor': 'cyan',
+                                                    'borderRadius': '5px',
+                                                    'padding': '10px',
+                                                    'border': 'none',
+                                                    'cursor': 'pointer'
+                                                }
+                                            ),
+                                            id='export-link-radial-progress',
+                                            href='/export'
+                                        )
+                                    ],
+                                    style={'position': 'absolute', 'top': '20px', 'right': '20px'}
+                                )                   
+                            ],
+                            style={'backgroundColor': '#121212', 'color': '#FFFFFF'}
+                        )
+                    ],
+                    style={'backgroundColor': '#121212', 'color': '#FFFFFF'} 
+                ),
+
+                # Analytics Tab: heavy analyses run as background jobs, see sensor_analytics
+                dcc.Tab(
+                    label='Analytics',
+                    children=[
+                        html.Div(
+                            [
+                                html.H2(
+                                    "Analytics",
+                                    style={'color': 'white', 'textAlign': 'center', 'marginTop': '10px'}
+                                ),
+                                html.P(
+                                    "Runs in the background over the stored history of the selected devices; results are kept until new readings arrive in the range.",
+                                    style={'color': 'grey', 'textAlign': 'center'}
+                                ),
+                                html.Div(
+                                    [
+                                        dcc.Dropdown(
+                                            id='analytics-analysis',
+                                            options=[{'label': label, 'value': name}
+                                                     for name, (label, _) in sensor_analytics.ANALYSES.items()],
+                                            value='correlation',
+                                            clearable=False,
                                             style={
+                                                'backgroundColor': '#505357',
                                                 'color': 'black',
-                                                'backgroundColor': 'cyan',
+                                                'border': '1px solid cyan',
                                                 'borderRadius': '5px',
-                                                'padding': '10px',
-                                                'border': 'none',
-                                                'cursor': 'pointer'
+                                                'width': '350px',
+                                                'display': 'inline-block',
+                                                'verticalAlign': 'middle'
                                             }
                                         ),
-                                        dcc.Download(id='download-dataframe-csv')
+                                        # Leave empty to analyse the whole history
+                                        dcc.DatePickerRange(
+                                            id='analytics-range',
+                                            clearable=True,
+                                            display_format='YYYY-MM-DD',
+                                            style={'display': 'inline-block', 'verticalAlign': 'middle', 'margin': '0 20px'}
+                                        ),
+                                        html.Button(
+                                            "Run",
+                                            id='analytics-run',
+                                            style={'color': 'black', 'backgroundColor': 'cyan', 'borderRadius': '5px',
+                                                   'padding': '10px', 'border': 'none', 'cursor': 'pointer', 'marginRight': '10px'}
+                                        ),
+                                        html.Button(
+                                            "Cancel",
+                                            id='analytics-cancel',
+                                            style={'color': 'black', 'backgroundColor': 'grey', 'borderRadius': '5px',
+                                                   'padding': '10px', 'border': 'none', 'cursor': 'pointer'}
+                                        )
                                     ],
-                                    style={'position': 'absolute', 'top': '20px', 'right': '20px'}
-                                )                   
+                                    style={'textAlign': 'center', 'marginBottom': '20px'}
+                                ),
+                                html.Div(
+                                    [
+                                        html.Progress(id='analytics-progress', value='0', max='1', style={'width': '300px'}),
+                                        html.Div(id='analytics-status', style={'color': 'cyan', 'marginTop': '5px'})
+                                    ],
+                                    style={'textAlign': 'center', 'marginBottom': '20px'}
+                                ),
+                                dcc.Graph(
+                                    id='analytics-graph',
+                                    style={
+                                        'backgroundColor': '#202123',
+                                        'padding': '10px',
+                                        'borderRadius': '10px'
+                                    }
+                                ),
+                                # Id of the job this client follows, polled while it runs
+                                dcc.Store(id='analytics-job'),
+                                dcc.Interval(id='analytics-poll', interval=1000, disabled=True)
                             ],
-                            style={'backgroundColor': '#121212', 'color': '#FFFFFF'}
+                            style={'padding': '20px'}
                         )
                     ],
-                    style={'backgroundColor': '#121212', 'color': '#FFFFFF'} 
+                    style={'backgroundColor': 'black', 'color': 'white'}
                 ),
             ]
         )
     ]
 )
 
-# Callback to update the line graph based on the selected sensor
+# Callback to update the line graph based on the selected sensor.
+# Live updates only send rows newer than the client's last ts_ms through extendData;
+# the figure is rebuilt only on first load or when the sensor or device selection changes,
+# and then only once per data version for all clients.
 @app.callback(
     [Output('line-graphs', 'figure'),
+     Output('line-graphs', 'extendData'),
+     Output('line-graphs-state', 'data'),
      Output('line-real-time', 'children'),
      Output('line-heat-index-danger-label', 'children')],
-    [Input('interval-line-graphs', 'n_intervals'),
-     Input('sensor-dropdown', 'value')]
+    [Input('live-update', 'data'),
+     Input('interval-fallback', 'n_intervals'),
+     Input('sensor-dropdown', 'value'),
+     Input('device-dropdown', 'value')],
+    State('line-graphs-state', 'data')
 )
-def update_line_graphs(n, sensor):
-    df = fetch_data()
-    if df.empty:
-        return go.Figure(), "Real-Time: N/A", "Danger Level: N/A"
+@timed_callback
+def update_line_graphs(version, n, sensor, devices, state):
+    threshold = THRESHOLDS.get(sensor, None)
+    inputs = [sensor, sorted(devices or [])]
+
+    df = new_rows(state, inputs, devices)
+    if df is not None and df.empty:
+        return no_update, no_update, no_update, no_update, no_update
+
+    if df is None:
+        return memoize_figure('line-graphs', inputs, lambda: build_line_graphs(sensor, devices, inputs))
+
+    # Append the new rows to each device's normal/exceeded traces, keeping at most MAX_POINTS
+    xs, ys = [], []
+    for device in state['devices']:
+        group = df[df['device_id'] == device]
+        for rows in (group[group[sensor] <= threshold], group[group[sensor] > threshold]):
+            xs.append(rows['timestamp'].tolist())
+            ys.append(rows[sensor].tolist())
+    extend = (dict(x=xs, y=ys), list(range(len(xs))), MAX_POINTS)
+    state['last_ts'] = int(df['ts_ms'].max())
 
     current_time = df['timestamp'].values[-1]
     real_time_label = f"Real-Time: {current_time}"
 
+    _, danger_level = heat_index_danger_level(devices)
+
+    return no_update, extend, state, real_time_label, danger_level
+
+
+def build_line_graphs(sensor, devices, inputs):
+    """Full line graph outputs for a sensor and device selection; see update_line_graphs."""
     threshold = THRESHOLDS.get(sensor, None)
-    df_normal = df[df[sensor] <= threshold]
-    df_exceeded = df[df[sensor] > threshold]
+    df = fetch_data(devices=devices)
+    if df.empty:
+        return go.Figure(), no_update, None, "Real-Time: N/A", "Danger Level: N/A"
 
-    figure = {
-        'data': [
+    # One normal/exceeded pair per device; several devices are overlaid in the default palette
+    traces = []
+    groups = device_groups(df)
+    for device, suffix, group in groups:
+        df_normal = group[group[sensor] <= threshold]
+        df_exceeded = group[group[sensor] > threshold]
+        normal_color = None if suffix else 'cyan'
+        traces += [
             go.Scatter(
                 x=df_normal['timestamp'],
                 y=df_normal[sensor],
                 mode='lines+markers',
-                name=f"{sensor.capitalize()} (Normal)",
-                line=dict(color='cyan'),
-                marker=dict(symbol='circle', size=6, color='cyan')
+                name=f"{sensor.capitalize()} (Normal){suffix}",
+                line=dict(color=normal_color),
+                marker=dict(symbol='circle', size=6, color=normal_color)
             ),
             go.Scatter(
                 x=df_exceeded['timestamp'],
                 y=df_exceeded[sensor],
                 mode='lines+markers',
-                name=f"{sensor.capitalize()} (Exceeded)",
+                name=f"{sensor.capitalize()} (Exceeded){suffix}",
                 line=dict(color='red'),
                 marker=dict(symbol='diamond', size=8, color='red')
             )
-        ],
-        'layout': go.Layout(
+        ]
+
+    figure = go.Figure(
+        data=traces,
+        layout=go.Layout(
             title=dict(text=f'Live {sensor.capitalize()} Data', font=dict(color='white')),
             xaxis=dict(title='Timestamp', titlefont=dict(color='white'), tickfont=dict(color='white')),
             yaxis=dict(title=sensor.capitalize(), titlefont=dict(color='white'), tickfont=dict(color='white')),
@@ -382,10 +1064,12 @@ def update_line_graphs(n, sensor):
             plot_bgcolor='black',
             paper_bgcolor='black',
             font=dict(color='lightgray'),
+            # Span the plot width so the threshold line stays correct as points are appended
             shapes=[dict(
                 type='line',
-                x0=df['timestamp'].min(),
-                x1=df['timestamp'].max(),
+                xref='paper',
+                x0=0,
+                x1=1,
                 y0=threshold,
                 y1=threshold,
                 line=dict(color='green', width=2, dash='dash'),
@@ -396,52 +1080,46 @@ def update_line_graphs(n, sensor):
                 font=dict(color='white')
             )
         )
-    }
+    )
+    state = {'inputs': inputs, 'devices': [device for device, _, _ in groups], 'last_ts': int(df['ts_ms'].max())}
+    _, danger_level = heat_index_danger_level(devices)
+    return figure, no_update, state, f"Real-Time: {df['timestamp'].values[-1]}", danger_level
 
-    heat_index_value = df['heat_index'].values[-1]
-    if heat_index_value >= 125:
-        danger_level = "Heat Index Danger Level: Extreme Danger (Alarm)"
-    elif heat_index_value >= 103:
-        danger_level = "Heat Index Danger Level: Danger (Alarm)"
-    elif heat_index_value >= 90:
-        danger_level = "Heat Index Danger Level: Extreme Caution"
-    elif heat_index_value >= 80:
-        danger_level = "Heat Index Danger Level: Caution"
-    else:
-        danger_level = "Heat Index Danger Level: Normal"
 
-    return figure, real_time_label, danger_level
-# Callback to update the instantaneous readings graph with thresholds
+# Callback to update the instantaneous readings graph with thresholds; skipped when no new reading arrived
 @app.callback(
     [Output('instantaneous-readings', 'figure'),
+     Output('instantaneous-readings-state', 'data'),
      Output('instantaneous-real-time', 'children'),
      Output('instantaneous-heat-index-danger-label', 'children')],
-    Input('interval-instantaneous-readings', 'n_intervals')
+    [Input('live-update', 'data'),
+     Input('interval-fallback', 'n_intervals'),
+     Input('device-dropdown', 'value')],
+    State('instantaneous-readings-state', 'data')
 )
-def update_instantaneous_readings(n):
-    df = fetch_data()
+@timed_callback
+def update_instantaneous_readings(version, n, devices, state):
+    inputs = [sorted(devices or [])]
+    new = new_rows(state, inputs, devices)
+    if new is not None and new.empty:
+        return no_update, no_update, no_update, no_update
+
+    return memoize_figure('instantaneous-readings', inputs, lambda: build_instantaneous_readings(devices, inputs))
+
+
+def build_instantaneous_readings(devices, inputs):
+    """Instantaneous readings outputs for a device selection; see update_instantaneous_readings."""
+    df = fetch_data(devices=devices)
     if df.empty:
-        return go.Figure(), "Real-Time: N/A", "Danger Level: N/A"  # Return empty figure and labels if no data
+        return go.Figure(), None, "Real-Time: N/A", "Danger Level: N/A"  # Return empty figure and labels if no data
+    state = {'inputs': inputs, 'last_ts': int(df['ts_ms'].max())}
 
     # Update the real-time label with the current timestamp
     current_time = df['timestamp'].values[-1]
     real_time_label = f"Real-Time: {current_time}"
 
     fig = go.Figure()
-    heat_index_value = df['heat_index'].values[-1]  # Get the latest heat index value
-    danger_level = ""
-    
-    # Determine the danger level based on the heat index value
-    if heat_index_value >= 125:
-        danger_level = "Heat Index Danger Level: Extreme Danger"
-    elif heat_index_value >= 103:
-        danger_level = "Heat Index Danger Level: Danger"
-    elif heat_index_value >= 90:
-        danger_level = "Heat Index Danger Level: Extreme Caution"
-    elif heat_index_value >= 80:
-        danger_level = "Heat Index Danger Level: Caution"
-    else:
-        danger_level = "Heat Index Danger Level: Normal"
+    _, danger_level = heat_index_danger_level(devices)
 
     sensor_colors = {
         'temperature': 'lightblue',
@@ -481,36 +1159,147 @@ def update_instantaneous_readings(n):
         showlegend=False
     )
     
-    return fig, real_time_label, danger_level
+    return fig, state, real_time_label, danger_level
 
 
-# Callback to update the all-data collected graph
+# Callback to show the rolling statistics of the selected window for each sensor
+@app.callback(
+    Output('rolling-stats-table', 'children'),
+    [Input('live-update', 'data'),
+     Input('interval-fallback', 'n_intervals'),
+     Input('device-dropdown', 'value'),
+     Input('rolling-window', 'value')]
+)
+@timed_callback
+def update_rolling_stats(version, n, devices, window_ms):
+    df = fetch_rolling_stats(window_ms, devices)
+    if df.empty:
+        return html.P("No rolling statistics yet.", style={'color': 'grey', 'textAlign': 'center'})
+
+    stats = [stat for stat in ROLLING_STATS if stat != 'count']
+    multiple = df['device_id'].nunique() > 1
+    header = (['Device'] if multiple else []) + ['Sensor', 'Readings'] + [stat.capitalize() for stat in stats]
+    cell = {'padding': '4px 12px', 'textAlign': 'right'}
+    rows = []
+    for record in df.itertuples(index=False):
+        if record.column_name not in THRESHOLDS:
+            continue  # The firmware's own mean/std columns are superseded by these statistics
+        values = ([record.device_id] if multiple else []) + [record.column_name.capitalize(), record.count]
+        values += [f"{getattr(record, stat):.2f}" for stat in stats]
+        rows.append(html.Tr([html.Td(value, style=cell) for value in values]))
+    return html.Table(
+        [html.Thead(html.Tr([html.Th(name, style=cell) for name in header])), html.Tbody(rows)],
+        style={'margin': '0 auto', 'color': 'white'}
+    )
+
+
+# Callback to list the most recent alert transitions
+@app.callback(
+    Output('alert-history', 'children'),
+    [Input('live-update', 'data'),
+     Input('interval-fallback', 'n_intervals'),
+     Input('device-dropdown', 'value')]
+)
+@timed_callback
+def update_alert_history(version, n, devices):
+    df = fetch_alert_history(devices)
+    if df.empty:
+        return html.P("No alerts recorded.", style={'color': 'grey', 'textAlign': 'center'})
+    cell = {'padding': '4px 12px'}
+    header = ['Time', 'Device', 'Alert', 'Change', 'Value']
+    rows = [
+        html.Tr([html.Td(value, style=cell) for value in [
+            timestamp, record.device_id, record.alert.replace('_', ' ').capitalize(),
+            f"{record.previous_state} -> {record.state}", f"{record.value:.2f}"
+        ]], style={'color': 'red' if record.alert == 'heat_index_danger' and record.level >= ALARM_LEVEL else 'white'})
+        for timestamp, record in zip(local_timestamps(df['ts_ms']), df.itertuples(index=False))
+    ]
+    return html.Table(
+        [html.Thead(html.Tr([html.Th(name, style=cell) for name in header])), html.Tbody(rows)],
+        style={'margin': '0 auto', 'color': 'white'}
+    )
+
+
+# Callback to update the all-data collected graph. Without a date range it shows the latest readings,
+# extended in place as they arrive; with a range it shows the full history reduced to PIXEL_BUDGET points.
 @app.callback(
     [Output('all-data-graphs', 'figure'),
+     Output('all-data-graphs', 'extendData'),
+     Output('all-data-graphs-state', 'data'),
      Output('all-real-time', 'children'),
      Output('all-heat-index-danger-label', 'children')],
-    Input('interval-all-data-graphs', 'n_intervals')
+    [Input('live-update', 'data'),
+     Input('interval-fallback', 'n_intervals'),
+     Input('device-dropdown', 'value'),
+     Input('all-data-range', 'start_date'),
+     Input('all-data-range', 'end_date')],
+    State('all-data-graphs-state', 'data')
 )
-def update_all_data_graphs(n):
-    df = fetch_data()
+@timed_callback
+def update_all_data_graphs(version, n, devices, start_date, end_date, state):
+    history = bool(start_date and end_date)
+    if history and ctx.triggered_id in ('live-update', 'interval-fallback'):
+        return no_update, no_update, no_update, no_update, no_update
+
+    inputs = [sorted(devices or []), start_date, end_date]
+    df = None if history else new_rows(state, inputs, devices)
+    if df is not None and df.empty:
+        return no_update, no_update, no_update, no_update, no_update
+
+    if df is not None:
+        # Append the new rows to every (device, sensor) trace, keeping at most MAX_POINTS
+        xs, ys = [], []
+        for device in state['devices']:
+            group = df[df['device_id'] == device]
+            for sensor in THRESHOLDS.keys():
+                xs.append(group['timestamp'].tolist())
+                ys.append(group[sensor].tolist())
+        state['last_ts'] = int(df['ts_ms'].max())
+        extend = (dict(x=xs, y=ys), list(range(len(xs))), MAX_POINTS)
+        return no_update, extend, state, f"Real-Time: {df['timestamp'].values[-1]}", heat_index_danger_level(devices)[1]
+
+    return memoize_figure('all-data-graphs', inputs, lambda: build_all_data_graphs(devices, start_date, end_date, inputs))
+
+
+def build_all_data_graphs(devices, start_date, end_date, inputs):
+    """All-data graph outputs for a device selection and date range; see update_all_data_graphs."""
+    history = bool(start_date and end_date)
+    latest = fetch_data(devices=devices)
+    if history:
+        start, end = date_range_ms(start_date, end_date)
+        table, df = fetch_history(start, end, devices)
+    else:
+        df = latest
     if df.empty:
-        return go.Figure(), "Real-Time: N/A", "Danger Level: N/A"  # Return empty figure and labels if no data
+        return go.Figure(), no_update, None, "Real-Time: N/A", "Danger Level: N/A"  # Return empty figure and labels if no data
 
-    # Update the real-time label with the current timestamp
-    current_time = df['timestamp'].values[-1]
-    real_time_label = f"Real-Time: {current_time}"
+    # Update the real-time label with the current timestamp, or describe the selected range
+    if history:
+        real_time_label = f"Range: {start_date} to {end_date} ({RESOLUTION_LABELS[table]})"
+    else:
+        current_time = df['timestamp'].values[-1]
+        real_time_label = f"Real-Time: {current_time}"
 
-    # Create a multi-line graph for all sensors
+    # Create a multi-line graph for all sensors, with one line per device when several are selected
     figure = go.Figure()
-    for i, sensor in enumerate(THRESHOLDS.keys()):
-        figure.add_trace(go.Scatter(
-            x=df['timestamp'],
-            y=df[sensor],
-            mode='lines+markers',
-            name=sensor.capitalize(),
-            line=dict(color=f"rgb({100 + i * 40}, {100 + i * 30}, {200 - i * 20})"),
-            marker=dict(size=6)
-        ))
+    dashes = ['solid', 'dash', 'dot', 'dashdot']
+    groups = device_groups(df)
+    for d, (device, suffix, group) in enumerate(groups):
+        for i, sensor in enumerate(THRESHOLDS.keys()):
+            if history:
+                # Min/max reduction keeps every peak, so threshold excursions stay visible
+                ts_ms, values = downsample_minmax(*history_series(group, table, sensor), PIXEL_BUDGET)
+                x, y, mode = local_timestamps(ts_ms), values, 'lines'
+            else:
+                x, y, mode = group['timestamp'], group[sensor], 'lines+markers'
+            figure.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode=mode,
+                name=f"{sensor.capitalize()}{suffix}",
+                line=dict(color=f"rgb({100 + i * 40}, {100 + i * 30}, {200 - i * 20})", dash=dashes[d % len(dashes)]),
+                marker=dict(size=6)
+            ))
 
     # Customize layout
     figure.update_layout(
@@ -541,66 +1330,59 @@ def update_all_data_graphs(n):
     )
 
     # Determine the heat index danger level for the current reading
-    heat_index_value = df['heat_index'].values[-1]
-    if heat_index_value >= 125:
-        danger_level = "Heat Index Danger Level: Extreme Danger"
-    elif heat_index_value >= 103:
-        danger_level = "Heat Index Danger Level: Danger"
-    elif heat_index_value >= 90:
-        danger_level = "Heat Index Danger Level: Extreme Caution"
-    elif heat_index_value >= 80:
-        danger_level = "Heat Index Danger Level: Caution"
-    else:
-        danger_level = "Heat Index Danger Level: Normal"
+    danger_level = heat_index_danger_level(devices)[1] if not latest.empty else "Danger Level: N/A"
+
+    if history:
+        return figure, no_update, None, real_time_label, danger_level
+    state = {'inputs': inputs, 'devices': [device for device, _, _ in groups], 'last_ts': int(df['ts_ms'].max())}
+    return figure, no_update, state, real_time_label, danger_level
 
-    return figure, real_time_label, danger_level
 
-# Callback for radial graphs
+# Callback for radial graphs; skipped when no new reading arrived
 @app.callback(
     [Output('radial-progress', 'figure'),
      Output('radial-progress', 'style'),
+     Output('radial-progress-state', 'data'),
      Output('radial-real-time', 'children'),
      Output('radial-heat-index-danger-label', 'children')],
-    Input('interval-radial-progress', 'n_intervals')
+    [Input('live-update', 'data'),
+     Input('interval-fallback', 'n_intervals'),
+     Input('device-dropdown', 'value')],
+    State('radial-progress-state', 'data')
 )
-def update_radial_progress(n):
-    df = fetch_data()
+@timed_callback
+def update_radial_progress(version, n, devices, state):
+    inputs = [sorted(devices or [])]
+    new = new_rows(state, inputs, devices)
+    if new is not None and new.empty:
+        return no_update, no_update, no_update, no_update, no_update
+
+    return memoize_figure('radial-progress', inputs, lambda: build_radial_progress(devices, inputs))
+
+
+def build_radial_progress(devices, inputs):
+    """Radial gauge outputs for a device selection; see update_radial_progress."""
+    df = fetch_data(devices=devices)
     if df.empty:
         return (
             go.Figure(),
             {'backgroundColor': '#202123', 'padding': '10px', 'borderRadius': '10px'},
+            None,
             "Real-Time: N/A",
             "Danger Level: N/A"
         )
+    state = {'inputs': inputs, 'last_ts': int(df['ts_ms'].max())}
 
     current_time = df['timestamp'].values[-1]
     real_time_label = f"Real-Time: {current_time}"
 
     fig = go.Figure()
-    heat_index_value = df['heat_index'].values[-1]
-    danger_level = ""
-
-    # Determine danger level
-    if heat_index_value >= 125:
-        danger_level = "Heat Index Danger Level: Extreme Danger"
-    elif heat_index_value >= 103:
-        danger_level = "Heat Index Danger Level: Danger"
-        radial_style = {
-            'backgroundColor': 'red',
-            'padding': '10px',
-            'borderRadius': '10px'
-        }
-    elif heat_index_value >= 90:
-        danger_level = "Heat Index Danger Level: Extreme Caution"
-    elif heat_index_value >= 80:
-        danger_level = "Heat Index Danger Level: Caution"
-    else:
-        danger_level = "Heat Index Danger Level: Normal"
-        radial_style = {
-            'backgroundColor': '#202123',
-            'padding': '10px',
-            'borderRadius': '10px'
-        }
+    level, danger_level = heat_index_danger_level(devices)
+    radial_style = {
+        'backgroundColor': 'red' if level >= ALARM_LEVEL else '#202123',
+        'padding': '10px',
+        'borderRadius': '10px'
+    }
 
     # Create the radial progress figure
     for sensor, threshold in THRESHOLDS.items():
@@ -662,29 +1444,524 @@ def update_radial_progress(n):
         font=dict(color='white'),
     )
 
-    return fig, radial_style, real_time_label, danger_level
+    return fig, radial_style, state, real_time_label, danger_level
+
+# Callback to refresh the device filter options as new stations report in
+@app.callback(
+    Output('device-dropdown', 'options'),
+    [Input('live-update', 'data'),
+     Input('interval-fallback', 'n_intervals')]
+)
+@timed_callback
+def update_device_options(version, n):
+    return [{'label': device, 'value': device} for device in fetch_devices()]
+
+# Background analytics jobs of this process; their files are shared with every other dashboard process
+_analytics_jobs = None
+
+
+def analytics_jobs():
+    global _analytics_jobs
+    if _analytics_jobs is None:
+        _analytics_jobs = sensor_analytics.AnalyticsJobs(sensor_analytics.analytics_dir_for(DB_PATH))
+    return _analytics_jobs
 
+
+# Start or cancel an analysis. A result cached for the same range and data is picked up without a new job.
 @app.callback(
-    Output('download-dataframe-csv', 'data'),
-    Input('download-button', 'n_clicks'),
+    Output('analytics-job', 'data'),
+    [Input('analytics-run', 'n_clicks'),
+     Input('analytics-cancel', 'n_clicks')],
+    [State('analytics-analysis', 'value'),
+     State('analytics-range', 'start_date'),
+     State('analytics-range', 'end_date'),
+     State('device-dropdown', 'value'),
+     State('analytics-job', 'data')],
     prevent_initial_call=True
 )
-def download_csv(n_clicks):
-    if "download-button" in ctx.triggered_id:
-        # Fetch data from the database
-        df = fetch_data(limit=50)
-
-        # Convert dataframe to CSV format
-        csv_string = io.StringIO()
-        df.to_csv(csv_string, index=False)
-        csv_string.seek(0)
-
-        # Return CSV as download
-        return dict(
-            content=csv_string.getvalue(),
-            filename="sensor_data.csv"
-        )
+@timed_callback
+def start_analytics_job(run, cancel, analysis, start_date, end_date, devices, job):
+    if ctx.triggered_id == 'analytics-cancel':
+        if job and job.get('id'):
+            analytics_jobs().cancel(job['id'])
+        return no_update
+
+    devices = sorted(devices) if devices else None
+    if start_date and end_date:
+        start, end = date_range_ms(start_date, end_date)
+    else:
+        first, last = storage().earliest_n(1, devices=devices), storage().latest_n(1, devices=devices)
+        if first.empty:
+            return {'error': "No readings stored yet."}
+        start, end = int(first['ts_ms'].iloc[0]), int(last['ts_ms'].iloc[-1])
+    spec = {'analysis': analysis, 'start': start, 'end': end, 'devices': devices, 'db_path': DB_PATH,
+            'storage': storage_backend, 'storage_dir': storage_dir_for(DB_PATH), 'archive_dir': archive_dir_for(DB_PATH)}
+    version = sensor_analytics.range_version(storage(), start, end, devices)
+    return {'id': analytics_jobs().submit(spec, version)}
+
+
+# Follow the job's progress once a second until it finishes, then draw its result
+@app.callback(
+    [Output('analytics-progress', 'value'),
+     Output('analytics-status', 'children'),
+     Output('analytics-graph', 'figure'),
+     Output('analytics-poll', 'disabled')],
+    [Input('analytics-poll', 'n_intervals'),
+     Input('analytics-job', 'data')],
+    prevent_initial_call=True
+)
+@timed_callback
+def update_analytics_job(n, job):
+    if not job or job.get('error'):
+        return '0', (job or {}).get('error', ""), no_update, True
+    status = analytics_jobs().job(job['id']).status()
+    if status is None:
+        return '0', "Job not found.", no_update, True
+    if status['state'] in ('queued', 'running'):
+        return str(status['progress']), f"{status['message']} ({status['progress']:.0%})", no_update, False
+    if status['state'] != 'done':
+        return str(status['progress']), status['message'], no_update, True
+
+    result = analytics_jobs().job(job['id']).result()
+    figure = build_analytics_figure(result)
+    label = f"Done: {result['buckets']} buckets of {result['bucket_ms'] // 60000} min"
+    return '1', label, figure, True
+
+
+def build_analytics_figure(result):
+    """Plot the result of one analysis, see sensor_analytics.ANALYSES."""
+    fig = go.Figure()
+    analysis = result['analysis']
+    if analysis == 'correlation':
+        for pair in result['pairs']:
+            a, b = pair['columns']
+            name = f"{a} vs {b}"
+            if pair['peak_r'] is not None:
+                name += f" (peak r={pair['peak_r']:.2f} at {pair['peak_lag_minutes']:+.0f} min)"
+            fig.add_trace(go.Scatter(x=result['lag_minutes'], y=pair['ccf'], mode='lines', name=name))
+        title, x_title, y_title = "Cross-correlation", "Lag (minutes)", "Correlation"
+    elif analysis == 'daily_cycle':
+        for column in result['columns']:
+            explained = result['explained'][column]
+            name = column if explained is None else f"{column} ({explained:.0%} of detrended variance)"
+            fig.add_trace(go.Scatter(x=result['hours'], y=result['cycle'][column], mode='lines+markers', name=name))
+        title, x_title, y_title = "Daily cycle (deviation from the 24 h trend)", "Hour of day", "Deviation"
+    elif analysis == 'spectrum':
+        periods = [24 / frequency for frequency in result['cycles_per_day']]
+        for column in result['columns']:
+            peaks = ', '.join(f"{period:g} h" for period in result['peak_periods_hours'][column])
+            fig.add_trace(go.Scatter(x=periods, y=result['power'][column], mode='lines', name=f"{column} (peaks {peaks})"))
+        fig.update_xaxes(type='log', autorange='reversed')
+        fig.update_yaxes(type='log')
+        title, x_title, y_title = "Power spectrum", "Period (hours)", "Power"
+    else:
+        days = local_timestamps(result['days_ms'])
+        for column in result['columns']:
+            fig.add_trace(go.Scatter(x=days, y=result['daily_mean'][column], mode='markers', name=f"{column} daily mean"))
+            fit = result['fit'][column]
+            if fit:
+                fig.add_trace(go.Scatter(x=days, y=fit['fitted'], mode='lines',
+                                         name=f"{column} trend ({fit['per_30_days']:+.2f} per 30 days)"))
+        title, x_title, y_title = "Long-term trends", "Day", "Daily mean"
+
+    fig.update_layout(
+        title=dict(text=title, font=dict(color='white', size=18)),
+        xaxis=dict(title=x_title, titlefont=dict(color='white'), tickfont=dict(color='white'), gridcolor='gray'),
+        yaxis=dict(title=y_title, titlefont=dict(color='white'), tickfont=dict(color='white'), gridcolor='gray'),
+        plot_bgcolor='#202123',
+        paper_bgcolor='black',
+        font=dict(color='white'),
+        legend=dict(font=dict(color='white'), bgcolor='rgba(0, 0, 0, 0.5)')
+    )
+    return fig
+
+
+# Columns that can be exported, with their Arrow types for Parquet/Arrow output
+EXPORT_COLUMNS = {'real_time': 'string', 'ts_ms': 'int64', 'device_id': 'string'}
+EXPORT_COLUMNS.update({field.name: ARROW_TYPES[field.type] for field in FIELDS})
+
+# Rows fetched from SQLite and written out per chunk; memory use is bounded by this, not the range
+EXPORT_CHUNK_ROWS = 10000
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever the Arrow writers wrote since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def export_chunks(columns, start=None, end=None, devices=None):
+    """Yield lists of row tuples for the export, EXPORT_CHUNK_ROWS at a time."""
+    yield from storage().iter_chunks(columns, start, end, devices, EXPORT_CHUNK_ROWS)
+
+
+def export_csv(columns, chunks):
+    writer_buffer = io.StringIO()
+    writer = csv.writer(writer_buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield writer_buffer.getvalue()
+        writer_buffer.seek(0)
+        writer_buffer.truncate()
+    yield writer_buffer.getvalue()
+
+
+def export_arrow(columns, chunks, fmt):
+    """Stream Parquet (one compressed row group per chunk) or an Arrow IPC stream."""
+    schema = pa.schema([(column, getattr(pa, EXPORT_COLUMNS[column])()) for column in columns])
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for rows in chunks:
+        writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# Streaming export endpoint: /export?format=csv|parquet|arrow&columns=a,b&start=ms&end=ms&device=id
+@app.server.route('/export')
+def export():
+    args = request.args
+    fmt = args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return Response(f"Unsupported format: {fmt}", status=400)
+    if fmt != 'csv' and pa is None:
+        return Response("Parquet and Arrow export require pyarrow", status=501)
+
+    columns = args.get('columns', ','.join(EXPORT_COLUMNS)).split(',')
+    unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+    if unknown:
+        return Response(f"Unknown columns: {', '.join(unknown)}", status=400)
+    try:
+        start = int(args['start']) if args.get('start') else None
+        end = int(args['end']) if args.get('end') else None
+    except ValueError:
+        return Response("start and end must be epoch milliseconds", status=400)
+
+    chunks = export_chunks(columns, start, end, args.getlist('device'))
+    body = export_csv(columns, chunks) if fmt == 'csv' else export_arrow(columns, chunks, fmt)
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="sensor_data.{fmt}"'}
+    )
+
+
+# Build an /export link for the given options
+def export_url(fmt='csv', columns=None, start=None, end=None, devices=None):
+    params = [('format', fmt)]
+    if columns:
+        params.append(('columns', ','.join(columns)))
+    if start is not None:
+        params.append(('start', start))
+    if end is not None:
+        params.append(('end', end))
+    params += [('device', device) for device in devices or []]
+    return f"/export?{urlencode(params)}"
+
+
+# Callback to point every download button at the export endpoint for what its tab shows
+@app.callback(
+    [Output('export-link-line-graphs', 'href'),
+     Output('export-link-instantaneous-readings', 'href'),
+     Output('export-link-all-data-collected', 'href'),
+     Output('export-link-all-data-collected-parquet', 'href'),
+     Output('export-link-radial-progress', 'href')],
+    [Input('sensor-dropdown', 'value'),
+     Input('device-dropdown', 'value'),
+     Input('all-data-range', 'start_date'),
+     Input('all-data-range', 'end_date')]
+)
+@timed_callback
+def update_export_links(sensor, devices, start_date, end_date):
+    start, end = date_range_ms(start_date, end_date) if start_date and end_date else (None, None)
+    sensor_columns = ['real_time', 'ts_ms', 'device_id', sensor] if sensor else None
+    full_history = export_url(devices=devices)
+    return (
+        export_url(columns=sensor_columns, devices=devices),
+        full_history,
+        export_url(start=start, end=end, devices=devices),
+        export_url('parquet', start=start, end=end, devices=devices),
+        full_history
+    )
+
+
+# Versioned query API for other services, so they no longer scrape the dashboard or open the database:
+#   /api/v1/devices                  device ids with stored readings
+#   /api/v1/latest                   newest reading of each device
+#   /api/v1/readings?start&end       readings oldest first, with columns= to select fields
+#   /api/v1/aggregates?start&end     min/max/mean/last per bucket=1m|1h|1d of whole buckets overlapping the range
+#   /api/v1/alerts                   current state of every alert
+#   /api/v1/alerts/events            alert transitions, oldest first
+# Every endpoint takes device= (repeatable). Lists take limit= and are keyset paginated: pass the
+# returned next_cursor (X-Next-Cursor with format=arrow) as cursor= until it is null.
+# Tables are compact JSON, {"columns": [...], "data": [[...], ...]}, or an Arrow IPC stream with format=arrow.
+# Responses carry an ETag of the stored data, so pollers sending If-None-Match get a 304 without any
+# query until the ingest script commits; bodies are cached per URL until then.
+API_PREFIX = '/api/v1'
+API_DEFAULT_LIMIT = 1000
+API_MAX_LIMIT = 10000
+API_BUCKETS = {table.rsplit('_', 1)[1]: width for table, width in ROLLUPS.items()}  # '1m' -> 60000
+
+
+def api_data_version():
+    """
+    Version of the stored data for ETags. PRAGMA data_version is only comparable within one connection,
+    so this uses values every worker process agrees on: the newest reading's rowid (the row count
+    of the mmap backend) and the newest alert event id.
+    """
+    def query_version():
+        with read_connection() as conn:
+            readings = conn.execute("SELECT max(rowid) FROM sensor_readings").fetchone()[0] or 0
+            events = conn.execute("SELECT max(id) FROM alert_events").fetchone()[0] or 0
+        if storage_backend == 'mmap':
+            readings = sum(storage().committed(device) for device in storage().devices())
+        return f"{readings}.{events}"
+    return cached(('api-version',), query_version)
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """The values of a cursor made by encode_cursor, checked against the expected types."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != len(types) or \
+            not all(isinstance(value, kind) for value, kind in zip(values, types)):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def api_int(name, default=None):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def api_limit():
+    limit = api_int('limit', API_DEFAULT_LIMIT)
+    if not 1 <= limit <= API_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {API_MAX_LIMIT}")
+    return limit
+
+
+def api_devices():
+    devices = request.args.getlist('device')
+    return tuple(sorted(devices)) if devices else None
+
+
+def api_table(df, **fields):
+    """Serialize a table, with fields such as next_cursor beside it in JSON or as X- headers in Arrow."""
+    fmt = request.args.get('format', 'json')
+    if fmt == 'arrow':
+        if pa is None:
+            raise ValueError("format=arrow requires pyarrow")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        headers = {f"X-{name.replace('_', '-').title()}": str(value)
+                   for name, value in fields.items() if value is not None}
+        return sink.getvalue().to_pybytes(), EXPORT_MIMETYPES['arrow'], headers
+    if fmt != 'json':
+        raise ValueError(f"Unsupported format: {fmt}")
+    # pandas writes the table itself; the other fields are spliced in front of it
+    table = df.to_json(orient='split', index=False)
+    prefix = ''.join(f"{json.dumps(name)}:{json.dumps(value)}," for name, value in fields.items())
+    return '{' + prefix + table[1:], 'application/json', {}
+
+
+def api_route(path):
+    """
+    Register an API endpoint. The view reads request.args and returns (body, mimetype, headers),
+    or raises ValueError for a bad request. Bodies are cached per URL until the database changes.
+    """
+    def register(view):
+        @functools.wraps(view)
+        def endpoint():
+            version = api_data_version()
+            if request.if_none_match.contains_weak(version):
+                response = Response(status=304)
+            else:
+                key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                try:
+                    body, mimetype, headers = cached(key, view)
+                except ValueError as e:
+                    return jsonify(error=str(e)), 400
+                response = Response(body, mimetype=mimetype, headers=headers)
+            response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        app.server.add_url_rule(API_PREFIX + path, f"api_{view.__name__}", endpoint)
+        return view
+    return register
+
+
+def readings_page(limit, start, end, devices, after=None):
+    """
+    Up to limit readings in the storage order (ts_ms, device_id, arrival), and the cursor of the
+    next page or None. after is the previous cursor, (ts_ms, device_id, n): that page ended with the
+    n-th reading of device_id at ts_ms. Readings sharing both are told apart by position, so the
+    next page is read from ts_ms on and the rows up to and including the cursor are skipped.
+    """
+    if after:
+        ts, device, n = after
+        start = ts if start is None else max(start, ts)
+    fetch = limit + 1 + (n if after else 0)
+    while True:
+        df = storage().earliest_n(fetch, start, end, devices)
+        rows = df
+        if after:
+            at_cursor = df['ts_ms'] == ts
+            skip = int((at_cursor & (df['device_id'] < device)).sum())
+            skip += min(n, int((at_cursor & (df['device_id'] == device)).sum()))
+            rows = df.iloc[skip:]
+        if len(rows) > limit or len(df) < fetch:
+            break
+        fetch *= 2  # Readings of other devices at the cursor's ts_ms took up the page
+
+    page = rows.iloc[:limit]
+    if len(rows) <= limit:
+        return page, None
+    last_ts, last_device = int(page['ts_ms'].iloc[-1]), page['device_id'].iloc[-1]
+    count = int(((page['ts_ms'] == last_ts) & (page['device_id'] == last_device)).sum())
+    if after and (last_ts, last_device) == (ts, device):
+        count += n
+    return page, encode_cursor(last_ts, last_device, count)
+
+
+@api_route('/devices')
+def api_device_list():
+    return json.dumps({'devices': storage().devices()}), 'application/json', {}
+
+
+@api_route('/latest')
+def api_latest():
+    frames = [storage().latest_n(1, devices=[device]) for device in api_devices() or storage().devices()]
+    frames = [df for df in frames if not df.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=FRAME_COLUMNS)
+    return api_table(df)
+
+
+@api_route('/readings')
+def api_readings():
+    columns = request.args.get('columns', ','.join(EXPORT_COLUMNS)).split(',')
+    unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor, int, str, int) if cursor else None
+    df, next_cursor = readings_page(api_limit(), api_int('start'), api_int('end'), api_devices(), after)
+    return api_table(df[columns], next_cursor=next_cursor)
+
+
+@api_route('/aggregates')
+def api_aggregates():
+    bucket = request.args.get('bucket', '1m')
+    if bucket not in API_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(API_BUCKETS)}")
+    width = API_BUCKETS[bucket]
+    start, end = api_int('start'), api_int('end')
+    if start is None or end is None:
+        raise ValueError("start and end are required")
+    # A page is limit buckets long; the cursor is the start of the next one
+    cursor = request.args.get('cursor')
+    page_start = decode_cursor(cursor, int)[0] if cursor else start - start % width
+    page_end = min(end, page_start + api_limit() * width - 1)
+    df = storage().aggregate(page_start, page_end, width, api_devices())
+    return api_table(df, next_cursor=encode_cursor(page_end + 1) if page_end < end else None)
+
+
+@api_route('/alerts')
+def api_alerts():
+    return api_table(query_alert_state(api_devices()))
+
+
+@api_route('/alerts/events')
+def api_alert_events():
+    # alert_events ids only grow, so they are the keyset
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor, int)[0] if cursor else 0
+    limit = api_limit()
+    devices = api_devices()
+    where = f"AND device_id IN ({', '.join('?' * len(devices))})" if devices else ""
+    with read_connection() as conn:
+        df = pd.read_sql_query(f"SELECT * FROM alert_events WHERE id > ? {where} ORDER BY id LIMIT ?",
+                               conn, params=[after, *(devices or []), limit + 1])
+    next_cursor = encode_cursor(int(df['id'].iloc[limit - 1])) if len(df) > limit else None
+    return api_table(df.iloc[:limit], next_cursor=next_cursor)
+
+# WSGI entry point for production serving, e.g. with several worker processes:
+#   SENSOR_DB_PATH=/data/SensorsReadings.db gunicorn -w 4 --threads 8 -b 0.0.0.0:8050 Dashboard:server
+#   waitress-serve --threads 16 --port 8050 Dashboard:server
+# Every /events stream holds a worker thread, so size --threads for the expected viewers.
+server = app.server
+
+
+def parse_args():
+    """Parse command-line options for the dashboard."""
+    parser = argparse.ArgumentParser(description="Serve the sensor data dashboard.")
+    parser.add_argument('--db-path', default=DB_PATH, help="SQLite database file (or set SENSOR_DB_PATH)")
+    parser.add_argument('--storage', default=storage_backend, choices=STORAGE_BACKENDS,
+                        help="Backend the ingest script stores raw readings in (or set SENSOR_STORAGE)")
+    parser.add_argument('--production', action='store_true',
+                        help="Serve with waitress instead of the single-process debug server")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=8050, help="Port to listen on")
+    parser.add_argument('--threads', type=int, default=16, help="Waitress worker threads")
+    return parser.parse_args()
+
 
 # Run the app
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    args = parse_args()
+    DB_PATH = os.path.expanduser(args.db_path)
+    storage_backend = args.storage
+    # Spawned analytics workers re-run the main script, rebuilding the whole app, unless it is named
+    # like a __main__.py, which multiprocessing leaves alone. They only need sensor_analytics.
+    sys.modules['__main__'].__spec__ = importlib.machinery.ModuleSpec('__main__', None)
+    if args.production:
+        from waitress import serve
+        serve(server, host=args.host, port=args.port, threads=args.threads)
+    else:
+        app.run_server(debug=True, host=args.host, port=args.port)
@@ -1,3 +1,11 @@
+import argparse
+import asyncio
+import collections
+import csv
+import gzip
+import io
+import queue
+import select
 import serial
 import sqlite3
 import time
@@ -5,18 +13,140 @@ from datetime import datetime
 import threading
 import serial.tools.list_ports
 import os
+import socket
+import numpy as np
+import pandas as pd
+import alerts
+import metrics
+import sensor_archive
+import sensor_db
+import sensor_schema
+import sensor_storage
+from reading_spool import ReadingSpool, spool_path_for
+from rolling_stats import RollingStats
+from wire_protocol import RecordDecoder
 
 # SQLite Database Path
-db_path = os.path.expanduser('~/SensorsReadings.db')  # Default to user's home directory
+db_path = sensor_db.DB_PATH
 
 # Baud Rate for HC-06 Bluetooth
 baud_rate = 9600
 
+# Ingest mode: WAL journal with group commit.
+# A batch is flushed when it holds batch_size rows or its oldest row is flush_interval_ms old,
+# whichever comes first. batch_size = 1 gives the old commit-per-reading behaviour.
+journal_mode = 'wal'
+busy_timeout_ms = 5000
+batch_size = 50
+flush_interval_ms = 1000
+
+# Multi-device mode: serial port -> device_id, read concurrently by the asyncio engine.
+# Empty means the single auto-detected port, tagged with device_id.
+devices = {}
+device_id = sensor_db.DEFAULT_DEVICE_ID
+silence_timeout = 10  # Seconds without data before a port is reopened
+device_poll_interval = 0.05  # Seconds between checks of a port the event loop cannot watch (Windows)
+
+# Reconnects try the last port that delivered readings first, found again by USB VID/PID and serial
+# number if it comes back under another name, with capped exponential backoff between attempts.
+# A background watcher rescans the ports, so a reappearing device is retried at once and a vanished
+# one is given up on without waiting for silence_timeout.
+reconnect_backoff_initial = 0.25
+reconnect_backoff_max = 8
+hotplug_poll_interval = 0.5
+last_good_port = None  # (device, vid, pid, serial_number)
+present_ports = set()
+port_change = threading.Condition()
+
+# 1 min / 15 min / 1 h statistics of every column, updated per reading and saved with each batch
+rolling = RollingStats()
+
+# Threshold and heat index danger alerts, evaluated per reading; transitions are saved with the batch
+alert_engine = alerts.AlertEngine()
+alert_batch = []
+
+# Backend holding the raw readings (see sensor_storage); rollups and statistics always stay in SQLite
+storage_backend = sensor_storage.STORAGE_BACKEND
+storage_dir = None
+storage = None
+
+# Cold tier for readings moved out of SQLite by --archive-older-than-days (None: next to the database)
+archive_dir = None
+
+# Ingest pipeline: serial readers timestamp each reading and put it on a bounded queue drained by
+# one writer thread, so reads never wait on SQLite. Readings overflow into an fsynced spool file when
+# the queue is full or the database refuses writes, and are replayed once it accepts them again.
+# Only the writer appends to the spool, so readings are spooled, and stored, in the order they arrived:
+# once a reading finds the queue full, it and every later one wait in overflow until the writer has
+# taken everything queued before them. After a failed write the writer leaves the database alone for
+# spool_retry_interval seconds and spools whatever arrives meanwhile, so it keeps up with the readers.
+queue_size = 10000
+readings_queue = None
+overflow = collections.deque()
+overflow_size = 100000  # Readings held beyond the queue; later ones are dropped (and counted) until it drains
+spool_path = None
+spool = None
+spool_replay_rows = 10000
+spool_retry_interval = 5  # Seconds without database writes after one fails
+database_retry_at = 0.0  # time.time() before which the writer does not try the database
+# Every reading gets its own ts_ms, increasing in queue order across all devices, so a reading is
+# identified by (device_id, ts_ms) and the dashboard can resume after the newest ts_ms it has drawn
+enqueue_lock = threading.Lock()
+last_ts_ms = 0
+metrics_interval = 60  # Seconds between pipeline metrics reports (0 disables them)
+ingest_metrics = {'queue_high_water': 0, 'spooled': 0, 'replayed': 0, 'dropped': 0}
+
+# Prometheus metrics on http://127.0.0.1:metrics_port/metrics (0 disables the endpoint).
+# Readers update counters once per received chunk, the writer once per batch.
+metrics_port = 9101
+print_raw_data = True  # Print every received line for debugging; --no-print-raw turns it off
+check_ranges = True  # Reject readings outside sensor_schema's physical ranges; --no-range-check turns it off
+LINES_RECEIVED = metrics.Counter('sensor_ingest_lines_total', "Records received from the serial ports", ['device'])
+PARSE_ERRORS = metrics.Counter('sensor_ingest_parse_errors_total',
+                               "Malformed or rejected records and binary frames failing their CRC", ['device'])
+OUT_OF_RANGE = metrics.Counter('sensor_ingest_out_of_range_total',
+                               "Values outside the physical range of their field", ['device', 'field'])
+FRAMES_LOST = metrics.Counter('sensor_ingest_frames_lost_total',
+                              "Binary frames missing from the sequence numbers", ['device'])
+RECONNECTS = metrics.Counter('sensor_ingest_reconnects_total', "Serial port reconnections", ['device'])
+RECONNECT_SECONDS = metrics.Histogram('sensor_ingest_reconnect_seconds',
+                                      "Time from losing a serial port to reopening it", ['device'],
+                                      buckets=[0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300])
+GAP_SECONDS = metrics.Histogram('sensor_ingest_gap_seconds',
+                                "Time between the last reading before a reconnect and the first one after it",
+                                ['device'], buckets=[0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300])
+COMMIT_SECONDS = metrics.Histogram('sensor_ingest_commit_seconds', "Time to write and commit one batch")
+COMMITTED = metrics.Counter('sensor_ingest_readings_committed_total', "Readings committed to the database")
+READING_DELAY = metrics.Histogram('sensor_ingest_reading_delay_seconds',
+                                  "Time from a batch's oldest reading arriving to its commit")
+metrics.Gauge('sensor_ingest_queue_depth', "Readings waiting for the writer",
+              lambda: readings_queue.qsize() if readings_queue else 0)
+metrics.Gauge('sensor_ingest_queue_high_water', "Deepest the reading queue has been",
+              lambda: ingest_metrics['queue_high_water'])
+metrics.Gauge('sensor_ingest_overflow_depth', "Readings that found the queue full, waiting to be spooled",
+              lambda: len(overflow))
+metrics.Gauge('sensor_ingest_spool_pending', "Spooled readings and alert events waiting to be replayed",
+              lambda: spool.pending_rows if spool else 0)
+metrics.Gauge('sensor_ingest_spool_bytes', "Size of the spool still to be replayed",
+              lambda: spool.size() if spool else 0)
+for name in ('spooled', 'replayed', 'dropped'):
+    metrics.Gauge(f'sensor_ingest_readings_{name}_total', f"Readings {name} by the ingest pipeline",
+                  lambda name=name: ingest_metrics[name], kind='counter')
+
+# Bulk replay of captured logs: bytes read per chunk and rows per transaction
+replay_chunk_bytes = 8 * 1024 * 1024
+replay_transaction_rows = 100000
+
+# Commit notifications for the dashboard's live updates (0 disables them)
+notify_port = sensor_db.COMMIT_NOTIFY_PORT
+notify_socket = None
+
 # Serial connection variables
 ser = None
 readings_batch = []
-batch_size = 1  # Adjust batch size for real-time or testing
+batch_started_time = None
 last_data_time = time.time()
+stop_event = threading.Event()
 
 
 def ensure_db_directory_exists():
@@ -28,15 +158,34 @@ def ensure_db_directory_exists():
 
 
 def list_serial_ports():
-    """List all available serial ports on the system."""
+    """List all available serial ports on the system, the last good port first."""
     ports = serial.tools.list_ports.comports()
-    return [port.device for port in ports]
+    if last_good_port is None:
+        return [port.device for port in ports]
+    device, vid, pid, serial_number = last_good_port
+
+    def rank(port):
+        # A USB adapter keeps its VID/PID and serial number when it comes back as another device
+        if vid is not None and (port.vid, port.pid, port.serial_number) == (vid, pid, serial_number):
+            return 0
+        return 0 if port.device == device else 1
+    return [port.device for port in sorted(ports, key=rank)]
 
 
-def open_serial_connection(max_attempts=5):
+def remember_port(device):
+    """Record the port that delivered readings so reconnects try it first."""
+    global last_good_port
+    for port in serial.tools.list_ports.comports():
+        if port.device == device:
+            last_good_port = (port.device, port.vid, port.pid, port.serial_number)
+            return
+    last_good_port = (device, None, None, None)
+
+
+def open_serial_connection():
     """
-    Scan and connect to an available Bluetooth serial port.
-    Retry multiple attempts for each port.
+    Scan and connect to an available Bluetooth serial port, trying each once, the last good port first.
+    The reader waits for data itself, so there is no settling delay after opening.
     """
     global ser
     ports = list_serial_ports()
@@ -45,154 +194,920 @@ def open_serial_connection(max_attempts=5):
         return None
 
     for port in ports:
-        for attempt in range(1, max_attempts + 1):
-            try:
-                print(f"Attempting to connect to {port} (Attempt {attempt}/{max_attempts})...")
-                ser = serial.Serial(port, baud_rate, timeout=1)
-                time.sleep(2)  # Allow time for connection
-                print(f"Bluetooth connected successfully on {port}.")
-                return ser
-            except serial.SerialException as e:
-                print(f"Failed to connect to {port}: {e}")
-            time.sleep(1)  # Wait before retrying
+        try:
+            print(f"Attempting to connect to {port}...")
+            ser = serial.Serial(port, baud_rate, timeout=1)
+            print(f"Bluetooth connected successfully on {port}.")
+            return ser
+        except serial.SerialException as e:
+            print(f"Failed to connect to {port}: {e}")
     print("Failed to establish a Bluetooth connection on any port.")
     return None
 
 
+def scan_ports():
+    """Rescan the serial ports and configured device paths, waking reconnects when one appears."""
+    global present_ports
+    ports = {port.device for port in serial.tools.list_ports.comports()}
+    ports |= {port for port in devices if os.path.exists(port)}  # Also covers rfcomm nodes and symlinks
+    if ports - present_ports:
+        with port_change:
+            port_change.notify_all()
+    present_ports = ports
+
+
+def watch_ports():
+    """Background hotplug watcher: rescan every hotplug_poll_interval seconds."""
+    while not stop_event.wait(hotplug_poll_interval):
+        try:
+            scan_ports()
+        except OSError as e:
+            print(f"Port scan failed: {e}")
+
+
+def start_port_watcher():
+    scan_ports()  # Synchronously, so present_ports is valid before any reader looks at it
+    threading.Thread(target=watch_ports, name='port-watcher', daemon=True).start()
+
+
+def wait_for_port_change(timeout):
+    """Sleep up to timeout seconds, returning early when a serial port appears."""
+    with port_change:
+        port_change.wait(timeout)
+
+
+def open_database():
+    """Open the database for writing using the configured journal mode and busy timeout."""
+    conn = sqlite3.connect(db_path, timeout=busy_timeout_ms / 1000)
+    mode = conn.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()[0]
+    if mode == 'wal':
+        # WAL keeps readers and the writer from blocking each other; NORMAL sync is durable
+        # against application crashes and only fsyncs at checkpoints.
+        conn.execute("PRAGMA synchronous=NORMAL")
+    print(f"Database opened at {db_path} (journal mode: {mode}).")
+    return conn
+
+
 def create_table(cursor):
-    """Create the sensor readings table if it doesn't exist."""
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sensor_readings (
-            real_time TEXT,
-            temperature REAL,
-            humidity REAL,
-            co_level REAL,
-            heat_index REAL,
-            air_quality_index REAL,
-            mean_heat_index REAL,
-            std_dev_heat_index REAL,
-            mean_aqi REAL,
-            std_dev_aqi REAL
-        )
-    ''')
-    print("Table created or verified successfully.")
+    """Create the sensor readings table if it doesn't exist and migrate it to the current schema."""
+    cursor.execute(sensor_schema.create_table_sql())
+    cursor.connection.commit()
+    version = sensor_db.migrate(cursor.connection)
+    print(f"Table created or verified successfully (schema version {version}).")
 
 
-def process_data(line, cursor, conn):
-    """Process the incoming data and add it to the SQLite database in batches."""
-    global readings_batch, last_data_time
-    data = line.split(',')
+def open_storage(conn):
+    """Open the configured raw readings backend for the writer connection."""
+    global storage
+    if storage_backend == 'mmap':
+        storage = sensor_storage.MmapStorage(storage_dir)
+    else:
+        storage = sensor_storage.SQLiteStorage.for_connection(conn, archive_dir)
+    print(f"Storing readings with the {storage_backend} backend.")
+    return storage
 
-    print(f"Raw data received: {repr(line)}")  # Print raw data for debugging
 
-    if len(data) == 9:  # Expecting 9 values
-        try:
-            # Extract sensor readings
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            temperature = float(data[0])
-            humidity = float(data[1])
-            co_level = float(data[2])
-            heat_index = float(data[3])
-            air_quality_index = float(data[4])
-            mean_heat_index = float(data[5])
-            std_dev_heat_index = float(data[6])
-            mean_aqi = float(data[7])
-            std_dev_aqi = float(data[8])
-
-            # Add reading to batch
-            readings_batch.append((timestamp, temperature, humidity, co_level, heat_index, air_quality_index,
-                                   mean_heat_index, std_dev_heat_index, mean_aqi, std_dev_aqi))
-
-            # Update the last data time
-            last_data_time = time.time()
-
-            # Insert data into the database once batch is ready
-            if len(readings_batch) >= batch_size:
+def load_alert_state(conn):
+    """Resume every alert from its last recorded state."""
+    count = alert_engine.load(conn)
+    if count:
+        print(f"Alert state restored for {count} alert(s).")
+
+
+def load_rolling_stats(conn):
+    """Warm up the rolling statistics from the last hour of stored readings."""
+    now_ms = int(time.time() * 1000)
+    count = rolling.load(storage.range(now_ms - max(sensor_db.ROLLING_WINDOWS.values()), now_ms))
+    if count:
+        print(f"Rolling statistics restored for {count} device(s).")
+
+
+def decode_readings(decoder, data, source=None):
+    """
+    Decode received bytes and queue every valid reading. Returns how many were queued.
+    CSV lines are parsed together by the schema decoder; readings with a value outside its
+    physical range are rejected and counted per field.
+    """
+    source = source or device_id
+    crc_errors, dropped_frames = decoder.crc_errors, decoder.dropped_frames
+    records = decoder.feed(data)
+    lines = [record for record in records if isinstance(record, str)]
+    if print_raw_data:
+        for line in lines:
+            print(f"Raw data received: {repr(line)}")  # Print raw data for debugging
+
+    values, _ = sensor_schema.decode_lines(lines)
+    frames = [record.values for record in records if not isinstance(record, str)]
+    if frames:
+        values = np.concatenate([values, np.array(frames, dtype=np.float64)])
+    valid, out_of_range = sensor_schema.validate(values, check_ranges)
+    queued = enqueue_readings(values[valid], source)
+
+    LINES_RECEIVED.labels(source).inc(len(records))
+    rejected = [(column, count) for column, count in out_of_range.items() if count]
+    for column, count in rejected:
+        OUT_OF_RANGE.labels(source, column).inc(count)
+    if rejected:
+        print(f"[{source}] Rejected reading(s) with impossible values: "
+              + ', '.join(f"{column} x{count}" for column, count in rejected))
+    errors = len(records) - len(values) + int((~valid).sum()) + decoder.crc_errors - crc_errors
+    if errors:
+        PARSE_ERRORS.labels(source).inc(errors)
+    if decoder.dropped_frames > dropped_frames:
+        FRAMES_LOST.labels(source).inc(decoder.dropped_frames - dropped_frames)
+    return queued
+
+
+def enqueue_readings(values, source=None):
+    """
+    Timestamp a batch of readings (rows of nine values) as it arrives and queue it for the writer.
+    Readings received together get consecutive milliseconds from the arrival time on, after the
+    last reading queued; real_time is formatted once per second they cover.
+    Never blocks: when the queue is full the remaining readings go to overflow for the writer to spool.
+    """
+    global last_ts_ms
+    if not len(values):
+        return 0
+    source = source or device_id
+    with enqueue_lock:
+        first = max(int(time.time() * 1000), last_ts_ms + 1)
+        last_ts_ms = first + len(values) - 1
+        timestamps = {second: datetime.fromtimestamp(second).strftime('%Y-%m-%d %H:%M:%S')
+                      for second in range(first // 1000, last_ts_ms // 1000 + 1)}
+        rows = [(timestamps[ts_ms // 1000], *reading, ts_ms, source)
+                for ts_ms, reading in enumerate(values.tolist(), first)]
+        if not overflow:
+            for i, row in enumerate(rows):
                 try:
-                    cursor.executemany('''
-                        INSERT INTO sensor_readings (
-                            real_time, temperature, humidity, co_level, heat_index,
-                            air_quality_index, mean_heat_index, std_dev_heat_index,
-                            mean_aqi, std_dev_aqi
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', readings_batch)
-                    conn.commit()
-                    print("Data committed to the database.")
-
-                    # Print the last inserted entry for confirmation
-                    cursor.execute("SELECT * FROM sensor_readings ORDER BY rowid DESC LIMIT 1")
-                    last_entry = cursor.fetchone()
-                    print("Last entry in the database:", last_entry)
-
-                    readings_batch.clear()  # Clear batch after committing
-                except sqlite3.Error as e:
-                    print(f"Database insertion error: {e}")
-        except ValueError as e:
-            print(f"Data processing error: {e}")
+                    readings_queue.put_nowait(row)
+                except queue.Full:
+                    rows = rows[i:]
+                    break
+            else:
+                rows = []
+        room = max(0, overflow_size - len(overflow))
+        overflow.extend(rows[:room])
+        ingest_metrics['dropped'] += len(rows) - len(rows[:room])
+    depth = readings_queue.qsize()
+    if depth > ingest_metrics['queue_high_water']:
+        ingest_metrics['queue_high_water'] = depth
+    return len(rows)
+
+
+def spool_readings(rows, events=()):
+    """Append readings the database cannot take now to the spool; they are only lost if that fails too."""
+    try:
+        spool.append(rows, events)
+        ingest_metrics['spooled'] += len(rows)
+    except OSError as e:
+        ingest_metrics['dropped'] += len(rows)
+        print(f"Spool write failed, {len(rows)} reading(s) dropped: {e}")
+
+
+def process_reading(row):
+    """Update the rolling statistics and alerts with one reading, in arrival order; returns its alert events."""
+    source, ts_ms, values = row[11], row[10], row[1:10]
+    rolling.add(source, ts_ms, values)
+    events = alert_engine.update(source, ts_ms, values)
+    for event in events:
+        print(f"[{event.device_id}] Alert {event.alert}: {event.previous_state} -> {event.state} "
+              f"(value {event.value:.2f})")
+    return events
+
+
+def add_reading(row, cursor, conn):
+    """Add one timestamped reading to the batch. Runs on the writer thread."""
+    global batch_started_time
+    if not readings_batch:
+        batch_started_time = time.time()
+    readings_batch.append(row)
+    events = process_reading(row)
+
+    if events:
+        alert_batch.extend(events)
+        flush_batch(cursor, conn)  # Alerts are committed and announced with the reading that raised them
+        return
+
+    # Insert data into the database once batch is ready
+    flush_batch_if_due(cursor, conn)
+
+
+def database_available():
+    """Whether the writer may try the database: no write has failed in the last spool_retry_interval seconds."""
+    return time.time() >= database_retry_at
+
+
+def database_failed(message):
+    """Back off from the database after a failed write; until then everything goes to the spool."""
+    global database_retry_at
+    database_retry_at = time.time() + spool_retry_interval
+    print(f"{message}. Spooling readings for {spool_retry_interval:g} seconds before trying again.")
+
+
+def flush_batch(cursor, conn):
+    """Insert all batched readings in a single transaction, or spool them if the database refuses writes."""
+    global batch_started_time
+    if not readings_batch:
+        return
+    # Spooled readings are stored first so rollups see every device's readings in order
+    if database_available() and (not spool.pending_rows or replay_spool(conn)):
+        try:
+            start = time.perf_counter()
+            storage.append(readings_batch)
+            # Keep the 1 min / 1 h / 1 day rollups current in the same transaction
+            sensor_db.update_rollups(conn, [(row[11], row[10], row[1:10]) for row in readings_batch])
+            rolling.save(conn)
+            alerts.save_events(conn, alert_batch)
+            conn.commit()
+            storage.commit()  # Publishes the rows in backends outside SQLite
+            COMMIT_SECONDS.observe(time.perf_counter() - start)
+            COMMITTED.inc(len(readings_batch))
+            READING_DELAY.observe(time.time() - readings_batch[0][10] / 1000)
+            print(f"{len(readings_batch)} reading(s) committed to the database.")
+            notify_commit(readings_batch[-1][10])  # ts_ms of the newest reading
+        except (sqlite3.Error, OSError) as e:  # OSError: the mmap backend's files
+            conn.rollback()
+            storage.rollback()
+            database_failed(f"Database insertion error: {e}")
+            spool_readings(readings_batch, alert_batch)
+    else:
+        spool_readings(readings_batch, alert_batch)
+
+    readings_batch.clear()  # Clear batch after committing or spooling
+    alert_batch.clear()
+    batch_started_time = None
+
+
+def spool_rows(rows):
+    """Run readings through the rolling statistics and alerts, then spool them with their alert events."""
+    for begin in range(0, len(rows), spool_replay_rows):
+        chunk = rows[begin:begin + spool_replay_rows]
+        spool_readings(chunk, [event for row in chunk for event in process_reading(row)])
+
+
+def spool_overflow(cursor, conn):
+    """
+    Spool the readings that found the queue full. Called once the queue is empty, so everything
+    received before them has been batched; the batch is stored first to keep the order.
+    """
+    flush_batch(cursor, conn)
+    with enqueue_lock:  # All at once: readers return to the queue only when nothing is left behind them
+        rows = list(overflow)
+        overflow.clear()
+    spool_rows(rows)
+
+
+def spool_backlog(cursor, conn):
+    """
+    While the database is backed off: spool the batch, everything queued and the overflow, in that
+    (arrival) order, without waiting for the queue to empty.
+    """
+    flush_batch(cursor, conn)  # Spools, as the database is not tried
+    with enqueue_lock:
+        rows = []
+        while True:
+            try:
+                rows.append(readings_queue.get_nowait())
+            except queue.Empty:
+                break
+        rows.extend(overflow)
+        overflow.clear()
+    spool_rows(rows)
+
+
+def replay_spool(conn):
+    """
+    Store spooled readings and alert events, oldest first, spool_replay_rows per transaction.
+    Returns True once the spool is empty, False if the database still refuses writes.
+    """
+    if not database_available():
+        return False
+    while spool.pending_rows:
+        rows, events, end, lines = spool.read(spool_replay_rows)
+        if not lines:
+            break
+        try:
+            if rows:
+                storage.append(rows)
+                sensor_db.update_rollups(conn, [(row[11], row[10], row[1:10]) for row in rows])
+            alerts.save_events(conn, events)
+            conn.commit()
+            storage.commit()
+        except (sqlite3.Error, OSError) as e:
+            conn.rollback()
+            storage.rollback()
+            database_failed(f"Spool replay failed: {e}")
+            return False
+        spool.advance(end, lines)
+        ingest_metrics['replayed'] += len(rows)
+        print(f"{len(rows)} spooled reading(s) replayed into the database.")
+        if rows:
+            notify_commit(rows[-1][10])
+    return True
+
+
+def pipeline_metrics():
+    """Queue, spool and loss counters for sizing queue_size and the spool's disk."""
+    return dict(ingest_metrics, queue_depth=readings_queue.qsize() if readings_queue else 0,
+                queue_size=queue_size, spool_pending=spool.pending_rows if spool else 0,
+                spool_bytes=spool.size() if spool else 0)
+
+
+def report_metrics():
+    current = pipeline_metrics()
+    print(f"Ingest pipeline: queue {current['queue_depth']}/{current['queue_size']} "
+          f"(high water {current['queue_high_water']}), spool {current['spool_pending']} line(s) / "
+          f"{current['spool_bytes'] / 1e6:.1f} MB pending, {current['spooled']} spooled, "
+          f"{current['replayed']} replayed, {current['dropped']} dropped.")
+
+
+def notify_commit(ts_ms):
+    """Tell a local dashboard that new readings were committed. Fire-and-forget over loopback UDP."""
+    global notify_socket
+    if not notify_port:
+        return
+    if notify_socket is None:
+        notify_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        notify_socket.sendto(str(ts_ms).encode(), ('127.0.0.1', notify_port))
+    except OSError:
+        pass  # Nobody listening is not an error
+
+
+def flush_batch_if_due(cursor, conn):
+    """Flush the batch once it is full or its oldest reading has waited flush_interval_ms."""
+    if not readings_batch:
+        return
+    if (len(readings_batch) >= batch_size
+            or (time.time() - batch_started_time) * 1000 >= flush_interval_ms):
+        flush_batch(cursor, conn)
 
 
 def reconnect_bluetooth():
-    """Attempt to reconnect to Bluetooth if the connection is lost."""
+    """Reconnect to Bluetooth, backing off exponentially up to reconnect_backoff_max between attempts."""
     global ser
+    lost_at = time.time() if ser is not None else None  # None on the first connection
     ser = None
-    while ser is None:
+    delay = reconnect_backoff_initial
+    while ser is None and not stop_event.is_set():
         print("Reconnecting to Bluetooth...")
         ser = open_serial_connection()
         if ser:
             print("Reconnected successfully.")
+            if lost_at is not None:
+                RECONNECTS.labels(device_id).inc()
+                RECONNECT_SECONDS.labels(device_id).observe(time.time() - lost_at)
         else:
-            print("Reconnection failed. Retrying in 2 seconds...")
-            time.sleep(2)
+            print(f"Reconnection failed. Retrying in {delay:g} seconds or as soon as a port appears...")
+            wait_for_port_change(delay)
+            delay = min(delay * 2, reconnect_backoff_max)
+
+
+def read_available(port, timeout=1.0):
+    """
+    Wait up to timeout seconds for data without spinning, then return every byte the port has
+    (b'' on timeout). Blocks in select() on the port's file descriptor where it has one (POSIX);
+    otherwise blocks in a one-byte read bounded by the port's own timeout.
+    """
+    try:
+        fd = port.fileno()
+    except (AttributeError, OSError):
+        fd = None
+    if fd is not None:
+        readable, _, _ = select.select([fd], [], [], timeout)
+        if not readable:
+            return b''
+        # A readable port with nothing waiting has gone away; pyserial raises SerialException
+        return port.read(port.in_waiting or 1)
+    data = port.read(1)
+    return data + port.read(port.in_waiting) if data else data
 
 
 def read_bluetooth():
-    """Read data from the Bluetooth module continuously."""
+    """
+    Read data from the Bluetooth module continuously and queue every reading for the writer.
+    The thread sleeps until the port is readable, then takes everything available in one read;
+    the decoder splits it into complete records and keeps any partial one for the next read.
+    """
     global ser, last_data_time
-    ensure_db_directory_exists()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Create the table if it doesn't exist
-    create_table(cursor)
+    decoder = RecordDecoder()
+    last_reading_time = None  # Of the last reading before a reconnect, until data flows again
+    confirmed = False  # Whether the open port has delivered readings yet
 
     try:
-        while True:
-            # Check for timeout (no data received for more than 10 seconds)
-            if time.time() - last_data_time > 10:
-                print("No data received for 10 seconds. Restarting connection...")
+        while not stop_event.is_set():
+            # Check for timeout (no data received for more than silence_timeout seconds)
+            if time.time() - last_data_time > silence_timeout:
+                print(f"No data received for {silence_timeout} seconds. Restarting connection...")
+                if confirmed:
+                    last_reading_time = last_data_time
+                if ser:
+                    ser.close()
                 reconnect_bluetooth()
+                last_data_time = time.time()
+                confirmed = False
 
             if ser is None or not ser.is_open:
                 reconnect_bluetooth()
+                if ser is None:
+                    continue  # Stopping
 
             try:
-                if ser.in_waiting > 0:
-                    line = ser.readline().decode('utf-8').strip()
-                    process_data(line, cursor, conn)
+                data = read_available(ser)
+                # The hotplug watcher's port list covers COM ports too, which have no device node
+                if not data and ser.port not in present_ports:
+                    raise serial.SerialException(f"{ser.port} disappeared")
+                # CSV lines and binary frames are told apart per record by the decoder
+                if data and decode_readings(decoder, data):
+                    last_data_time = time.time()
+                    if not confirmed:
+                        confirmed = True
+                        remember_port(ser.port)
+                    if last_reading_time is not None:
+                        GAP_SECONDS.labels(device_id).observe(last_data_time - last_reading_time)
+                        last_reading_time = None
             except (serial.SerialException, OSError) as e:
                 print(f"Bluetooth connection lost: {e}. Reconnecting...")
+                if confirmed:
+                    last_reading_time = last_data_time
                 ser.close()  # Close the current connection before trying to reconnect
                 reconnect_bluetooth()
+                last_data_time = time.time()
+                confirmed = False
     except KeyboardInterrupt:
         print("Program interrupted by user.")
     finally:
-        conn.close()
         if ser and ser.is_open:
             ser.close()
-        print("Database and serial connections closed.")
-
+        print("Serial connection closed.")
 
-# Run the Bluetooth reading in a separate thread
-bluetooth_thread = threading.Thread(target=read_bluetooth, daemon=True)
-bluetooth_thread.start()
 
-# Keep the main thread alive
-try:
+async def read_device(port, source):
+    """
+    Read one serial port without blocking the event loop and queue its readings for the writer.
+    The port is reopened after errors, when it disappears, or after silence_timeout seconds without data.
+    """
+    loop = asyncio.get_running_loop()
+    lost_at = None
+    gap_start = None  # Time of the last reading before a reconnect, until readings flow again
+    delay = reconnect_backoff_initial
     while True:
-        time.sleep(1)
-except KeyboardInterrupt:
-    print("Program interrupted.")
-finally:
-    if ser and ser.is_open:
-        ser.close()
-    print("Serial connection closed.")
+        try:
+            port_ser = await loop.run_in_executor(None, lambda: serial.Serial(port, baud_rate, timeout=0))
+        except serial.SerialException as e:
+            print(f"[{source}] Failed to connect to {port}: {e}. "
+                  f"Retrying in {delay:g} seconds or as soon as it appears...")
+            await loop.run_in_executor(None, wait_for_port_change, delay)
+            delay = min(delay * 2, reconnect_backoff_max)
+            continue
+        print(f"[{source}] Connected on {port}.")
+        delay = reconnect_backoff_initial
+        if lost_at is not None:
+            RECONNECTS.labels(source).inc()
+            RECONNECT_SECONDS.labels(source).observe(time.time() - lost_at)
+
+        decoder = RecordDecoder()
+        received = []
+        data_ready = asyncio.Event()
+
+        def on_readable():
+            try:
+                received.append(port_ser.read(port_ser.in_waiting or 1))
+            except (serial.SerialException, OSError) as e:
+                print(f"[{source}] Connection lost: {e}")
+                port_ser.close()
+            data_ready.set()
+
+        async def poll_readable():
+            while port_ser.is_open:
+                try:
+                    waiting = port_ser.in_waiting
+                except (serial.SerialException, OSError):
+                    waiting = 1  # on_readable reports the error and closes the port
+                if waiting:
+                    on_readable()
+                await asyncio.sleep(device_poll_interval)
+
+        # The loop watches the port's file descriptor where it has one; Windows ports have none,
+        # and the Proactor loop cannot watch one anyway, so there the port is polled instead
+        poller = None
+        try:
+            fd = port_ser.fileno()
+            loop.add_reader(fd, on_readable)
+        except (AttributeError, NotImplementedError, io.UnsupportedOperation):
+            fd = None
+            poller = asyncio.create_task(poll_readable())
+        connected_at = last_data = time.time()
+        try:
+            while port_ser.is_open:
+                try:
+                    await asyncio.wait_for(data_ready.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    if port not in present_ports:
+                        print(f"[{source}] {port} disappeared. Restarting connection...")
+                        break
+                    if time.time() - last_data > silence_timeout:
+                        print(f"[{source}] No data received for {silence_timeout} seconds. Restarting connection...")
+                        break
+                    continue
+                data_ready.clear()
+                if decode_readings(decoder, b''.join(received), source):
+                    last_data = time.time()
+                    if gap_start is not None:
+                        GAP_SECONDS.labels(source).observe(last_data - gap_start)
+                        gap_start = None
+                received.clear()
+        finally:
+            if fd is not None:
+                loop.remove_reader(fd)
+            else:
+                poller.cancel()
+            port_ser.close()
+            lost_at = time.time()
+            if last_data > connected_at:
+                gap_start = last_data  # Readings had arrived; the gap runs from the last of them
+
+
+def write_readings():
+    """
+    Writer thread: the only database connection. Drains the reading queue into batches until
+    stop_event is set and the queue and overflow are empty, replaying the spool whenever the database allows.
+    """
+    global database_retry_at
+    conn = open_database()
+    cursor = conn.cursor()
+    create_table(cursor)
+    open_storage(conn)
+    load_rolling_stats(conn)
+    load_alert_state(conn)
+    if spool.pending_rows:
+        print(f"{spool.pending_rows} spooled line(s) waiting to be replayed from {spool.path}.")
+        replay_spool(conn)
+
+    last_report = time.time()
+    try:
+        while not (stop_event.is_set() and readings_queue.empty() and not overflow):
+            if not database_available():
+                # Spool at the pace readings arrive, one fsync per flush interval, until the retry is due
+                spool_backlog(cursor, conn)
+                stop_event.wait(min(flush_interval_ms / 1000, max(0.0, database_retry_at - time.time())))
+            else:
+                # Wake up when the pending batch is due, or every second while idle
+                timeout = 1.0
+                if overflow:
+                    timeout = 0.0
+                elif readings_batch:
+                    timeout = max(0.0, batch_started_time + flush_interval_ms / 1000 - time.time())
+                try:
+                    add_reading(readings_queue.get(timeout=timeout), cursor, conn)
+                except queue.Empty:
+                    if overflow:
+                        spool_overflow(cursor, conn)
+                flush_batch_if_due(cursor, conn)
+                if spool.pending_rows and not readings_batch:
+                    replay_spool(conn)
+
+            now = time.time()
+            if metrics_interval and now - last_report >= metrics_interval:
+                report_metrics()
+                last_report = now
+    finally:
+        database_retry_at = 0.0  # One last try at storing everything before exiting
+        flush_batch(cursor, conn)
+        if overflow:
+            spool_overflow(cursor, conn)
+        if spool.pending_rows:
+            replay_spool(conn)  # Whatever the database still refuses stays spooled for the next start
+        conn.close()
+        print("Database connection closed.")
+
+
+def start_writer():
+    """Create the reading queue and start the writer thread draining it."""
+    global readings_queue
+    readings_queue = queue.Queue(maxsize=queue_size)
+    writer = threading.Thread(target=write_readings, name='sqlite-writer')
+    writer.start()
+    return writer
+
+
+def stop_writer(writer):
+    """Let the writer store everything queued, then wait for it to close the database."""
+    stop_event.set()
+    writer.join()
+    report_metrics()
+
+
+async def ingest_devices():
+    """Read every configured port concurrently; the writer thread stores what they queue."""
+    writer = start_writer()
+    tasks = [asyncio.create_task(read_device(port, source)) for port, source in devices.items()]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stop_writer(writer)
+
+
+def rebuild_rollups():
+    """Recompute the rollup tables of an existing database from its raw readings."""
+    conn = open_database()
+    create_table(conn.cursor())
+    start = time.time()
+    count = sensor_db.rebuild_rollups(conn)
+    # Archived days are folded back in so the rollups keep covering the full history
+    for _, path in sensor_archive.partitions(archive_dir):
+        df = sensor_archive.read_partition(path, ['device_id', 'ts_ms'] + sensor_db.READING_COLUMNS)
+        sensor_db.update_rollups_frame(conn, df)
+        count += len(df)
+    conn.commit()
+    conn.close()
+    print(f"Rebuilt rollups from {count} readings in {time.time() - start:.1f} seconds.")
+
+
+def archive_old_readings(days):
+    """Move readings older than days into the day-partitioned Parquet archive and reclaim the space."""
+    conn = open_database()
+    create_table(conn.cursor())
+    size_before = os.path.getsize(db_path)
+    start = time.time()
+    before_ms = int((time.time() - days * 24 * 60 * 60) * 1000)
+    moved, partitions = sensor_archive.archive_readings(conn, archive_dir, before_ms)
+    if moved:
+        sensor_archive.reclaim_space(conn)
+    conn.close()
+    print(f"Archived {moved} readings into {partitions} day partition(s) under {archive_dir} "
+          f"in {time.time() - start:.1f} seconds; database {size_before / 1e6:.1f} MB -> "
+          f"{os.path.getsize(db_path) / 1e6:.1f} MB.")
+
+
+def read_log_chunks(path, chunk_bytes=replay_chunk_bytes):
+    """Yield complete lines from a captured serial log (plain or gzip) in large text chunks."""
+    with open(path, 'rb') as raw:
+        compressed = raw.read(2) == b'\x1f\x8b'
+    log = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+    with log:
+        tail = b''
+        while True:
+            data = log.read(chunk_bytes)
+            if not data:
+                break
+            data = tail + data
+            cut = data.rfind(b'\n') + 1
+            tail = data[cut:]
+            yield data[:cut].decode('utf-8', errors='replace')
+        if tail:
+            yield tail.decode('utf-8', errors='replace')
+
+
+def parse_log_chunk(text):
+    """
+    Parse and validate a chunk of log lines with pandas, returning a DataFrame of readings.
+    Lines with the nine sketch fields are kept; lines with a leading timestamp field keep it in ts_ms,
+    anything else (firmware messages, truncated or corrupted lines, values outside their physical
+    range) is dropped.
+    """
+    lines = pd.Series(text.splitlines(), dtype=object)
+    n_fields = lines.str.count(',') + 1
+
+    frames = []
+    for count, names in ((9, sensor_db.READING_COLUMNS), (10, ['stamp'] + sensor_db.READING_COLUMNS)):
+        selected = lines[n_fields == count]
+        if selected.empty:
+            continue
+        # The C CSV parser does the splitting and float conversion for the whole chunk at once.
+        # Each line carries its line number, so a line the parser skips cannot shift the others;
+        # quotes are plain characters, so a stray one cannot swallow the following lines.
+        numbered = selected.index.astype(str) + ',' + selected
+        values = pd.read_csv(io.StringIO('\n'.join(numbered)), header=None, names=['line'] + names,
+                             index_col='line', dtype={'stamp': str}, quoting=csv.QUOTE_NONE,
+                             on_bad_lines='skip', skip_blank_lines=False)
+        values.index.name = None
+        values['ts_ms'] = log_timestamps_ms(values.pop('stamp')) if count == 10 else np.nan
+        frames.append(values)
+    if not frames:
+        return pd.DataFrame(columns=sensor_db.READING_COLUMNS + ['ts_ms'])
+
+    df = pd.concat(frames).sort_index()  # Restore log order
+    for column in sensor_db.READING_COLUMNS:
+        if not pd.api.types.is_numeric_dtype(df[column]):  # Garbage in the column; bad cells become NaN
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    valid, _ = sensor_schema.validate(df[sensor_db.READING_COLUMNS].to_numpy(dtype=np.float64), check_ranges)
+    valid = pd.Series(valid, index=df.index)
+    # A stamped line whose timestamp did not parse is corrupted, not untimed
+    valid &= df['ts_ms'].notna() | (n_fields[df.index] == 9)
+    return df[valid]
+
+
+def log_timestamps_ms(stamps):
+    """Convert a column of log timestamps (epoch seconds/milliseconds or local date-times) to epoch ms."""
+    numeric = pd.to_numeric(stamps, errors='coerce')
+    ts_ms = numeric.where(numeric > 1e11, numeric * 1000)
+    text = stamps[numeric.isna()]
+    if not text.empty:
+        text = text.str.strip()
+        # The format real_time is stored in parses fastest; anything else falls back to inference
+        parsed = pd.to_datetime(text, errors='coerce', format='%Y-%m-%d %H:%M:%S')
+        retry = parsed.isna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(text[retry], errors='coerce', format='mixed')
+        parsed = parsed.dropna()
+        wall_ms = (parsed - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+        ts_ms[parsed.index] = sensor_db.local_epoch_ms(wall_ms.to_numpy())
+    return ts_ms
+
+
+def replay_logs(paths, period_ms=5000):
+    """
+    Bulk-load captured serial logs into the database with large transactions.
+    Readings without a timestamp in the log are spaced period_ms apart, ending at the file's
+    modification time. Readings already stored for the device at the same ts_ms are skipped,
+    so replaying a file twice does not duplicate it.
+    """
+    conn = open_database()
+    create_table(conn.cursor())
+    total = 0
+    start = time.time()
+    for path in paths:
+        df = pd.concat([parse_log_chunk(text) for text in read_log_chunks(path)], ignore_index=True)
+        if df.empty:
+            print(f"{path}: no readings found.")
+            continue
+
+        untimed = df['ts_ms'].isna()
+        end_ms = int(os.path.getmtime(path) * 1000)
+        offsets = np.arange(untimed.sum())[::-1] * period_ms
+        df.loc[untimed, 'ts_ms'] = end_ms - offsets
+        df['ts_ms'] = df['ts_ms'].astype('int64')
+        df['device_id'] = device_id
+        df = df.sort_values('ts_ms', kind='stable')
+
+        existing = pd.read_sql_query(
+            "SELECT ts_ms FROM sensor_readings WHERE device_id = ? AND ts_ms BETWEEN ? AND ?",
+            conn, params=(device_id, int(df['ts_ms'].iloc[0]), int(df['ts_ms'].iloc[-1]))
+        )
+        df = df[~df['ts_ms'].isin(existing['ts_ms'])]
+        if df.empty:
+            print(f"{path}: every reading is already stored.")
+            continue
+
+        # Same local '%Y-%m-%d %H:%M:%S' text as live readings, formatted by NumPy rather than per row
+        local = sensor_db.local_datetimes(df['ts_ms'].to_numpy())
+        df['real_time'] = np.char.replace(np.datetime_as_string(local, unit='s'), 'T', ' ')
+
+        columns = ['real_time'] + sensor_db.READING_COLUMNS + ['ts_ms', 'device_id']
+        for begin in range(0, len(df), replay_transaction_rows):
+            part = df.iloc[begin:begin + replay_transaction_rows]
+            conn.executemany(f'''
+                INSERT INTO sensor_readings ({', '.join(columns)})
+                VALUES ({', '.join('?' * len(columns))})
+            ''', zip(*(part[column].tolist() for column in columns)))
+            sensor_db.update_rollups_frame(conn, part)
+            conn.commit()
+        total += len(df)
+        print(f"{path}: {len(df)} readings loaded ({int(untimed.sum())} without timestamps).")
+    conn.close()
+    if total:
+        notify_commit(int(time.time() * 1000))
+    print(f"Replayed {total} readings in {time.time() - start:.1f} seconds.")
+
+
+def parse_device(spec):
+    """Parse a PORT[=DEVICE_ID] option; the device id defaults to the port's base name."""
+    port, _, source = spec.partition('=')
+    return port, source or os.path.basename(port)
+
+
+def parse_args():
+    """Parse command-line options for the ingest script."""
+    parser = argparse.ArgumentParser(description="Read sensor data over Bluetooth serial and store it in SQLite.")
+    parser.add_argument('--db-path', default=db_path, help="SQLite database file")
+    parser.add_argument('--journal-mode', default=journal_mode, choices=['wal', 'delete', 'truncate'],
+                        help="SQLite journal mode (default: wal)")
+    parser.add_argument('--busy-timeout-ms', type=int, default=busy_timeout_ms,
+                        help="How long a write waits on a locked database")
+    parser.add_argument('--batch-size', type=int, default=batch_size,
+                        help="Flush after this many readings")
+    parser.add_argument('--flush-interval-ms', type=int, default=flush_interval_ms,
+                        help="Flush once the oldest pending reading is this old")
+    parser.add_argument('--notify-port', type=int, default=notify_port,
+                        help="Loopback UDP port to announce commits on for live dashboards (0 disables)")
+    parser.add_argument('--device', action='append', type=parse_device, default=[], metavar='PORT[=DEVICE_ID]',
+                        help="Read this serial port; repeat to ingest several stations at once")
+    parser.add_argument('--device-id', default=device_id,
+                        help="Device id for the auto-detected port when no --device is given")
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help="Recompute the 1 min / 1 h / 1 day rollup tables and exit")
+    parser.add_argument('--replay', nargs='+', metavar='LOG',
+                        help="Bulk-load captured serial logs (plain or .gz) for --device-id and exit")
+    parser.add_argument('--replay-period-ms', type=int, default=5000,
+                        help="Spacing given to replayed readings that have no timestamp in the log")
+    parser.add_argument('--storage', default=storage_backend, choices=sensor_storage.STORAGE_BACKENDS,
+                        help="Backend for raw readings: SQLite table or memory-mapped column files "
+                             "(default: SENSOR_STORAGE or sqlite)")
+    parser.add_argument('--storage-dir', help="Column file directory for --storage mmap "
+                                              "(default: SENSOR_STORAGE_DIR or next to the database)")
+    parser.add_argument('--archive-older-than-days', type=float, metavar='DAYS',
+                        help="Move whole days of readings older than DAYS into the Parquet archive and exit")
+    parser.add_argument('--archive-dir', help="Archive directory (default: SENSOR_ARCHIVE_DIR or next to the database)")
+    parser.add_argument('--queue-size', type=int, default=queue_size,
+                        help="Readings held in memory for the writer before overflowing into the spool")
+    parser.add_argument('--spool-path', help="Spool file for readings the database cannot take "
+                                             "(default: SENSOR_SPOOL_PATH or next to the database)")
+    parser.add_argument('--metrics-interval', type=float, default=metrics_interval,
+                        help="Seconds between queue and spool metrics reports (0 disables them)")
+    parser.add_argument('--silence-timeout', type=float, default=silence_timeout,
+                        help="Seconds without data before a port is reopened")
+    parser.add_argument('--metrics-port', type=int, default=metrics_port,
+                        help="Loopback port serving Prometheus metrics at /metrics (0 disables it)")
+    parser.add_argument('--no-print-raw', dest='print_raw', action='store_false',
+                        help="Do not print every received line")
+    parser.add_argument('--no-range-check', dest='check_ranges', action='store_false',
+                        help="Store readings even with values outside their physical range, e.g. synthetic test data")
+    args = parser.parse_args()
+    # These read or write the SQLite readings table directly; with mmap they would miss every reading
+    sqlite_only = [('--replay', args.replay), ('--rebuild-rollups', args.rebuild_rollups),
+                   ('--archive-older-than-days', args.archive_older_than_days is not None)]
+    for flag, given in sqlite_only:
+        if given and args.storage != 'sqlite':
+            parser.error(f"{flag} needs the sqlite storage backend, not {args.storage} "
+                         "(set by --storage or SENSOR_STORAGE)")
+    return args
+
+
+def main():
+    global db_path, archive_dir, storage_backend, storage_dir, journal_mode, busy_timeout_ms, batch_size, flush_interval_ms, devices, device_id, notify_port
+    global queue_size, spool_path, spool, metrics_interval, metrics_port, print_raw_data, silence_timeout
+    global check_ranges
+    args = parse_args()
+    db_path = os.path.expanduser(args.db_path)
+    archive_dir = os.path.expanduser(args.archive_dir) if args.archive_dir else sensor_db.archive_dir_for(db_path)
+    storage_backend = args.storage
+    storage_dir = os.path.expanduser(args.storage_dir) if args.storage_dir else sensor_storage.storage_dir_for(db_path)
+    journal_mode = args.journal_mode
+    busy_timeout_ms = args.busy_timeout_ms
+    batch_size = max(1, args.batch_size)
+    flush_interval_ms = args.flush_interval_ms
+    devices = dict(args.device)
+    device_id = args.device_id
+    notify_port = args.notify_port
+    queue_size = max(1, args.queue_size)
+    spool_path = os.path.expanduser(args.spool_path) if args.spool_path else spool_path_for(db_path)
+    metrics_interval = args.metrics_interval
+    metrics_port = args.metrics_port
+    print_raw_data = args.print_raw
+    check_ranges = args.check_ranges
+    silence_timeout = args.silence_timeout
+
+    if args.rebuild_rollups:
+        rebuild_rollups()
+        return
+    if args.replay:
+        replay_logs(args.replay, args.replay_period_ms)
+        return
+    if args.archive_older_than_days is not None:
+        archive_old_readings(args.archive_older_than_days)
+        return
+
+    ensure_db_directory_exists()
+    spool = ReadingSpool(spool_path)
+    if metrics_port:
+        try:
+            metrics.serve(metrics_port)
+            print(f"Metrics served at http://127.0.0.1:{metrics_port}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint disabled, port {metrics_port} is unavailable: {e}")
+    start_port_watcher()
+
+    if devices:
+        try:
+            asyncio.run(ingest_devices())
+        except KeyboardInterrupt:
+            print("Program interrupted.")
+        return
+
+    # Run the Bluetooth reading in a separate thread, feeding the writer thread
+    writer = start_writer()
+    bluetooth_thread = threading.Thread(target=read_bluetooth, daemon=True)
+    bluetooth_thread.start()
+
+    # Keep the main thread alive
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Program interrupted.")
+    finally:
+        # Stop reading, then let the writer store everything queued before exiting
+        stop_event.set()
+        bluetooth_thread.join(timeout=5)
+        if ser and ser.is_open:
+            ser.close()
+        print("Serial connection closed.")
+        stop_writer(writer)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+from collections import namedtuple
+
+from sensor_db import READING_COLUMNS
+
+
+# Function to convert Fahrenheit to Celsius
+def fahrenheit_to_celsius(fahrenheit):
+    return (fahrenheit - 32) / 1.8
+
+
+# Function to return the air quality threshold
+def air_quality_threshold():
+    return 50
+
+
+# Define thresholds for each sensor
+THRESHOLDS = {
+    'temperature': fahrenheit_to_celsius(100),
+    'humidity': 80,
+    'co_level': 200,
+    'heat_index': 45,
+    'air_quality_index': air_quality_threshold()
+}
+
+# Heat index danger bands (°F), lowest first; below the first band is Normal
+HEAT_INDEX_BANDS = [
+    (80, 'Caution'),
+    (90, 'Extreme Caution'),
+    (103, 'Danger'),
+    (125, 'Extreme Danger'),
+]
+ALARM_LEVEL = 3  # Danger and above
+
+# An alert is raised when a value reaches its threshold and cleared only once it falls this far
+# below it, so readings hovering around a threshold do not flap
+HYSTERESIS = {
+    'temperature': 0.5,
+    'humidity': 2,
+    'co_level': 10,
+    'heat_index': 2,
+    'air_quality_index': 5,
+    'heat_index_danger': 2,
+}
+
+# A new state must hold for this many consecutive readings before it is recorded
+DEBOUNCE_READINGS = 2
+
+# Alert name -> (column, [(threshold, state), ...] lowest first, state below the first threshold)
+ALERTS = {
+    sensor: (sensor, [(threshold, 'Exceeded')], 'Normal') for sensor, threshold in THRESHOLDS.items()
+}
+ALERTS['heat_index_danger'] = ('heat_index', HEAT_INDEX_BANDS, 'Normal')
+
+AlertEvent = namedtuple('AlertEvent', ['ts_ms', 'device_id', 'alert', 'level', 'state', 'previous_state', 'value'])
+
+
+def state_name(alert, level):
+    _, bands, normal = ALERTS[alert]
+    return bands[level - 1][1] if level else normal
+
+
+class AlertEngine:
+    """
+    Evaluate every alert on each reading as it is ingested.
+    Levels go up as soon as a threshold is reached and come down only below threshold minus
+    HYSTERESIS; either change must then persist for DEBOUNCE_READINGS readings in a row.
+    update() returns the resulting state transitions as AlertEvents.
+    """
+
+    def __init__(self, debounce=DEBOUNCE_READINGS):
+        self.debounce = debounce
+        self.levels = {}  # (device_id, alert) -> current level
+        self.pending = {}  # (device_id, alert) -> (candidate level, consecutive readings)
+
+    def load(self, conn):
+        """Resume from the last recorded state of every alert."""
+        rows = conn.execute('''
+            SELECT device_id, alert, level FROM alert_events
+            WHERE id IN (SELECT max(id) FROM alert_events GROUP BY device_id, alert)
+        ''')
+        for device, alert, level in rows:
+            self.levels[(device, alert)] = level
+        return len(self.levels)
+
+    def update(self, device, ts_ms, values):
+        events = []
+        for alert, (column, bands, _) in ALERTS.items():
+            value = values[READING_COLUMNS.index(column)]
+            key = (device, alert)
+            level = self.levels.get(key, 0)
+            candidate = sum(value >= threshold for threshold, _ in bands)
+            if candidate < level:
+                # Keep each band until the value drops below its threshold by the hysteresis margin
+                margin = HYSTERESIS.get(alert, 0)
+                candidate = min(level, sum(value > threshold - margin for threshold, _ in bands))
+            if candidate == level:
+                self.pending.pop(key, None)
+                continue
+            pending_level, count = self.pending.get(key, (candidate, 0))
+            count = count + 1 if pending_level == candidate else 1
+            if count < self.debounce:
+                self.pending[key] = (candidate, count)
+                continue
+            self.pending.pop(key, None)
+            self.levels[key] = candidate
+            events.append(AlertEvent(ts_ms, device, alert, candidate, state_name(alert, candidate),
+                                     state_name(alert, level), value))
+        return events
+
+
+def save_events(conn, events):
+    """Insert alert transitions, inside the caller's transaction."""
+    conn.executemany('''
+        INSERT INTO alert_events (ts_ms, device_id, alert, level, state, previous_state, value)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', events)
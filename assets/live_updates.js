@@ -0,0 +1,26 @@
+// Subscribe to commit notifications from the dashboard server and feed them into the
+// live-update store, which triggers the graph callbacks. While the stream is connected
+// the fallback polling interval is switched off.
+(function () {
+    if (!window.EventSource) {
+        return;
+    }
+
+    function setProps(id, props) {
+        if (window.dash_clientside && window.dash_clientside.set_props) {
+            window.dash_clientside.set_props(id, props);
+        }
+    }
+
+    var source = new EventSource('/events');
+    source.onopen = function () {
+        setProps('interval-fallback', {disabled: true});
+    };
+    source.onmessage = function (event) {
+        setProps('live-update', {data: event.data});
+    };
+    source.onerror = function () {
+        // EventSource reconnects on its own; poll in the meantime
+        setProps('interval-fallback', {disabled: false});
+    };
+})();
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import sensor_db
+import sensor_storage
+from sensor_simulator import SimulatedSensor
+
+INGEST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Serial Communication and storage.py')
+
+# Results of every run are appended here; each run is compared with the last one using the same settings
+HISTORY_PATH = 'bench_history.jsonl'
+
+# Metrics checked for regressions: name -> True if higher is better
+TRACKED_METRICS = {
+    'rows_per_sec': True,
+    'commit_latency_ms_p95': False,
+    'serial_to_db_ms_p95': False,
+}
+
+
+def listen_for_commits(sock, commits, stop):
+    """Record (receive time, ts_ms of the newest committed reading) for every commit notification."""
+    sock.settimeout(0.2)
+    while not stop.is_set():
+        try:
+            data, _ = sock.recvfrom(64)
+        except socket.timeout:
+            continue
+        commits.append((time.time(), int(data)))
+
+
+def wait_for_schema(path, timeout=30):
+    """Wait until the ingest script has created and migrated the database."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(path):
+            try:
+                conn = sqlite3.connect(path)
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                conn.close()
+                if version >= sensor_db.SCHEMA_VERSION:
+                    return
+            except sqlite3.Error:
+                pass
+        time.sleep(0.1)
+    raise RuntimeError("Ingest script did not create the database in time.")
+
+
+def percentiles(values, prefix):
+    if not len(values):
+        return {f"{prefix}_p{p}": None for p in (50, 95, 99)}
+    return {f"{prefix}_p{p}": round(float(np.percentile(values, p)), 2) for p in (50, 95, 99)}
+
+
+def run_benchmark(args):
+    """Drive the ingest script with simulated stations and measure what reaches the database."""
+    workdir = tempfile.mkdtemp(prefix='bench_ingest_')
+    db = os.path.join(workdir, 'bench.db')
+
+    # Commit notifications arrive on a free loopback port
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    commits = []
+    stop = threading.Event()
+    listener = threading.Thread(target=listen_for_commits, args=(sock, commits, stop), daemon=True)
+    listener.start()
+
+    # The last field of every reading carries its sequence number so rows can be matched to send times
+    sensors = [
+        SimulatedSensor(os.path.join(workdir, f"sensor{i}"), args.rate, args.jitter, args.corrupt,
+                        args.disconnect_every, binary=args.binary, with_seq=True)
+        for i in range(args.devices)
+    ]
+    for sensor in sensors:
+        sensor.open()
+    command = [sys.executable, INGEST_SCRIPT, '--db-path', db, '--notify-port', str(sock.getsockname()[1]),
+               '--batch-size', str(args.batch_size), '--flush-interval-ms', str(args.flush_interval_ms),
+               '--journal-mode', args.journal_mode, '--storage', args.storage,
+               '--storage-dir', os.path.join(workdir, 'columns'), '--metrics-port', '0', '--no-print-raw',
+               '--no-range-check']
+    for i, sensor in enumerate(sensors):
+        command += ['--device', f"{sensor.link}=sim{i}"]
+    ingest = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_for_schema(db)
+        time.sleep(1)  # Let every reader open its port
+        start = time.time()
+        for sensor in sensors:
+            sensor.thread = threading.Thread(target=sensor.run, daemon=True)
+            sensor.thread.start()
+        time.sleep(args.duration)
+        for sensor in sensors:
+            sensor.stop_event.set()
+            sensor.thread.join()
+        send_end = time.time()
+        # Wait for the last batch to be flushed by the interval timer
+        time.sleep(args.flush_interval_ms / 1000 + 1)
+    finally:
+        ingest.terminate()
+        _, stderr = ingest.communicate(timeout=30)
+        stop.set()
+        listener.join()
+        sock.close()
+        for sensor in sensors:
+            sensor.stop()
+    if ingest.returncode not in (0, -15):
+        print(stderr.decode(errors='replace'), file=sys.stderr)
+
+    conn = sqlite3.connect(db)
+    if args.storage == 'mmap':
+        storage = sensor_storage.MmapStorage(os.path.join(workdir, 'columns'))
+    else:
+        storage = sensor_storage.SQLiteStorage.for_connection(conn)
+    stored = storage.range(None, None)
+    rows = list(zip(stored['device_id'], stored['ts_ms'].tolist(), stored['std_dev_aqi'].tolist()))
+    conn.close()
+
+    sent = sum(sensor.sent for sensor in sensors)
+    corrupted = sum(sensor.corrupted for sensor in sensors)
+    send_times = {f"sim{i}": sensor.send_times for i, sensor in enumerate(sensors)}
+
+    # A row became visible at the first commit whose newest reading is at least as new as the row
+    commit_times = np.array([c[0] for c in commits])
+    commit_ts = np.array([c[1] for c in commits])
+    order = np.argsort(commit_ts, kind='stable')
+    commit_times, commit_ts = commit_times[order], commit_ts[order]
+    commit_latency = []
+    serial_to_db = []
+    for device, ts_ms, seq in rows:
+        i = np.searchsorted(commit_ts, ts_ms)
+        if i == len(commit_ts):
+            continue
+        committed = commit_times[i]
+        commit_latency.append((committed - ts_ms / 1000) * 1000)
+        sent_at = send_times.get(device, {}).get(int(seq)) if seq is not None else None
+        if sent_at is not None:
+            serial_to_db.append((committed - sent_at) * 1000)
+
+    # Throughput over the send window, extended if the ingest was still catching up afterwards.
+    # The final partial batch waits for the flush interval, which is not ingest time.
+    last_commit = commit_times.max() if len(commit_times) else send_end
+    elapsed = max(send_end, last_commit - args.flush_interval_ms / 1000) - start
+    result = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'config': {
+            'devices': args.devices, 'rate': args.rate, 'duration': args.duration, 'binary': args.binary,
+            'jitter': args.jitter, 'corrupt': args.corrupt, 'disconnect_every': args.disconnect_every,
+            'batch_size': args.batch_size, 'flush_interval_ms': args.flush_interval_ms,
+            'journal_mode': args.journal_mode, 'storage': args.storage,
+        },
+        'sent': sent,
+        'corrupted': corrupted,
+        'stored': len(rows),
+        'commits': len(commits),
+        'rows_per_sec': round(len(rows) / elapsed, 1),
+        **percentiles(commit_latency, 'commit_latency_ms'),
+        **percentiles(serial_to_db, 'serial_to_db_ms'),
+    }
+    if not args.keep:
+        shutil.rmtree(workdir)
+    else:
+        print(f"Benchmark database kept at {db}")
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(INGEST_SCRIPT)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(history_path, config):
+    """The most recent recorded run with the same settings, or None."""
+    if not os.path.exists(history_path):
+        return None
+    previous = None
+    with open(history_path) as f:
+        for line in f:
+            run = json.loads(line)
+            if run['config'] == config:
+                previous = run
+    return previous
+
+
+def regressions(result, baseline, tolerance):
+    """Tracked metrics that got worse than the baseline by more than tolerance (a fraction)."""
+    found = []
+    for metric, higher_is_better in TRACKED_METRICS.items():
+        old, new = baseline.get(metric), result.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > tolerance:
+            found.append(f"{metric}: {old} -> {new} ({change:+.0%})")
+    return found
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest script against simulated sensor stations.")
+    parser.add_argument('--devices', type=int, default=1, help="Number of simulated stations")
+    parser.add_argument('--rate', type=float, default=200, help="Readings per second per station")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds to send readings for")
+    parser.add_argument('--binary', action='store_true', help="Send binary frames instead of CSV lines")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Relative jitter of the send period (0-1)")
+    parser.add_argument('--corrupt', type=float, default=0.0, help="Probability that a record is damaged")
+    parser.add_argument('--disconnect-every', type=float, default=0.0,
+                        help="Seconds between simulated disconnects (0 disables)")
+    parser.add_argument('--batch-size', type=int, default=50, help="Ingest --batch-size")
+    parser.add_argument('--flush-interval-ms', type=int, default=1000, help="Ingest --flush-interval-ms")
+    parser.add_argument('--journal-mode', default='wal', choices=['wal', 'delete', 'truncate'],
+                        help="Ingest --journal-mode")
+    parser.add_argument('--storage', default='sqlite', choices=sensor_storage.STORAGE_BACKENDS,
+                        help="Ingest --storage")
+    parser.add_argument('--history', default=HISTORY_PATH, help="JSON lines file the results are appended to")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Allowed relative regression before the run fails (default 0.1)")
+    parser.add_argument('--no-record', action='store_true', help="Compare with the history but do not append")
+    parser.add_argument('--keep', action='store_true', help="Keep the benchmark database")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = run_benchmark(args)
+    print(json.dumps(result, indent=2))
+
+    baseline = previous_run(args.history, result['config'])
+    found = regressions(result, baseline, args.tolerance) if baseline else []
+    if baseline:
+        print(f"Compared with {baseline['revision']} ({baseline['time']}).")
+    if not args.no_record:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+    if found:
+        print("Regressions:\n  " + '\n  '.join(found))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal Prometheus metrics: counters, histograms and callback gauges rendered in the text
+# exposition format. Each process (ingest script, dashboard) has its own registry.
+# Updating a metric is an attribute update under an uncontended lock, cheap enough for per-line use.
+
+REGISTRY = []
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Default histogram buckets in seconds, from 0.5 ms to 10 s
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+def _escape(text, quote=True):
+    """Backslash-escape text for the exposition format: label values escape quotes too, HELP text does not."""
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quote else text
+
+
+def _label_text(pairs):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """A named metric with optional labels; labels(*values) returns the child to update."""
+
+    kind = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            yield from child.samples(self.name, list(zip(self.label_names, values)))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {_escape(self.help, quote=False)}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {value}" for name, labels, value in self.samples()]
+        return '\n'.join(lines)
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield name, _label_text(labels), self.value
+
+
+class Counter(Metric):
+    kind = 'counter'
+    new_child = _CounterValue
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + ['+Inf'], counts):
+            cumulative += count
+            yield f"{name}_bucket", _label_text(labels + [('le', bound)]), cumulative
+        yield f"{name}_sum", _label_text(labels), total
+        yield f"{name}_count", _label_text(labels), cumulative
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = list(buckets)
+        super().__init__(name, help, labels, registry)
+
+    def new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Gauge(Metric):
+    """A value read when metrics are rendered: function() returns a number, or {label values: number}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, function, labels=(), kind='gauge', registry=REGISTRY):
+        self.function = function
+        self.kind = kind
+        super().__init__(name, help, labels, registry)
+
+    def samples(self):
+        value = self.function()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for label_values, number in values:
+            if not isinstance(label_values, tuple):
+                label_values = (label_values,)
+            yield self.name, _label_text(list(zip(self.label_names, label_values))), number
+
+
+def render(registry=REGISTRY):
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line each
+
+
+def serve(port, host='127.0.0.1'):
+    """Serve /metrics on host:port from a daemon thread. Raises OSError if the port is taken."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+
+# Durable overflow for the ingest script: readings (and alert events) that could not be written to
+# the database are appended here as JSON lines, ["r", <row>] or ["a", <event>], and replayed in order
+# once the database accepts writes again. A sidecar .offset file records how far replay has got.
+
+
+def spool_path_for(db_path):
+    """Spool file: SENSOR_SPOOL_PATH, or a file next to the database."""
+    return os.path.expanduser(os.environ.get('SENSOR_SPOOL_PATH', os.path.splitext(db_path)[0] + '_spool.jsonl'))
+
+
+class ReadingSpool:
+    """
+    Append-only spool file, written by the ingest writer thread only so it keeps the arrival order.
+    Appends are fsynced before returning, so spooled readings survive a crash or power loss.
+    A reading is replayed at least once: a crash between a replay commit and the offset update
+    replays that chunk again on the next start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.lock = threading.Lock()
+        self.offset = 0
+        self.pending_rows = 0
+        if os.path.exists(self.offset_path):
+            with open(self.offset_path) as f:
+                self.offset = int(f.read().strip() or 0)
+        if not os.path.exists(path) or self.offset > os.path.getsize(path):
+            self.offset = 0  # Interrupted after truncating an emptied spool
+        if os.path.exists(path):
+            self.pending_rows = self._count_lines()
+
+    def _count_lines(self, block_size=1 << 20):
+        """Count the complete lines after the offset a block at a time, the spool being largest after an outage."""
+        with open(self.path, 'rb+') as f:
+            f.seek(self.offset)
+            position = complete = self.offset
+            lines = 0
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                lines += block.count(b'\n')
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    complete = position + newline + 1
+                position += len(block)
+            if complete < position:
+                f.truncate(complete)  # Torn line from an append cut short by a crash
+        return lines
+
+    def size(self):
+        """Bytes waiting to be replayed."""
+        try:
+            return max(0, os.path.getsize(self.path) - self.offset)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, readings, events=()):
+        """Spool reading rows and alert events. Raises OSError if the disk cannot take them."""
+        lines = [json.dumps(['r', *row]) for row in readings] + [json.dumps(['a', *event]) for event in events]
+        if not lines:
+            return
+        data = ('\n'.join(lines) + '\n').encode()
+        with self.lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.pending_rows += len(lines)
+
+    def read(self, max_lines=10000):
+        """
+        Return (readings, events, end_offset, lines) for up to max_lines spooled lines after the replay
+        offset, lines counting every line read. A line that does not decode, e.g. one torn by a failed
+        write, is logged and skipped, so advancing past it drops it instead of failing every replay.
+        """
+        readings, events = [], []
+        lines = 0
+        with self.lock:
+            if not os.path.exists(self.path):
+                return readings, events, self.offset, lines
+            # Held while reading so a concurrent append is never seen half written
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                end = self.offset
+                for line in f:
+                    try:
+                        kind, *fields = json.loads(line)
+                        (readings if kind == 'r' else events).append(tuple(fields))
+                    except (ValueError, TypeError):
+                        print(f"Skipping undecodable spool line at byte {end} of {self.path}: {line[:80]!r}")
+                    end += len(line)
+                    lines += 1
+                    if lines >= max_lines:
+                        break
+        return readings, events, end, lines
+
+    def advance(self, end, lines):
+        """Record that everything before end has been stored; an emptied spool is truncated."""
+        with self.lock:
+            self.pending_rows = max(0, self.pending_rows - lines)
+            if end >= os.path.getsize(self.path):
+                # Nothing was appended since the read, so the spool starts over
+                os.truncate(self.path, 0)
+                end = 0
+            tmp_path = f"{self.offset_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(str(end))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.offset_path)
+            self.offset = end
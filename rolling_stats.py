@@ -0,0 +1,129 @@
+import bisect
+import math
+from collections import deque
+
+from sensor_db import READING_COLUMNS, ROLLING_WINDOWS, ROLLING_PERCENTILES, ROLLING_STATS
+
+
+class WindowStats:
+    """
+    Statistics of every sensor column over the readings of the last width_ms milliseconds.
+    Each reading costs O(1) amortized: mean and variance are kept with Welford's update
+    (applied in reverse when a reading leaves the window) and min/max with monotonic deques.
+    Percentiles come from a sorted copy of the window kept with bisect, which is a memmove
+    of at most one window of floats per reading.
+    """
+
+    def __init__(self, width_ms, columns=len(READING_COLUMNS)):
+        self.width_ms = width_ms
+        self.samples = deque()  # (index, ts_ms, values)
+        self.next_index = 0
+        self.count = 0
+        self.mean = [0.0] * columns
+        self.m2 = [0.0] * columns
+        self.mins = [deque() for _ in range(columns)]  # (index, value), values increasing
+        self.maxs = [deque() for _ in range(columns)]  # (index, value), values decreasing
+        self.sorted = [[] for _ in range(columns)]
+        self.last_ts_ms = None
+
+    def add(self, ts_ms, values):
+        index = self.next_index
+        self.next_index += 1
+        self.samples.append((index, ts_ms, values))
+        self.count += 1
+        self.last_ts_ms = ts_ms
+        for i, value in enumerate(values):
+            delta = value - self.mean[i]
+            self.mean[i] += delta / self.count
+            self.m2[i] += delta * (value - self.mean[i])
+            mins = self.mins[i]
+            while mins and mins[-1][1] >= value:
+                mins.pop()
+            mins.append((index, value))
+            maxs = self.maxs[i]
+            while maxs and maxs[-1][1] <= value:
+                maxs.pop()
+            maxs.append((index, value))
+            bisect.insort(self.sorted[i], value)
+        self.expire(ts_ms - self.width_ms)
+
+    def expire(self, cutoff_ms):
+        """Drop readings at or before cutoff_ms."""
+        samples = self.samples
+        while samples and samples[0][1] <= cutoff_ms:
+            index, _, values = samples.popleft()
+            self.count -= 1
+            for i, value in enumerate(values):
+                if self.count:
+                    delta = value - self.mean[i]
+                    self.mean[i] -= delta / self.count
+                    self.m2[i] = max(0.0, self.m2[i] - delta * (value - self.mean[i]))
+                else:
+                    self.mean[i] = self.m2[i] = 0.0
+                if self.mins[i][0][0] == index:
+                    self.mins[i].popleft()
+                if self.maxs[i][0][0] == index:
+                    self.maxs[i].popleft()
+                column = self.sorted[i]
+                del column[bisect.bisect_left(column, value)]
+
+    def percentile(self, i, p):
+        """Linearly interpolated percentile p of column i, like numpy's default."""
+        column = self.sorted[i]
+        position = (len(column) - 1) * p / 100
+        lower = int(position)
+        upper = min(lower + 1, len(column) - 1)
+        return column[lower] + (column[upper] - column[lower]) * (position - lower)
+
+    def snapshot(self, i):
+        """ROLLING_STATS of column i. std is the population deviation, as the firmware computes it."""
+        if not self.count:
+            return None
+        return [self.count, self.mean[i], math.sqrt(self.m2[i] / self.count),
+                self.mins[i][0][1], self.maxs[i][0][1]] + [self.percentile(i, p) for p in ROLLING_PERCENTILES]
+
+
+class RollingStats:
+    """
+    Rolling statistics for every device and every ROLLING_WINDOWS window.
+    Readings are added as they arrive; save() writes the windows that changed since the last save.
+    """
+
+    def __init__(self, windows=ROLLING_WINDOWS):
+        self.windows = windows
+        self.devices = {}  # device_id -> {window_ms: WindowStats}
+        self.changed = set()
+
+    def add(self, device, ts_ms, values):
+        stats = self.devices.get(device)
+        if stats is None:
+            stats = self.devices[device] = {width: WindowStats(width) for width in self.windows.values()}
+        for window in stats.values():
+            window.add(ts_ms, values)
+        self.changed.add(device)
+
+    def load(self, df):
+        """Warm the windows up from readings already stored, so a restart does not reset them."""
+        for row in df[['device_id', 'ts_ms'] + READING_COLUMNS].itertuples(index=False, name=None):
+            self.add(row[0], row[1], row[2:])
+        return len(self.changed)
+
+    def rows(self):
+        """rolling_stats rows for the devices that changed, as (device_id, window_ms, column_name, ts_ms, *stats)."""
+        rows = []
+        for device in self.changed:
+            for width, window in self.devices[device].items():
+                for i, column in enumerate(READING_COLUMNS):
+                    stats = window.snapshot(i)
+                    if stats is not None:
+                        rows.append((device, width, column, window.last_ts_ms, *stats))
+        return rows
+
+    def save(self, conn):
+        """Upsert the changed windows into rolling_stats, inside the caller's transaction."""
+        names = ['device_id', 'window_ms', 'column_name', 'ts_ms'] + ROLLING_STATS
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO rolling_stats ({', '.join(names)})
+            VALUES ({', '.join('?' * len(names))})
+        ''', self.rows())
+        self.changed.clear()
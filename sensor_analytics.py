@@ -0,0 +1,347 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+import sensor_db
+from sensor_db import ROLLUPS
+from sensor_storage import MmapStorage, SQLiteStorage
+
+# Heavy analyses for the dashboard's Analytics tab, run as background jobs in a process pool so a
+# months-long computation never holds a dashboard worker. A job is identified by a hash of
+# (analysis, time range, devices, data version) and keeps its status, progress and result as JSON
+# files in the analytics directory. Any dashboard process can therefore report on it or serve the
+# cached result, and an analysis is only recomputed once readings in its range change.
+
+ANALYSIS_COLUMNS = ['co_level', 'temperature', 'humidity']
+JOB_WORKERS = int(os.environ.get('SENSOR_ANALYTICS_WORKERS', 2))
+JOB_STALE_SECONDS = 120  # A queued or running job whose status has not changed for this long is presumed dead
+RESULT_MAX_AGE_DAYS = 7  # Job files older than this are removed when a new job is submitted
+
+MINUTE_MS = ROLLUPS['sensor_readings_1m']
+HOUR_MS = ROLLUPS['sensor_readings_1h']
+DAY_MS = ROLLUPS['sensor_readings_1d']
+DETAIL_RANGE_MS = 7 * DAY_MS  # Ranges up to this long are analysed per minute, longer ones per hour
+LOAD_CHUNK_MS = 30 * DAY_MS  # Readings are loaded a month at a time, reporting progress in between
+MAX_LAG_MS = 6 * HOUR_MS  # Longest lag of the cross-correlations; a quarter day, so the daily cycle cannot alias it
+MIN_OVERLAP = 10  # Fewest overlapping buckets a cross-correlation value is computed from
+MIN_DAY_COVERAGE = 0.9  # Share of a day's buckets needed for its mean to enter the trend; partial days skew it
+
+
+def analytics_dir_for(db_path):
+    """Job directory: SENSOR_ANALYTICS_DIR, or a directory next to the database."""
+    return os.path.expanduser(os.environ.get('SENSOR_ANALYTICS_DIR', os.path.splitext(db_path)[0] + '_analytics'))
+
+
+def range_version(storage, start, end, devices=None):
+    """Version of the readings in [start, end]: changes whenever readings in the range are added."""
+    days = storage.aggregate(start - start % DAY_MS, end, DAY_MS, devices)
+    newest = storage.latest_n(1, start, end, devices)
+    return f"{int(days['count'].sum())}-{int(newest['ts_ms'].iloc[-1]) if len(newest) else 0}"
+
+
+def job_key(spec, version):
+    """Job id: a hash of what the result depends on, not of where the data is stored."""
+    key = [spec['analysis'], spec['start'], spec['end'], spec['devices'], ANALYSIS_COLUMNS, version]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:20]
+
+
+def _json_values(array):
+    """A float array as a JSON-safe list, NaN as null."""
+    array = np.asarray(array, dtype=np.float64)
+    return np.where(np.isnan(array), None, np.round(array, 6)).tolist()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """The files of one job: <id>.json holds the status, <id>.result.json the result, <id>.cancel asks it to stop."""
+
+    def __init__(self, directory, job_id):
+        self.id = job_id
+        self.status_path = os.path.join(directory, f"{job_id}.json")
+        self.result_path = os.path.join(directory, f"{job_id}.result.json")
+        self.cancel_path = os.path.join(directory, f"{job_id}.cancel")
+
+    @staticmethod
+    def _write(path, data):
+        # Atomic, so readers in other processes never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def status(self):
+        """{'state': queued|running|done|failed|cancelled, 'progress': 0-1, 'message', 'updated'}, or None."""
+        return self._read(self.status_path)
+
+    def write_status(self, state, progress=0.0, message=''):
+        self._write(self.status_path, {'state': state, 'progress': progress, 'message': message,
+                                       'updated': time.time()})
+
+    def result(self):
+        return self._read(self.result_path)
+
+    def write_result(self, result):
+        self._write(self.result_path, result)
+
+    def request_cancel(self):
+        open(self.cancel_path, 'w').close()
+
+    def cancel_requested(self):
+        return os.path.exists(self.cancel_path)
+
+    def clear_cancel(self):
+        if os.path.exists(self.cancel_path):
+            os.remove(self.cancel_path)
+
+
+def open_storage(spec):
+    """Read-only storage in a job process, from the backend settings in the spec."""
+    if spec['storage'] == 'mmap':
+        return MmapStorage(spec['storage_dir'])
+    conn = sensor_db.connect_readonly(spec['db_path'])
+    return SQLiteStorage(lambda: nullcontext(conn), spec['archive_dir'])
+
+
+def load_series(storage, spec, progress):
+    """
+    Per-bucket means of ANALYSIS_COLUMNS over [start, end] on a regular time grid, indexed by bucket
+    start (epoch ms) and averaged over the selected devices; buckets without readings are NaN.
+    Uses the rollups, per minute or per hour depending on the range. Returns (DataFrame, bucket width).
+    """
+    start, end = spec['start'], spec['end']
+    width = MINUTE_MS if end - start <= DETAIL_RANGE_MS else HOUR_MS
+    first = start - start % width
+    chunk_starts = range(first, end + 1, LOAD_CHUNK_MS)
+    means = [f"{column}_mean" for column in ANALYSIS_COLUMNS]
+    chunks = []
+    for i, chunk_start in enumerate(chunk_starts):
+        progress(0.7 * i / len(chunk_starts), f"Loading readings ({i + 1}/{len(chunk_starts)})")
+        df = storage.aggregate(chunk_start, min(end, chunk_start + LOAD_CHUNK_MS - 1), width, spec['devices'])
+        if not df.empty:
+            chunks.append(df[['ts_ms'] + means])
+    if not chunks:
+        return pd.DataFrame(columns=ANALYSIS_COLUMNS, dtype=np.float64), width
+    df = pd.concat(chunks).astype({column: np.float64 for column in means}).groupby('ts_ms').mean()
+    df.columns = ANALYSIS_COLUMNS
+    return df.reindex(np.arange(first, end + 1, width)), width
+
+
+def correlation(df, width, progress):
+    """
+    Pearson correlation between the columns, and their cross-correlation for lags up to MAX_LAG_MS.
+    The value at lag k correlates the first column at t + k with the second at t, so a peak at a
+    positive lag means the second column leads. Gaps are handled by also cross-correlating the masks
+    of present values, so every lag is normalized by the buckets it actually overlaps.
+    """
+    columns = list(df.columns)
+    pairs = [(a, b) for i, a in enumerate(columns) for b in columns[i + 1:]]
+    max_lag = max(1, min(MAX_LAG_MS // width, len(df) // 4))
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    z = (df - df.mean()) / df.std()
+    present = z.notna().to_numpy(np.float64)
+    size = 1 << int(2 * len(df) - 1).bit_length()  # Zero padding keeps the correlation linear, not circular
+    spectra = np.fft.rfft(z.fillna(0).to_numpy(), size, axis=0)
+    masks = np.fft.rfft(present, size, axis=0)
+
+    result = {'analysis': 'correlation', 'columns': columns, 'matrix': [_json_values(row) for row in df.corr().to_numpy()],
+              'lag_minutes': (lags * width / MINUTE_MS).tolist(), 'pairs': []}
+    for k, (a, b) in enumerate(pairs):
+        progress(k / len(pairs), f"Cross-correlating {a} and {b}")
+        i, j = columns.index(a), columns.index(b)
+        sums = np.fft.irfft(spectra[:, i] * np.conj(spectra[:, j]), size)[lags % size]
+        counts = np.fft.irfft(masks[:, i] * np.conj(masks[:, j]), size)[lags % size].round()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ccf = np.where(counts >= MIN_OVERLAP, sums / counts, np.nan)
+        peak = int(np.nanargmax(np.abs(ccf))) if np.isfinite(ccf).any() else None
+        result['pairs'].append({
+            'columns': [a, b], 'ccf': _json_values(ccf),
+            'peak_lag_minutes': float(lags[peak] * width / MINUTE_MS) if peak is not None else None,
+            'peak_r': float(ccf[peak]) if peak is not None else None,
+        })
+    return result
+
+
+def daily_cycle(df, width, progress):
+    """
+    Decompose each column into a trend (centered 24 h mean), a daily cycle (mean detrended value per
+    local hour of day) and a residual. Reports the hourly profiles, the cycle's amplitude, and the
+    share of the detrended variance it explains.
+    """
+    hours = pd.DatetimeIndex(sensor_db.local_datetimes(df.index.to_numpy())).hour
+    window = max(2, DAY_MS // width)
+    progress(0.0, "Removing the trend")
+    trend = df.rolling(window, center=True, min_periods=window // 2).mean()
+    detrended = df - trend
+    progress(0.5, "Averaging per hour of day")
+    cycle = detrended.groupby(hours).mean().reindex(range(24))
+    residual = detrended.to_numpy() - cycle.reindex(hours).to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        explained = 1 - np.nanvar(residual, axis=0) / np.nanvar(detrended.to_numpy(), axis=0)
+    profile = df.groupby(hours).agg(['mean', 'std']).reindex(range(24))
+    return {
+        'analysis': 'daily_cycle', 'columns': list(df.columns), 'hours': list(range(24)),
+        'mean': {column: _json_values(profile[(column, 'mean')]) for column in df.columns},
+        'std': {column: _json_values(profile[(column, 'std')]) for column in df.columns},
+        'cycle': {column: _json_values(cycle[column]) for column in df.columns},
+        'amplitude': dict(zip(df.columns, _json_values(cycle.max() - cycle.min()))),
+        'explained': dict(zip(df.columns, _json_values(explained))),
+    }
+
+
+def spectrum(df, width, progress):
+    """
+    Periodogram of each column: gaps interpolated, linear trend removed, Hann window applied.
+    Reports power per frequency in cycles per day, and the three strongest periods in hours.
+    """
+    columns = [column for column in df.columns if df[column].notna().sum() >= 2]
+    progress(0.0, "Interpolating gaps")
+    values = df[columns].interpolate(limit_direction='both').to_numpy()
+    t = np.arange(len(values))
+    slope, intercept = np.polyfit(t, values, 1) if columns else (np.zeros(0), np.zeros(0))
+    progress(0.5, "Transforming")
+    hann = np.hanning(len(values))[:, None]
+    power = np.abs(np.fft.rfft((values - (np.outer(t, slope) + intercept)) * hann, axis=0)) ** 2 / (hann ** 2).sum()
+    frequencies = np.fft.rfftfreq(len(values), d=width / DAY_MS)[1:]  # Cycles per day, without the mean
+    power = power[1:]
+    peaks = {}
+    for i, column in enumerate(columns):
+        strongest = np.argsort(power[:, i])[::-1][:3]
+        peaks[column] = [round(24 / frequencies[k], 2) for k in strongest]
+    return {'analysis': 'spectrum', 'columns': columns, 'cycles_per_day': _json_values(frequencies),
+            'power': {column: _json_values(power[:, i]) for i, column in enumerate(columns)},
+            'peak_periods_hours': peaks}
+
+
+def trend(df, width, progress):
+    """
+    Least-squares linear trend of each column's daily means, as the change per 30 days with its R².
+    Days missing part of their readings are left out, as their means lean towards the hours they have.
+    """
+    days = df.groupby(df.index // DAY_MS * DAY_MS)
+    daily = days.mean().where(days.count() >= MIN_DAY_COVERAGE * (DAY_MS // width))
+    days = (daily.index.to_numpy() - daily.index[0]) / DAY_MS if len(daily) else np.zeros(0)
+    result = {'analysis': 'trend', 'columns': list(df.columns), 'days_ms': daily.index.tolist(),
+              'daily_mean': {}, 'fit': {}}
+    for i, column in enumerate(df.columns):
+        progress(i / len(df.columns), f"Fitting {column}")
+        y = daily[column].to_numpy()
+        present = ~np.isnan(y)
+        result['daily_mean'][column] = _json_values(y)
+        if present.sum() < 2:
+            result['fit'][column] = None
+            continue
+        slope, intercept = np.polyfit(days[present], y[present], 1)
+        fitted = slope * days + intercept
+        residual = y[present] - fitted[present]
+        total = ((y[present] - y[present].mean()) ** 2).sum()
+        result['fit'][column] = {
+            'per_30_days': float(slope * 30), 'fitted': _json_values(fitted),
+            'r2': float(1 - (residual ** 2).sum() / total) if total else None,
+        }
+    return result
+
+
+# Analysis name -> (label, function(df, bucket width, progress) returning a JSON-able result)
+ANALYSES = {
+    'correlation': ("Cross-correlation of CO, temperature and humidity", correlation),
+    'daily_cycle': ("Daily cycle decomposition", daily_cycle),
+    'spectrum': ("Spectra", spectrum),
+    'trend': ("Long-term trends", trend),
+}
+
+
+def run_job(directory, job_id, spec):
+    """Job process entry point: load the series, run the analysis and store its result, reporting progress."""
+    job = Job(directory, job_id)
+
+    def progress(fraction, message):
+        if job.cancel_requested():
+            raise JobCancelled()
+        job.write_status('running', round(fraction, 3), message)
+
+    try:
+        progress(0.0, "Starting")
+        df, width = load_series(open_storage(spec), spec, progress)
+        if df.dropna(how='all').empty:
+            raise ValueError("No readings in the selected range")
+        result = ANALYSES[spec['analysis']][1](df, width, lambda fraction, message: progress(0.7 + 0.3 * fraction, message))
+        result.update(start=spec['start'], end=spec['end'], bucket_ms=width, buckets=len(df))
+        job.write_result(result)
+        job.write_status('done', 1.0, "Done")
+    except JobCancelled:
+        job.write_status('cancelled', message="Cancelled")
+    except Exception as e:
+        job.write_status('failed', message=f"{type(e).__name__}: {e}")
+
+
+class AnalyticsJobs:
+    """
+    Submits and cancels analysis jobs from a dashboard process. The process pool is started on first use,
+    with the spawn start method so job processes do not inherit the server's threads and connections.
+    """
+
+    def __init__(self, directory, workers=JOB_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self.pool = None
+        self.futures = {}  # Job id -> Future of the jobs this process submitted
+        self.lock = threading.Lock()
+
+    def job(self, job_id):
+        return Job(self.directory, job_id)
+
+    def submit(self, spec, version):
+        """Start a job for spec unless its result is cached or it is already running somewhere. Returns its id."""
+        job = self.job(job_key(spec, version))
+        status = job.status()
+        if status and (status['state'] == 'done' or (status['state'] in ('queued', 'running')
+                                                     and time.time() - status['updated'] < JOB_STALE_SECONDS)):
+            return job.id
+        os.makedirs(self.directory, exist_ok=True)
+        self.prune()
+        job.clear_cancel()
+        job.write_status('queued', message="Queued")
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            self.futures = {job_id: future for job_id, future in self.futures.items() if not future.done()}
+            self.futures[job.id] = self.pool.submit(run_job, self.directory, job.id, spec)
+        return job.id
+
+    def cancel(self, job_id):
+        """Ask a job to stop at its next progress report, or drop it if it has not started yet."""
+        job = self.job(job_id)
+        status = job.status()
+        if not status or status['state'] not in ('queued', 'running'):
+            return
+        job.request_cancel()
+        future = self.futures.get(job_id)
+        if future is not None and future.cancel():
+            job.write_status('cancelled', message="Cancelled")
+
+    def prune(self):
+        """Remove job files older than RESULT_MAX_AGE_DAYS."""
+        cutoff = time.time() - RESULT_MAX_AGE_DAYS * 24 * 60 * 60
+        for entry in os.scandir(self.directory):
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
@@ -0,0 +1,204 @@
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Without pyarrow there is no cold tier; queries read SQLite only
+    pa = pq = None
+
+from sensor_db import READING_COLUMNS
+
+# Cold tier: readings older than the retention age, moved out of sensor_readings into one
+# zstd-compressed Parquet file per UTC day (YYYY-MM-DD.parquet), sorted by ts_ms.
+ARCHIVE_COLUMNS = ['real_time', 'ts_ms', 'device_id'] + READING_COLUMNS
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def archive_schema():
+    types = {'real_time': pa.string(), 'ts_ms': pa.int64(), 'device_id': pa.string()}
+    return pa.schema([(column, types.get(column, pa.float64())) for column in ARCHIVE_COLUMNS])
+
+
+def partition_path(archive_dir, day_ms):
+    day = datetime.fromtimestamp(day_ms / 1000, timezone.utc)
+    return os.path.join(archive_dir, f"{day:%Y-%m-%d}.parquet")
+
+
+def partitions(archive_dir, start=None, end=None):
+    """(day_ms, path) of the archived days overlapping [start, end] (epoch ms), oldest first."""
+    if pq is None or not archive_dir or not os.path.isdir(archive_dir):
+        return []
+    found = []
+    for name in os.listdir(archive_dir):
+        if not name.endswith('.parquet'):
+            continue
+        try:
+            day = datetime.strptime(name[:-len('.parquet')], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        day_ms = int(day.timestamp() * 1000)
+        if (start is None or day_ms + DAY_MS > start) and (end is None or day_ms <= end):
+            found.append((day_ms, os.path.join(archive_dir, name)))
+    return sorted(found)
+
+
+def read_partition(path, columns=ARCHIVE_COLUMNS, start=None, end=None, devices=None):
+    """Rows of one archived day, filtered while reading."""
+    filters = []
+    if start is not None:
+        filters.append(('ts_ms', '>=', start))
+    if end is not None:
+        filters.append(('ts_ms', '<=', end))
+    if devices:
+        filters.append(('device_id', 'in', list(devices)))
+    return pq.read_table(path, columns=list(columns), filters=filters or None).to_pandas()
+
+
+def reading_filter(start=None, end=None, devices=None):
+    """WHERE clause and parameters selecting readings in [start, end] for devices."""
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("ts_ms >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("ts_ms <= ?")
+        params.append(end)
+    if devices:
+        clauses.append(f"device_id IN ({', '.join('?' * len(devices))})")
+        params += list(devices)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def query_readings(conn, archive_dir, columns=ARCHIVE_COLUMNS, start=None, end=None, devices=None, limit=None):
+    """
+    Readings in [start, end] (epoch ms) across the hot SQLite table and the cold archive, oldest first.
+    With limit, only the newest `limit` rows; the archive is only opened if SQLite has too few.
+    """
+    where, params = reading_filter(start, end, devices)
+    query = f"SELECT {', '.join(columns)} FROM sensor_readings {where} ORDER BY ts_ms"
+    if limit is not None:
+        query += " DESC LIMIT ?"  # Walks the ts_ms index backwards
+        params.append(limit)
+    hot = pd.read_sql_query(query, conn, params=params)
+    if limit is not None:
+        hot = hot.iloc[::-1]
+        if len(hot) >= limit:
+            return hot.reset_index(drop=True)
+
+    cold = []
+    needed = limit
+    for _, path in reversed(partitions(archive_dir, start, end)):
+        df = read_partition(path, columns, start, end, devices)
+        cold.append(df)
+        if needed is not None:
+            needed -= len(df)
+            if needed <= 0:
+                break
+    if not cold:
+        return hot.reset_index(drop=True)
+    df = pd.concat(cold[::-1] + [hot], ignore_index=True)
+    # Late readings loaded after a day was archived can interleave with the archive
+    df = df.sort_values('ts_ms', kind='stable', ignore_index=True)
+    return df if limit is None else df.iloc[-limit:].reset_index(drop=True)
+
+
+def first_readings(conn, archive_dir, columns=ARCHIVE_COLUMNS, start=None, end=None, devices=None, limit=100):
+    """
+    The oldest `limit` readings in [start, end] across the archive and SQLite, ordered by ts_ms,
+    device_id and then storage order, so the same rows always come back in the same order.
+    Archived days are only read until they hold `limit` rows; later days cannot hold older ones.
+    """
+    cold = []
+    found = 0
+    for _, path in partitions(archive_dir, start, end):
+        if found >= limit:
+            break
+        df = read_partition(path, columns, start, end, devices)
+        cold.append(df)
+        found += len(df)
+    where, params = reading_filter(start, end, devices)
+    hot = pd.read_sql_query(
+        f"SELECT {', '.join(columns)} FROM sensor_readings {where} ORDER BY ts_ms, device_id, rowid LIMIT ?",
+        conn, params=params + [limit]
+    )
+    if not cold:
+        return hot
+    df = pd.concat(cold + [hot], ignore_index=True)
+    return df.sort_values(['ts_ms', 'device_id'], kind='stable', ignore_index=True).iloc[:limit]
+
+
+def iter_readings(conn, archive_dir, columns=ARCHIVE_COLUMNS, start=None, end=None, devices=None, chunk_rows=10000):
+    """Stream readings as lists of row tuples: archived days first, then SQLite."""
+    for _, path in partitions(archive_dir, start, end):
+        df = read_partition(path, columns, start, end, devices)
+        rows = list(df.itertuples(index=False, name=None))
+        for i in range(0, len(rows), chunk_rows):
+            yield rows[i:i + chunk_rows]
+    where, params = reading_filter(start, end, devices)
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM sensor_readings {where} ORDER BY ts_ms", params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def archive_readings(conn, archive_dir, before_ms):
+    """
+    Move every whole UTC day of readings older than before_ms into the archive.
+    Each day is read, written and deleted under one write transaction, so no reading is
+    lost or duplicated if the job is interrupted. Late readings for an archived day are
+    merged into its file. Returns (readings moved, days written).
+    """
+    if pq is None:
+        raise RuntimeError("Archiving needs pyarrow (pip install pyarrow).")
+    os.makedirs(archive_dir, exist_ok=True)
+    schema = archive_schema()
+    cutoff = before_ms - before_ms % DAY_MS
+    moved = days = 0
+    day = None
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first = conn.execute("SELECT min(ts_ms) FROM sensor_readings WHERE ts_ms >= ? AND ts_ms < ?",
+                                 (day or 0, cutoff)).fetchone()[0]
+            if first is None:
+                conn.rollback()
+                break
+            day = first - first % DAY_MS
+            df = pd.read_sql_query(f'''
+                SELECT {', '.join(ARCHIVE_COLUMNS)} FROM sensor_readings
+                WHERE ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms
+            ''', conn, params=(day, day + DAY_MS))
+            count = len(df)
+            path = partition_path(archive_dir, day)
+            if os.path.exists(path):
+                # Only whole-row copies are dropped: those a run interrupted before its DELETE left in
+                # both places. Distinct readings can share a device and ts_ms.
+                df = pd.concat([pq.read_table(path).to_pandas(), df], ignore_index=True)
+                df = df.drop_duplicates().sort_values('ts_ms', kind='stable')
+            tmp_path = f"{path}.tmp"
+            pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), tmp_path,
+                           compression='zstd')
+            os.replace(tmp_path, path)
+            conn.execute("DELETE FROM sensor_readings WHERE ts_ms >= ? AND ts_ms < ?", (day, day + DAY_MS))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        moved += count
+        days += 1
+        day += DAY_MS
+    return moved, days
+
+
+def reclaim_space(conn):
+    """Return the pages freed by archiving to the filesystem. VACUUM briefly blocks the writer."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
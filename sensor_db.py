@@ -0,0 +1,294 @@
+import os
+import sqlite3
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+import sensor_schema
+
+# SQLite Database Path shared by the ingest script and the dashboard
+# Default to user's home directory; SENSOR_DB_PATH overrides it, e.g. for dashboard workers
+DB_PATH = os.path.expanduser(os.environ.get('SENSOR_DB_PATH', '~/SensorsReadings.db'))
+
+# Loopback UDP port the ingest script announces each commit on, for the dashboard's live updates
+COMMIT_NOTIFY_PORT = 8765
+
+# Device id for readings from single-station setups and rows written before device tagging
+DEFAULT_DEVICE_ID = 'default'
+
+# Sensor value columns of sensor_readings, as declared in the record schema
+READING_COLUMNS = sensor_schema.READING_COLUMNS
+
+# Downsampled rollup tables maintained at ingest time, coarsest first: table -> bucket width in ms
+ROLLUPS = {
+    'sensor_readings_1d': 24 * 60 * 60 * 1000,
+    'sensor_readings_1h': 60 * 60 * 1000,
+    'sensor_readings_1m': 60 * 1000,
+}
+ROLLUP_STATS = ['min', 'max', 'mean', 'last']
+
+# Host-side rolling statistics over the most recent readings: window name -> width in ms
+ROLLING_WINDOWS = {
+    '1m': 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+}
+ROLLING_PERCENTILES = [5, 50, 95]
+ROLLING_STATS = ['count', 'mean', 'std', 'min', 'max'] + [f"p{p}" for p in ROLLING_PERCENTILES]
+
+
+def archive_dir_for(db_path):
+    """Cold tier directory: SENSOR_ARCHIVE_DIR, or a directory next to the database."""
+    return os.path.expanduser(os.environ.get('SENSOR_ARCHIVE_DIR', os.path.splitext(db_path)[0] + '_archive'))
+
+
+def local_offsets_ms(ts_ms):
+    """
+    UTC offset of the local time zone at each epoch ms, daylight saving time included.
+    Offsets only change on the hour, so the C library is asked once per distinct hour.
+    """
+    ts_ms = np.asarray(ts_ms, dtype=np.int64)
+    hour_ms = ROLLUPS['sensor_readings_1h']
+    hours, inverse = np.unique(ts_ms - ts_ms % hour_ms, return_inverse=True)
+    offsets = np.array([time.localtime(hour // 1000).tm_gmtoff * 1000 for hour in hours.tolist()], dtype=np.int64)
+    return offsets[inverse].reshape(ts_ms.shape)
+
+
+def local_datetimes(ts_ms):
+    """Naive local date-times (datetime64[ms]) of epoch ms, as the real_time column holds them."""
+    ts_ms = np.asarray(ts_ms, dtype=np.int64)
+    return (ts_ms + local_offsets_ms(ts_ms)).astype('datetime64[ms]')
+
+
+def local_epoch_ms(wall_ms):
+    """
+    Epoch ms of naive local date-times given as ms since 1970-01-01 00:00, the inverse of local_datetimes.
+    Like SQLite's 'utc' modifier, a time repeated when the clocks go back is read as the later one.
+    """
+    wall_ms = np.asarray(wall_ms, dtype=np.int64)
+    return wall_ms - local_offsets_ms(wall_ms - local_offsets_ms(wall_ms))
+
+
+def connect_readonly(path, timeout=5.0, cached_statements=256):
+    """
+    Open a read-only connection. It can never take the write lock, so readers in WAL mode
+    run alongside the ingest script's commits. Safe to share between threads one at a time.
+    """
+    uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+    return sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=False,
+                           cached_statements=cached_statements)
+
+
+def _add_epoch_ms_column(conn):
+    """Add an indexed integer epoch-millisecond timestamp and backfill it from real_time."""
+    conn.execute("ALTER TABLE sensor_readings ADD COLUMN ts_ms INTEGER")
+    # real_time was written with datetime.now(), so it is local time
+    conn.execute('''
+        UPDATE sensor_readings
+        SET ts_ms = CAST(strftime('%s', real_time, 'utc') AS INTEGER) * 1000
+        WHERE ts_ms IS NULL
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_readings_ts_ms ON sensor_readings (ts_ms)")
+
+
+def _add_device_id_column(conn):
+    """Tag readings with the station they came from and index them per device."""
+    # A constant default is stored in the schema only, so existing rows need no rewrite
+    conn.execute(f"ALTER TABLE sensor_readings ADD COLUMN device_id TEXT NOT NULL DEFAULT '{DEFAULT_DEVICE_ID}'")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sensor_readings_device_ts_ms
+        ON sensor_readings (device_id, ts_ms)
+    ''')
+
+
+def _create_rollup_tables(conn):
+    """Create the 1 min / 1 h / 1 day rollup tables and fill them from existing readings."""
+    stats = ', '.join(f"{column}_{stat} REAL" for column in READING_COLUMNS for stat in ROLLUP_STATS)
+    for table in ROLLUPS:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket_ms INTEGER NOT NULL,
+                device_id TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                last_ts_ms INTEGER NOT NULL,
+                {stats},
+                PRIMARY KEY (bucket_ms, device_id)
+            ) WITHOUT ROWID
+        ''')
+    rebuild_rollups(conn)
+
+
+def _create_rolling_stats_table(conn):
+    """Create the table holding the latest rolling window statistics per device and column."""
+    stats = ', '.join(f"{stat} {'INTEGER NOT NULL' if stat == 'count' else 'REAL'}" for stat in ROLLING_STATS)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS rolling_stats (
+            device_id TEXT NOT NULL,
+            window_ms INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            ts_ms INTEGER NOT NULL,
+            {stats},
+            PRIMARY KEY (device_id, window_ms, column_name)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _create_alert_events_table(conn):
+    """Record alert state transitions raised by the ingest-time alert engine."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_events (
+            id INTEGER PRIMARY KEY,
+            ts_ms INTEGER NOT NULL,
+            device_id TEXT NOT NULL,
+            alert TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            previous_state TEXT NOT NULL,
+            value REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alert_events_device_alert
+        ON alert_events (device_id, alert, id)
+    ''')
+
+
+# Ordered schema migrations; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    _add_epoch_ms_column,
+    _add_device_id_column,
+    _create_rollup_tables,
+    _create_rolling_stats_table,
+    _create_alert_events_table,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """
+    Bring an existing sensor_readings table up to SCHEMA_VERSION in place.
+    Each migration runs in its own transaction together with the version bump.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f"Applied schema migration {number}: {migration.__doc__}")
+    return max(version, SCHEMA_VERSION)
+
+
+def rollup_upsert_sql(table):
+    """Build the UPSERT that merges partial bucket aggregates into a rollup table."""
+    stat_columns = [f"{column}_{stat}" for column in READING_COLUMNS for stat in ROLLUP_STATS]
+    names = ['bucket_ms', 'device_id', 'count', 'last_ts_ms'] + stat_columns
+    # SET expressions see the row as it was before the update, so count is the old count throughout
+    updates = []
+    for column in READING_COLUMNS:
+        updates += [
+            f"{column}_min = min({column}_min, excluded.{column}_min)",
+            f"{column}_max = max({column}_max, excluded.{column}_max)",
+            f"{column}_mean = ({column}_mean * count + excluded.{column}_mean * excluded.count)"
+            f" / (count + excluded.count)",
+            f"{column}_last = CASE WHEN excluded.last_ts_ms >= last_ts_ms"
+            f" THEN excluded.{column}_last ELSE {column}_last END",
+        ]
+    updates += [
+        "last_ts_ms = max(last_ts_ms, excluded.last_ts_ms)",
+        "count = count + excluded.count",
+    ]
+    return f'''
+        INSERT INTO {table} ({', '.join(names)})
+        VALUES ({', '.join('?' * len(names))})
+        ON CONFLICT (bucket_ms, device_id) DO UPDATE SET {', '.join(updates)}
+    '''
+
+
+def update_rollups(conn, readings):
+    """
+    Fold readings into every rollup table, inside the caller's transaction.
+    readings is a sequence of (device_id, ts_ms, values) with values ordered as READING_COLUMNS.
+    """
+    for table, width in ROLLUPS.items():
+        # (bucket_ms, device_id) -> [count, last_ts_ms, mins, maxs, sums, lasts]
+        buckets = {}
+        for device, ts_ms, values in readings:
+            key = (ts_ms - ts_ms % width, device)
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [1, ts_ms, list(values), list(values), list(values), list(values)]
+                continue
+            bucket[0] += 1
+            mins, maxs, sums = bucket[2], bucket[3], bucket[4]
+            for i, value in enumerate(values):
+                if value < mins[i]:
+                    mins[i] = value
+                if value > maxs[i]:
+                    maxs[i] = value
+                sums[i] += value
+            if ts_ms >= bucket[1]:
+                bucket[1] = ts_ms
+                bucket[5] = list(values)
+
+        rows = []
+        for (bucket_ms, device), (count, last_ts_ms, mins, maxs, sums, lasts) in buckets.items():
+            stats = []
+            for i in range(len(READING_COLUMNS)):
+                stats += [mins[i], maxs[i], sums[i] / count, lasts[i]]
+            rows.append((bucket_ms, device, count, last_ts_ms, *stats))
+        conn.executemany(rollup_upsert_sql(table), rows)
+
+
+def update_rollups_frame(conn, df):
+    """
+    Vectorized update_rollups for bulk loads: df has device_id, ts_ms and READING_COLUMNS,
+    sorted by ts_ms. Runs inside the caller's transaction.
+    """
+    for table, width in ROLLUPS.items():
+        grouped = df.assign(bucket_ms=df['ts_ms'] - df['ts_ms'] % width).groupby(['bucket_ms', 'device_id'], sort=False)
+        stats = grouped[READING_COLUMNS].agg(ROLLUP_STATS)  # Columns ordered (column, stat) like the table
+        stats.columns = [f"{column}_{stat}" for column, stat in stats.columns]
+        stats.insert(0, 'last_ts_ms', grouped['ts_ms'].max())
+        stats.insert(0, 'count', grouped.size())
+        stats = stats.reset_index()
+        # tolist() converts to Python scalars, which is what sqlite3 can bind
+        rows = zip(*(stats[column].tolist() for column in stats.columns))
+        conn.executemany(rollup_upsert_sql(table), rows)
+
+
+def rebuild_rollups(conn, chunk_size=50000):
+    """Recompute every rollup table from sensor_readings. The caller commits."""
+    for table in ROLLUPS:
+        conn.execute(f"DELETE FROM {table}")
+    cursor = conn.execute(f'''
+        SELECT device_id, ts_ms, {', '.join(READING_COLUMNS)}
+        FROM sensor_readings
+        WHERE ts_ms IS NOT NULL
+        ORDER BY ts_ms
+    ''')
+    total = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        update_rollups(conn, [(row[0], row[1], row[2:]) for row in rows])
+        total += len(rows)
+    return total
+
+
+def select_resolution(start_ms, end_ms, min_points):
+    """
+    Pick the coarsest table that still yields at least min_points buckets over [start_ms, end_ms].
+    Falls back to the raw sensor_readings table for short ranges.
+    """
+    for table, width in ROLLUPS.items():
+        if (end_ms - start_ms) / width >= min_points:
+            return table
+    return 'sensor_readings'
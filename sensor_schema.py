@@ -0,0 +1,82 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Declarative schema of one sensor record, in sendBluetoothData field order.
+# It drives the line decoder, range validation, the sensor_readings DDL and the dashboard's column lists.
+# low/high are physically possible bounds, not alert thresholds: a value outside them is a sensor or
+# transmission fault and the reading is rejected rather than stored.
+Field = namedtuple('Field', ['name', 'title', 'unit', 'type', 'low', 'high'])
+
+FIELDS = [
+    Field('temperature', 'Temperature', '°C', 'float', -40, 80),  # DHT22 operating range
+    Field('humidity', 'Humidity', '%', 'float', 0, 100),
+    Field('co_level', 'CO Level', 'ppm', 'float', 0, 5000),  # MQ-7 tops out at 2000 ppm before scaling
+    Field('heat_index', 'Heat Index', '°F', 'float', -100, 250),
+    Field('air_quality_index', 'Air Quality Index', 'AQI', 'float', 0, 500),
+    Field('mean_heat_index', 'Mean Heat Index', '°F', 'float', -100, 250),
+    Field('std_dev_heat_index', 'Heat Index Std Dev', '°F', 'float', 0, 350),
+    Field('mean_aqi', 'Mean AQI', 'AQI', 'float', 0, 500),
+    Field('std_dev_aqi', 'AQI Std Dev', 'AQI', 'float', 0, 500),
+]
+
+# Field type -> SQLite column type, Arrow type. Decoded readings are always float64 arrays.
+SQL_TYPES = {'float': 'REAL', 'int': 'INTEGER'}
+ARROW_TYPES = {'float': 'float64', 'int': 'int64'}
+
+READING_COLUMNS = [field.name for field in FIELDS]
+FIELD_COUNT = len(FIELDS)
+LOW = np.array([field.low for field in FIELDS], dtype=np.float64)
+HIGH = np.array([field.high for field in FIELDS], dtype=np.float64)
+
+# A data line starts like a number; firmware messages such as "Failed to read from the DHT sensor!" do not
+_NUMBER_START = frozenset('+-.0123456789')
+
+
+def create_table_sql(table='sensor_readings'):
+    """CREATE TABLE statement for the raw readings table: real_time followed by every field."""
+    columns = ['real_time TEXT'] + [f"{field.name} {SQL_TYPES[field.type]}" for field in FIELDS]
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ',\n    '.join(columns) + "\n)"
+
+
+def is_data_line(line):
+    """Cheap check that a line could be a record: the right number of fields and a numeric start."""
+    return line[:1] in _NUMBER_START and line.count(',') == FIELD_COUNT - 1
+
+
+def _parse_line(line):
+    try:
+        return [float(value) for value in line.split(',')]
+    except ValueError:
+        return [np.nan] * FIELD_COUNT
+
+
+def decode_lines(lines):
+    """
+    Parse CSV lines into an (n, FIELD_COUNT) float array, skipping lines that cannot be records.
+    All candidate lines are converted by NumPy's C parser in one call; only a batch containing a
+    malformed number falls back to line by line parsing, where that line's row becomes NaN.
+    Returns (values, skipped) with skipped the number of lines rejected before parsing.
+    """
+    candidates = [line for line in lines if is_data_line(line)]
+    skipped = len(lines) - len(candidates)
+    if not candidates:
+        return np.empty((0, FIELD_COUNT)), skipped
+    try:
+        return np.loadtxt(candidates, delimiter=',', dtype=np.float64, ndmin=2), skipped
+    except ValueError:
+        return np.array([_parse_line(line) for line in candidates]), skipped
+
+
+def validate(values, check_ranges=True):
+    """
+    Check an (n, FIELD_COUNT) array against the schema.
+    Returns (valid, out_of_range): a boolean row mask, and per field the number of finite values
+    outside its bounds. Rows with a NaN (unparsable) field are invalid but not counted as out of range.
+    With check_ranges=False only the NaN rows are invalid.
+    """
+    if not check_ranges:
+        return ~np.isnan(values).any(axis=1), dict.fromkeys(READING_COLUMNS, 0)
+    in_range = (values >= LOW) & (values <= HIGH)
+    out_of_range = (~in_range & ~np.isnan(values)).sum(axis=0)
+    return in_range.all(axis=1), dict(zip(READING_COLUMNS, out_of_range.tolist()))
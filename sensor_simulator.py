@@ -0,0 +1,178 @@
+import argparse
+import os
+import pty
+import random
+import threading
+import time
+import tty
+
+from wire_protocol import encode_frame
+
+
+def sample_reading(seq=None):
+    """Nine plausible values in sendBluetoothData order. With seq, the last field carries it instead."""
+    temperature = random.uniform(20, 40)
+    humidity = random.uniform(30, 90)
+    co_level = random.uniform(0, 60)
+    heat_index = random.uniform(70, 110)
+    air_quality_index = float(random.randint(0, 200))
+    values = [temperature, humidity, co_level, heat_index, air_quality_index,
+              heat_index + random.uniform(-2, 2), random.uniform(0, 3),
+              max(0.0, air_quality_index + random.uniform(-5, 5)), random.uniform(0, 10)]
+    if seq is not None:
+        values[8] = float(seq)
+    return values
+
+
+def format_line(values):
+    """Format a reading the way Arduino's Serial.print(float) does: two decimals, AQI as an integer."""
+    fields = [f"{value:.2f}" for value in values]
+    fields[4] = str(int(values[4]))
+    if values[8].is_integer():
+        fields[8] = str(int(values[8]))  # Sequence numbers stay exact
+    return (','.join(fields) + '\r\n').encode()
+
+
+def corrupt(record):
+    """Damage a record the way a noisy Bluetooth link does: flipped bytes, truncation or injected junk."""
+    kind = random.choice(['flip', 'truncate', 'junk'])
+    data = bytearray(record)
+    if kind == 'flip':
+        for _ in range(random.randint(1, 3)):
+            data[random.randrange(len(data))] ^= 1 << random.randrange(8)
+    elif kind == 'truncate':
+        del data[random.randrange(1, len(data)):]
+    else:
+        data[random.randrange(len(data)):0] = os.urandom(random.randint(1, 8))
+    return bytes(data)
+
+
+class SimulatedSensor:
+    """
+    One simulated HC-06 station on a pseudo-terminal.
+    The pty is exposed through a stable symlink so the ingest script can reopen it after a
+    simulated disconnect, which closes the pty and creates a new one behind the same link.
+    """
+
+    def __init__(self, link, rate=0.2, jitter=0.0, corruption=0.0, disconnect_every=0.0,
+                 disconnect_for=2.0, binary=False, with_seq=False):
+        self.link = link
+        self.rate = rate
+        self.jitter = jitter
+        self.corruption = corruption
+        self.disconnect_every = disconnect_every
+        self.disconnect_for = disconnect_for
+        self.binary = binary
+        self.with_seq = with_seq
+        self.master = None
+        self.sent = 0
+        self.corrupted = 0
+        self.disconnects = 0
+        self.send_times = {}  # seq -> time.time() when the record was written, with with_seq
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def open(self):
+        """Create a fresh pty and point the link at it."""
+        master, slave = pty.openpty()
+        tty.setraw(slave)  # No echo or newline translation, like a real serial port
+        tmp_link = f"{self.link}.tmp"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(os.ttyname(slave), tmp_link)
+        os.replace(tmp_link, self.link)
+        self.master, self.slave = master, slave
+
+    def close(self):
+        if self.master is not None:
+            os.close(self.master)
+            os.close(self.slave)
+            self.master = None
+
+    def start(self):
+        self.open()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.close()
+        if os.path.lexists(self.link):
+            os.remove(self.link)
+
+    def run(self):
+        period = 1 / self.rate
+        next_send = time.time()
+        next_disconnect = time.time() + self.disconnect_every if self.disconnect_every else None
+        seq = 0
+        while not self.stop_event.is_set():
+            now = time.time()
+            if next_disconnect and now >= next_disconnect:
+                self.close()
+                self.disconnects += 1
+                self.stop_event.wait(self.disconnect_for)
+                self.open()
+                next_disconnect = time.time() + self.disconnect_every
+                next_send = time.time()
+
+            # Fixed schedule with optional jitter; if the reader falls behind, writes block on the pty
+            delay = next_send - time.time()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            seq += 1
+            values = sample_reading(seq if self.with_seq else None)
+            record = encode_frame(seq, values) if self.binary else format_line(values)
+            if self.corruption and random.random() < self.corruption:
+                record = corrupt(record)
+                self.corrupted += 1
+            try:
+                os.write(self.master, record)
+            except OSError:
+                continue
+            if self.with_seq:
+                self.send_times[seq] = time.time()
+            self.sent += 1
+            next_send += period * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate HC-06 sensor stations on pseudo-terminals.")
+    parser.add_argument('--devices', type=int, default=1, help="Number of simulated stations")
+    parser.add_argument('--link-dir', default='/tmp', help="Directory for the sensorN port links")
+    parser.add_argument('--rate', type=float, default=0.2, help="Readings per second per station")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Relative jitter of the send period (0-1)")
+    parser.add_argument('--corrupt', type=float, default=0.0, help="Probability that a record is damaged")
+    parser.add_argument('--disconnect-every', type=float, default=0.0,
+                        help="Seconds between simulated disconnects (0 disables)")
+    parser.add_argument('--disconnect-for', type=float, default=2.0, help="Seconds each disconnect lasts")
+    parser.add_argument('--binary', action='store_true', help="Send binary frames instead of CSV lines")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sensors = [
+        SimulatedSensor(os.path.join(args.link_dir, f"sensor{i}"), args.rate, args.jitter, args.corrupt,
+                        args.disconnect_every, args.disconnect_for, args.binary).start()
+        for i in range(args.devices)
+    ]
+    ports = ' '.join(f"--device {sensor.link}=sim{i}" for i, sensor in enumerate(sensors))
+    print(f"Simulating {args.devices} station(s). Run the ingest script with: {ports}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Simulator stopped.")
+    finally:
+        for sensor in sensors:
+            sensor.stop()
+        print(f"Sent {sum(sensor.sent for sensor in sensors)} readings "
+              f"({sum(sensor.corrupted for sensor in sensors)} corrupted, "
+              f"{sum(sensor.disconnects for sensor in sensors)} disconnects).")
+
+
+if __name__ == '__main__':
+    main()
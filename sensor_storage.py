@@ -0,0 +1,309 @@
+import os
+from contextlib import nullcontext
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+import sensor_archive
+from sensor_db import READING_COLUMNS, ROLLUPS, ROLLUP_STATS, local_datetimes
+
+# Field order of the rows passed to append(), as batched by the ingest script
+ROW_COLUMNS = ['real_time'] + READING_COLUMNS + ['ts_ms', 'device_id']
+
+# Columns of the frames returned by latest_n(), earliest_n() and range(), oldest row first
+FRAME_COLUMNS = ['real_time', 'ts_ms', 'device_id'] + READING_COLUMNS
+
+# Columns of the frames returned by aggregate(), like the rollup tables with ts_ms at the bucket start
+AGGREGATE_COLUMNS = ['ts_ms', 'device_id', 'count'] + [
+    f"{column}_{stat}" for column in READING_COLUMNS for stat in ROLLUP_STATS
+]
+
+
+class Storage:
+    """
+    Where raw readings live. Writers call append() and then commit() once the batch's other
+    SQLite work (rollups, rolling statistics) is committed, or rollback() if it failed.
+    Readers call latest_n(), earliest_n(), range(), aggregate() and iter_chunks().
+    """
+
+    def append(self, rows):
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def devices(self):
+        """Device ids with stored readings."""
+        raise NotImplementedError
+
+    def latest_n(self, n, start=None, end=None, devices=None):
+        """The newest n readings in [start, end] (epoch ms), oldest first."""
+        raise NotImplementedError
+
+    def earliest_n(self, n, start=None, end=None, devices=None):
+        """
+        The oldest n readings in [start, end] (epoch ms), ordered by ts_ms, device_id and then
+        arrival. The order is stable between calls, so it can be paged through.
+        """
+        raise NotImplementedError
+
+    def range(self, start, end, devices=None):
+        """Every reading in [start, end] (epoch ms), oldest first."""
+        raise NotImplementedError
+
+    def iter_chunks(self, columns, start=None, end=None, devices=None, chunk_rows=10000):
+        """Stream readings as lists of row tuples of the given columns."""
+        raise NotImplementedError
+
+    def aggregate(self, start, end, bucket_ms, devices=None):
+        """
+        Per-bucket statistics shaped like the rollup tables: ts_ms (bucket start), device_id, count
+        and {column}_{stat} for ROLLUP_STATS. Computed from range() unless a backend knows better.
+        """
+        df = self.range(start, end, devices)
+        if df.empty:
+            return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+        grouped = df.assign(bucket=df['ts_ms'] - df['ts_ms'] % bucket_ms).groupby(['bucket', 'device_id'])
+        stats = grouped[READING_COLUMNS].agg(ROLLUP_STATS)
+        stats.columns = [f"{column}_{stat}" for column, stat in stats.columns]
+        stats.insert(0, 'count', grouped.size())
+        return stats.reset_index().rename(columns={'bucket': 'ts_ms'}).sort_values('ts_ms', ignore_index=True)
+
+
+class SQLiteStorage(Storage):
+    """
+    The sensor_readings table, plus the Parquet archive for reads.
+    connect() returns a context manager yielding a connection, e.g. a pool checkout;
+    writes stay inside the caller's transaction.
+    """
+
+    def __init__(self, connect, archive_dir=None):
+        self.connect = connect
+        self.archive_dir = archive_dir
+
+    @classmethod
+    def for_connection(cls, conn, archive_dir=None):
+        return cls(lambda: nullcontext(conn), archive_dir)
+
+    def append(self, rows):
+        with self.connect() as conn:
+            conn.executemany(f'''
+                INSERT INTO sensor_readings ({', '.join(ROW_COLUMNS)})
+                VALUES ({', '.join('?' * len(ROW_COLUMNS))})
+            ''', rows)
+
+    def devices(self):
+        with self.connect() as conn:
+            rows = conn.execute("SELECT DISTINCT device_id FROM sensor_readings ORDER BY device_id").fetchall()
+        return [row[0] for row in rows]
+
+    def latest_n(self, n, start=None, end=None, devices=None):
+        with self.connect() as conn:
+            return sensor_archive.query_readings(conn, self.archive_dir, FRAME_COLUMNS, start, end, devices, n)
+
+    def earliest_n(self, n, start=None, end=None, devices=None):
+        with self.connect() as conn:
+            return sensor_archive.first_readings(conn, self.archive_dir, FRAME_COLUMNS, start, end, devices, n)
+
+    def range(self, start, end, devices=None):
+        with self.connect() as conn:
+            return sensor_archive.query_readings(conn, self.archive_dir, FRAME_COLUMNS, start, end, devices)
+
+    def iter_chunks(self, columns, start=None, end=None, devices=None, chunk_rows=10000):
+        with self.connect() as conn:
+            yield from sensor_archive.iter_readings(conn, self.archive_dir, columns, start, end, devices, chunk_rows)
+
+    def aggregate(self, start, end, bucket_ms, devices=None):
+        # The rollup tables already hold these buckets for the standard widths
+        table = next((table for table, width in ROLLUPS.items() if width == bucket_ms), None)
+        if table is None:
+            return super().aggregate(start, end, bucket_ms, devices)
+        columns = ['bucket_ms AS ts_ms', 'device_id', 'count']
+        columns += [f"{column}_{stat}" for column in READING_COLUMNS for stat in ROLLUP_STATS]
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE bucket_ms BETWEEN ? AND ?"
+        params = [start, end]
+        if devices:
+            query += f" AND device_id IN ({', '.join('?' * len(devices))})"
+            params += list(devices)
+        with self.connect() as conn:
+            return pd.read_sql_query(query + " ORDER BY bucket_ms", conn, params=params)
+
+
+class MmapStorage(Storage):
+    """
+    Append-only column store: one directory per device holding one raw little-endian file per
+    column (ts_ms as int64, readings as float64) and a committed row count. Readers map the
+    files read-only, so latest-N and range reads are binary searches and array slices with no
+    SQL. Rows past the committed count are invisible and are discarded by rollback() or the
+    next writer. Readings are assumed to arrive in time order per device.
+    """
+
+    COLUMNS = {'ts_ms': np.dtype('<i8'), **{column: np.dtype('<f8') for column in READING_COLUMNS}}
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}  # device -> {column: open append file}, writer side
+        self.pending = {}  # device -> rows appended since the last commit
+        self.maps = {}  # (device, column) -> np.memmap, reader side
+
+    def device_dir(self, device):
+        return os.path.join(self.directory, quote(device, safe=''))
+
+    def devices(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(unquote(name) for name in os.listdir(self.directory))
+
+    def committed(self, device):
+        try:
+            with open(os.path.join(self.device_dir(device), 'count'), 'rb') as f:
+                data = f.read(8)
+        except FileNotFoundError:
+            return 0
+        return int.from_bytes(data, 'little') if len(data) == 8 else 0
+
+    def open_device(self, device):
+        """Open a device's column files for appending, dropping rows that were never committed."""
+        path = self.device_dir(device)
+        os.makedirs(path, exist_ok=True)
+        count = self.committed(device)
+        files = {}
+        for column, dtype in self.COLUMNS.items():
+            f = open(os.path.join(path, f"{column}.bin"), 'ab')
+            f.truncate(count * dtype.itemsize)
+            files[column] = f
+        self.files[device] = files
+        self.pending[device] = 0
+        return files
+
+    def append(self, rows):
+        columns = list(zip(*rows))
+        devices = np.asarray(columns[-1], dtype=object)
+        for device in dict.fromkeys(columns[-1]):
+            files = self.files.get(device) or self.open_device(device)
+            mask = devices == device
+            files['ts_ms'].write(np.asarray(columns[-2], dtype='<i8')[mask].tobytes())
+            for i, column in enumerate(READING_COLUMNS, start=1):
+                files[column].write(np.asarray(columns[i], dtype='<f8')[mask].tobytes())
+            self.pending[device] += int(mask.sum())
+
+    def commit(self):
+        """Make appended rows visible: flush every column, then publish the new row count."""
+        for device, added in self.pending.items():
+            if not added:
+                continue
+            for f in self.files[device].values():
+                f.flush()
+            count = self.committed(device) + added
+            fd = os.open(os.path.join(self.device_dir(device), 'count'), os.O_WRONLY | os.O_CREAT)
+            try:
+                os.pwrite(fd, count.to_bytes(8, 'little'), 0)  # One aligned 8-byte write
+            finally:
+                os.close(fd)
+            self.pending[device] = 0
+
+    def rollback(self):
+        for device, added in self.pending.items():
+            if added:
+                for f in self.files.pop(device).values():
+                    f.close()
+                self.open_device(device)  # Truncates back to the committed count
+
+    def column(self, device, column, count):
+        """The first count values of one column, as a read-only memory map."""
+        key = (device, column)
+        array = self.maps.get(key)
+        if array is None or len(array) < count:
+            # Remap the whole file; appends only ever grow it
+            array = np.memmap(os.path.join(self.device_dir(device), f"{column}.bin"),
+                              dtype=self.COLUMNS[column], mode='r')
+            self.maps[key] = array
+        return array[:count]
+
+    def slices(self, start=None, end=None, devices=None, n=None):
+        """(device, count, lo, hi) row ranges per device for [start, end], the last n of each if given."""
+        found = []
+        for device in devices or self.devices():
+            count = self.committed(device)
+            if not count:
+                continue
+            ts = self.column(device, 'ts_ms', count)
+            lo = 0 if start is None else int(np.searchsorted(ts, start, 'left'))
+            hi = count if end is None else int(np.searchsorted(ts, end, 'right'))
+            if n is not None:
+                lo = max(lo, hi - n)
+            if hi > lo:
+                found.append((device, count, lo, hi))
+        return found
+
+    def frame(self, parts, last=None):
+        """
+        One DataFrame over the given row ranges, oldest first, built once from the concatenated
+        slices; with last, only the newest `last` rows.
+        """
+        if not parts:
+            return pd.DataFrame(columns=FRAME_COLUMNS)
+        data = {column: np.concatenate([self.column(device, column, count)[lo:hi]
+                                        for device, count, lo, hi in parts])
+                for column in self.COLUMNS}
+        data['device_id'] = np.repeat(np.array([part[0] for part in parts], dtype=object),
+                                      [hi - lo for _, _, lo, hi in parts])
+        if len(parts) > 1 or last is not None:
+            order = np.argsort(data['ts_ms'], kind='stable') if len(parts) > 1 else slice(None)
+            data = {column: values[order][-last:] if last else values[order] for column, values in data.items()}
+        # real_time is derived from ts_ms for the rows returned only, as local time like the SQLite column
+        local = local_datetimes(data['ts_ms'])
+        data['real_time'] = np.char.replace(np.datetime_as_string(local, unit='s'), 'T', ' ')
+        return pd.DataFrame({column: data[column] for column in FRAME_COLUMNS})
+
+    def latest_n(self, n, start=None, end=None, devices=None):
+        return self.frame(self.slices(start, end, devices, n), last=n)
+
+    def earliest_n(self, n, start=None, end=None, devices=None):
+        # The first n of each device, merged by a stable sort over devices in name order
+        parts = [(device, count, lo, min(hi, lo + n)) for device, count, lo, hi in self.slices(start, end, devices)]
+        return self.frame(parts).iloc[:n].reset_index(drop=True)
+
+    def range(self, start, end, devices=None):
+        return self.frame(self.slices(start, end, devices))
+
+    def iter_chunks(self, columns, start=None, end=None, devices=None, chunk_rows=10000):
+        # Device by device, each in time order
+        for device, count, lo, hi in self.slices(start, end, devices):
+            for chunk_lo in range(lo, hi, chunk_rows):
+                df = self.frame([(device, count, chunk_lo, min(chunk_lo + chunk_rows, hi))])
+                yield list(df[list(columns)].itertuples(index=False, name=None))
+
+    def aggregate(self, start, end, bucket_ms, devices=None):
+        """Bucket statistics straight from the mapped arrays with ufunc.reduceat."""
+        frames = []
+        for device, count, lo, hi in self.slices(start, end, devices):
+            ts = self.column(device, 'ts_ms', count)[lo:hi]
+            buckets = ts - ts % bucket_ms
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            ends = np.r_[starts[1:], len(ts)]
+            data = {'ts_ms': buckets[starts], 'device_id': device, 'count': ends - starts}
+            for column in READING_COLUMNS:
+                values = self.column(device, column, count)[lo:hi]
+                data[f"{column}_min"] = np.minimum.reduceat(values, starts)
+                data[f"{column}_max"] = np.maximum.reduceat(values, starts)
+                data[f"{column}_mean"] = np.add.reduceat(values, starts) / (ends - starts)
+                data[f"{column}_last"] = values[ends - 1]
+            frames.append(pd.DataFrame(data))
+        if not frames:
+            return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values('ts_ms', kind='stable', ignore_index=True)
+
+
+# Backends selectable with --storage, defaulting to SENSOR_STORAGE
+STORAGE_BACKENDS = ['sqlite', 'mmap']
+STORAGE_BACKEND = os.environ.get('SENSOR_STORAGE', 'sqlite')
+
+
+def storage_dir_for(db_path):
+    """Column store directory: SENSOR_STORAGE_DIR, or a directory next to the database."""
+    return os.path.expanduser(os.environ.get('SENSOR_STORAGE_DIR', os.path.splitext(db_path)[0] + '_columns'))
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def ingest():
+    """The ingest script, imported as a module (its file name is not importable)."""
+    spec = importlib.util.spec_from_file_location('ingest', os.path.join(ROOT, 'Serial Communication and storage.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,174 @@
+import asyncio
+import collections
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from reading_spool import ReadingSpool
+from wire_protocol import encode_frame
+
+
+def pipeline(ingest, tmp_path, monkeypatch, **settings):
+    """Point the ingest script's writer at a fresh database and spool, with fresh pipeline state."""
+    monkeypatch.setattr(ingest, 'db_path', str(tmp_path / 'readings.db'))
+    monkeypatch.setattr(ingest, 'spool', ReadingSpool(str(tmp_path / 'spool.jsonl')))
+    monkeypatch.setattr(ingest, 'storage_backend', 'sqlite')
+    monkeypatch.setattr(ingest, 'notify_port', 0)
+    monkeypatch.setattr(ingest, 'metrics_interval', 0)
+    monkeypatch.setattr(ingest, 'readings_queue', None)
+    monkeypatch.setattr(ingest, 'overflow', collections.deque())
+    monkeypatch.setattr(ingest, 'stop_event', threading.Event())
+    monkeypatch.setattr(ingest, 'readings_batch', [])
+    monkeypatch.setattr(ingest, 'database_retry_at', 0.0)
+    for name, value in settings.items():
+        monkeypatch.setattr(ingest, name, value)
+
+
+def stored_ts_ms(ingest):
+    conn = sqlite3.connect(ingest.db_path)
+    stored = [ts_ms for ts_ms, in conn.execute("SELECT ts_ms FROM sensor_readings ORDER BY rowid")]
+    conn.close()
+    return stored
+
+
+def test_overflow_keeps_write_order(ingest, tmp_path, monkeypatch):
+    pipeline(ingest, tmp_path, monkeypatch, queue_size=8, batch_size=4)
+    processed = []
+    process_reading = ingest.process_reading
+    monkeypatch.setattr(ingest, 'process_reading', lambda row: processed.append(row[10]) or process_reading(row))
+    # A slow database, so the readers outrun the writer and fill the queue
+    update_rollups = ingest.sensor_db.update_rollups
+    monkeypatch.setattr(ingest.sensor_db, 'update_rollups',
+                        lambda conn, readings: time.sleep(0.01) or update_rollups(conn, readings))
+
+    writer = ingest.start_writer()
+    values = np.tile([25.0, 50.0, 3.0, 80.0, 40.0, 80.0, 1.0, 40.0, 1.0], (3, 1))
+    for i in range(100):
+        ingest.enqueue_readings(values, f"dev{i % 2}")
+        time.sleep(0.001)
+    ingest.stop_writer(writer)
+
+    assert ingest.ingest_metrics['spooled'] > 0
+    stored = stored_ts_ms(ingest)
+    assert len(stored) == 300
+    assert stored == sorted(stored)
+    assert processed == stored
+
+
+def test_locked_database_spools_at_line_rate(ingest, tmp_path, monkeypatch):
+    pipeline(ingest, tmp_path, monkeypatch, busy_timeout_ms=500, spool_retry_interval=1,
+             flush_interval_ms=100, batch_size=50)
+    values = np.tile([25.0, 50.0, 3.0, 80.0, 40.0, 80.0, 1.0, 40.0, 1.0], (5, 1))
+    writer = ingest.start_writer()
+    time.sleep(0.5)  # Database created and migrated
+
+    lock = sqlite3.connect(ingest.db_path, isolation_level=None)
+    lock.execute("BEGIN EXCLUSIVE")
+    sent = 0
+    started = time.time()
+    while time.time() - started < 3:
+        ingest.enqueue_readings(values)  # 500 readings per second
+        sent += len(values)
+        time.sleep(0.01)
+    # Everything but the last busy timeout and flush interval's worth has reached the spool file
+    with open(ingest.spool.path, 'rb') as f:
+        spooled = f.read().count(b'\n')
+    assert spooled >= sent - 500 * (0.5 + 0.1 + 0.3)
+    assert len(ingest.overflow) == 0
+    lock.rollback()
+    lock.close()
+
+    ingest.stop_writer(writer)
+    stored = stored_ts_ms(ingest)
+    assert len(stored) == sent
+    assert stored == sorted(stored)
+
+
+def test_storage_os_error_spools_the_batch(ingest, tmp_path, monkeypatch):
+    pipeline(ingest, tmp_path, monkeypatch, storage_backend='mmap', storage_dir=str(tmp_path / 'columns'))
+    failures = []
+    commit = ingest.sensor_storage.MmapStorage.commit
+
+    def commit_once_failing(self):
+        if not failures:
+            failures.append(True)
+            raise OSError(28, 'No space left on device')
+        commit(self)
+    monkeypatch.setattr(ingest.sensor_storage.MmapStorage, 'commit', commit_once_failing)
+
+    writer = ingest.start_writer()
+    ingest.enqueue_readings(np.tile([25.0, 50.0, 3.0, 80.0, 40.0, 80.0, 1.0, 40.0, 1.0], (10, 1)), 'dev0')
+    deadline = time.time() + 5
+    while not ingest.spool.pending_rows and time.time() < deadline:
+        time.sleep(0.01)
+    assert ingest.spool.pending_rows == 10
+    ingest.stop_writer(writer)  # Its last try replays the spool
+
+    assert failures and not writer.is_alive()
+    assert ingest.ingest_metrics['replayed'] >= 10
+    assert ingest.sensor_storage.MmapStorage(str(tmp_path / 'columns')).committed('dev0') == 10
+
+
+def test_port_without_fileno_is_polled(ingest, monkeypatch):
+    class WindowsPort:
+        """A port like pyserial's on Windows: no fileno(), only in_waiting and non-blocking reads."""
+        def __init__(self, port, baud_rate, timeout):
+            self.data = b''.join(encode_frame(seq, [25.0] * 9) for seq in range(5))
+            self.is_open = True
+
+        @property
+        def in_waiting(self):
+            return len(self.data)
+
+        def read(self, size):
+            chunk, self.data = self.data[:size], self.data[size:]
+            return chunk
+
+        def close(self):
+            self.is_open = False
+
+    queued = []
+    monkeypatch.setattr(ingest.serial, 'Serial', WindowsPort)
+    monkeypatch.setattr(ingest, 'present_ports', {'COM3'})
+    monkeypatch.setattr(ingest, 'enqueue_readings', lambda values, source: queued.extend(values) or len(values))
+
+    async def read_briefly():
+        try:
+            await asyncio.wait_for(ingest.read_device('COM3', 'dev0'), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(read_briefly())
+    assert len(queued) == 5
+
+
+def test_spool_reopens_with_pending_lines(tmp_path):
+    path = str(tmp_path / 'spool.jsonl')
+    spool = ReadingSpool(path)
+    spool.append([('2024-01-01 00:00:00', *[1.0] * 9, ts_ms, 'a') for ts_ms in range(5)])
+    _, _, end, lines = spool.read(2)
+    spool.advance(end, lines)
+    with open(path, 'ab') as f:
+        f.write(b'["r", "2024-01-01 00:00:00", 1.0')  # Torn append
+
+    reopened = ReadingSpool(path)
+    assert reopened.pending_rows == 3
+    assert [row[10] for row in reopened.read()[0]] == [2, 3, 4]
+
+
+def test_spool_skips_undecodable_lines(tmp_path):
+    path = str(tmp_path / 'spool.jsonl')
+    spool = ReadingSpool(path)
+    spool.append([('2024-01-01 00:00:00', *[1.0] * 9, 1, 'a')])
+    with open(path, 'ab') as f:
+        f.write(b'["r", "2024-01-\n7\n')  # A torn write followed by a line of the wrong shape
+    spool.append([('2024-01-01 00:00:00', *[1.0] * 9, 2, 'a')])
+
+    reopened = ReadingSpool(path)
+    readings, events, end, lines = reopened.read()
+    assert [row[10] for row in readings] == [1, 2]
+    assert lines == 4
+    reopened.advance(end, lines)
+    assert reopened.pending_rows == 0
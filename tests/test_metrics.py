@@ -0,0 +1,13 @@
+import metrics
+
+
+def test_label_values_and_help_are_escaped():
+    registry = []
+    counter = metrics.Counter('test_lines_total', 'Lines read\nfrom C:\\ports', ['source'], registry=registry)
+    counter.labels('dev "a"\\b\nc').inc(2)
+
+    assert metrics.render(registry).splitlines() == [
+        '# HELP test_lines_total Lines read\\nfrom C:\\\\ports',
+        '# TYPE test_lines_total counter',
+        'test_lines_total{source="dev \\"a\\"\\\\b\\nc"} 2',
+    ]
@@ -0,0 +1,59 @@
+import numpy as np
+
+READING = '25.10,50.00,3.00,80.00,40,80.50,1.00,40.00,1.00'
+
+
+def test_parse_log_chunk_keeps_valid_lines(ingest):
+    df = ingest.parse_log_chunk(f"{READING}\n1700000000,{READING}\n")
+    assert len(df) == 2
+    assert np.isnan(df['ts_ms'].iloc[0])
+    assert df['ts_ms'].iloc[1] == 1700000000000
+
+
+def test_parse_log_chunk_drops_truncated_lines(ingest):
+    df = ingest.parse_log_chunk(f"{READING}\n25.10,50.00,3.00\n{READING[:-5]}\n{READING}\n")
+    assert list(df.index) == [0, 3]
+
+
+def test_parse_log_chunk_drops_garbage_lines(ingest):
+    lines = [f"garbage,{READING.partition(',')[2]}", READING.replace('50.00', '5#0'),
+             f"not a time,{READING}", 'Failed to read from DHT sensor!', READING]
+    df = ingest.parse_log_chunk('\n'.join(lines))
+    assert list(df.index) == [4]
+    assert df['humidity'].dtype == np.float64
+
+
+def test_parse_log_chunk_drops_quoted_lines(ingest):
+    df = ingest.parse_log_chunk(f'"{READING}\n{READING}\n"25.10",{READING.partition(",")[2]}\n{READING}\n')
+    assert list(df.index) == [1, 3]
+
+
+def test_replay_twice_stores_readings_once(ingest, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'db_path', str(tmp_path / 'readings.db'))
+    monkeypatch.setattr(ingest, 'notify_port', 0)
+    log = tmp_path / 'capture.log'
+    log.write_text(''.join(f"{1700000000 + i * 5},{READING}\n" for i in range(20)) + f"{READING}\n")
+
+    ingest.replay_logs([str(log)])
+    ingest.replay_logs([str(log)])
+
+    conn = ingest.sqlite3.connect(ingest.db_path)
+    assert conn.execute("SELECT count(*) FROM sensor_readings").fetchone()[0] == 21
+    assert conn.execute("SELECT sum(count) FROM sensor_readings_1d").fetchone()[0] == 21
+    conn.close()
+
+
+def test_log_timestamps_follow_daylight_saving_time(ingest, monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Berlin')
+    ingest.time.tzset()
+    try:
+        stamps = ingest.pd.Series(['2024-03-30 12:00:00', '2024-04-01 12:00:00', '2024-10-27 02:30:00'])
+        ts_ms = ingest.log_timestamps_ms(stamps)
+        local = ingest.sensor_db.local_datetimes(ts_ms.to_numpy())
+    finally:
+        monkeypatch.undo()
+        ingest.time.tzset()
+    # 11:00 UTC in winter time, 10:00 UTC in summer time; the repeated 02:30 is the later one, as in SQLite
+    assert ts_ms.tolist() == [1711796400000, 1711965600000, 1729992600000]
+    assert [str(value) for value in local.astype('datetime64[s]')] == [
+        '2024-03-30T12:00:00', '2024-04-01T12:00:00', '2024-10-27T02:30:00']
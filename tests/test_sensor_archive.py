@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+import sensor_db
+import sensor_schema
+
+pytest.importorskip('pyarrow')
+import sensor_archive  # noqa: E402
+
+DAY_MS = sensor_archive.DAY_MS
+COLUMNS = ['real_time'] + sensor_db.READING_COLUMNS + ['ts_ms', 'device_id']
+
+
+def insert(conn, ts_ms, value):
+    conn.execute(f"INSERT INTO sensor_readings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                 ('2024-01-01 00:00:00', value, *[1.0] * 8, ts_ms, 'a'))
+    conn.commit()
+
+
+def test_late_reading_keeps_archived_readings(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'readings.db')
+    conn.execute(sensor_schema.create_table_sql())
+    sensor_db.migrate(conn)
+    day = 100 * DAY_MS
+    for value in (20.0, 21.0, 22.0):  # One chunk: every reading at the same ts_ms
+        insert(conn, day + 1000, value)
+    archive_dir = str(tmp_path / 'archive')
+
+    assert sensor_archive.archive_readings(conn, archive_dir, day + DAY_MS) == (3, 1)
+    insert(conn, day + 1000, 23.0)  # Late reading for the archived day
+    assert sensor_archive.archive_readings(conn, archive_dir, day + DAY_MS) == (1, 1)
+
+    path = sensor_archive.partition_path(archive_dir, day)
+    assert sorted(sensor_archive.read_partition(path)['temperature']) == [20.0, 21.0, 22.0, 23.0]
+
+
+def test_interrupted_archive_run_is_not_duplicated(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'readings.db')
+    conn.execute(sensor_schema.create_table_sql())
+    sensor_db.migrate(conn)
+    day = 100 * DAY_MS
+    insert(conn, day + 1000, 20.0)
+    insert(conn, day + 2000, 21.0)
+    archive_dir = str(tmp_path / 'archive')
+    sensor_archive.archive_readings(conn, archive_dir, day + DAY_MS)
+    # As if the file had been written but the DELETE never committed
+    for value, ts_ms in ((20.0, day + 1000), (21.0, day + 2000)):
+        insert(conn, ts_ms, value)
+
+    sensor_archive.archive_readings(conn, archive_dir, day + DAY_MS)
+    assert len(sensor_archive.read_partition(sensor_archive.partition_path(archive_dir, day))) == 2
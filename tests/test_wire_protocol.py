@@ -0,0 +1,58 @@
+import pytest
+
+from wire_protocol import FRAME_SIZE, Frame, RecordDecoder, encode_frame
+
+VALUES = [25.5, 50.0, 3.0, 80.0, 40.0, 80.5, 1.0, 40.0, 1.0]
+LINE = b'25.50,50.00,3.00,80.00,40,80.50,1.00,40.00,1.00\r\n'
+
+
+def test_frame_round_trip():
+    frame = encode_frame(7, VALUES)
+    assert len(frame) == FRAME_SIZE
+    assert RecordDecoder().feed(frame) == [Frame(7, VALUES)]
+
+
+def test_encode_frame_needs_nine_values():
+    with pytest.raises(ValueError):
+        encode_frame(1, VALUES[:8])
+
+
+def test_frames_split_across_reads():
+    decoder = RecordDecoder()
+    data = encode_frame(1, VALUES) + LINE + encode_frame(2, VALUES)
+    records = [record for i in range(0, len(data), 5) for record in decoder.feed(data[i:i + 5])]
+    assert records == [Frame(1, VALUES), LINE.decode().strip(), Frame(2, VALUES)]
+
+
+def test_resync_after_garbage():
+    decoder = RecordDecoder()
+    garbage = b'\xaa\x00\xaa\xaa\x55\x13\x37'
+    records = decoder.feed(garbage + encode_frame(1, VALUES) + b'\xaa' + encode_frame(2, VALUES))
+    assert [record.seq for record in records] == [1, 2]
+    assert decoder.garbage_bytes > 0
+    assert not decoder.buffer
+
+
+def test_crc_mismatch_is_rejected():
+    decoder = RecordDecoder()
+    damaged = bytearray(encode_frame(1, VALUES))
+    damaged[10] ^= 0x01
+    records = decoder.feed(bytes(damaged) + encode_frame(2, VALUES))
+    assert records == [Frame(2, VALUES)]
+    assert decoder.crc_errors == 1
+
+
+def test_sequence_gaps_are_counted():
+    decoder = RecordDecoder()
+    decoder.feed(b''.join(encode_frame(seq, VALUES) for seq in (1, 2, 5, 6)))
+    assert decoder.frames == 4
+    assert decoder.dropped_frames == 2
+
+
+def test_sequence_gaps_across_the_wrap():
+    decoder = RecordDecoder()
+    decoder.feed(b''.join(encode_frame(seq, VALUES) for seq in (0xFFFE, 0xFFFF, 0, 1)))
+    assert decoder.dropped_frames == 0
+    decoder = RecordDecoder()
+    decoder.feed(encode_frame(0xFFFE, VALUES) + encode_frame(2, VALUES))  # 0xFFFF, 0 and 1 lost
+    assert decoder.dropped_frames == 3
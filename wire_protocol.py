@@ -0,0 +1,100 @@
+import binascii
+import struct
+from collections import namedtuple
+
+# Framed binary record, sent instead of the ~60 byte CSV line from sendBluetoothData:
+#   sync (0xAA 0x55) | sequence number (uint16) | nine float32 fields in CSV order | CRC-16
+# All fields are little-endian. The CRC is CRC-16/CCITT-FALSE over the sequence number and fields.
+FRAME_SYNC = b'\xaa\x55'
+FRAME = struct.Struct('<2sH9fH')
+FRAME_SIZE = FRAME.size  # 42 bytes
+FIELD_COUNT = 9
+
+# Text lines longer than this without a newline are treated as garbage and dropped
+MAX_LINE_LENGTH = 256
+
+Frame = namedtuple('Frame', ['seq', 'values'])
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), as computed by the firmware."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(seq, values):
+    """Reference encoder: pack one reading into a binary frame."""
+    if len(values) != FIELD_COUNT:
+        raise ValueError(f"Expected {FIELD_COUNT} values, got {len(values)}")
+    body = struct.pack('<H9f', seq & 0xFFFF, *values)
+    return FRAME_SYNC + body + struct.pack('<H', crc16(body))
+
+
+class RecordDecoder:
+    """
+    Split a serial byte stream into records, accepting CSV lines and binary frames interleaved.
+    feed() returns a list where each record is either a CSV line (str) or a Frame.
+    Frames that fail the CRC are skipped one byte at a time until the next sync marker,
+    so the decoder resynchronizes after line noise without losing the following records.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.last_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.dropped_frames = 0  # Gaps in the sequence numbers of valid frames
+        self.garbage_bytes = 0
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        records = []
+        pos = 0
+        end = len(buffer)
+        while pos < end:
+            if buffer[pos] == FRAME_SYNC[0]:
+                if end - pos < 2:
+                    break  # Wait for the second sync byte
+                if buffer[pos + 1] != FRAME_SYNC[1]:
+                    pos += 1
+                    self.garbage_bytes += 1
+                    continue
+                if end - pos < FRAME_SIZE:
+                    break  # Wait for the rest of the frame
+                frame = self._decode_frame(buffer, pos)
+                if frame is None:
+                    pos += 1
+                    self.garbage_bytes += 1
+                    continue
+                records.append(frame)
+                pos += FRAME_SIZE
+                continue
+
+            # Text: ASCII never contains the 0xAA sync byte, so a line ends at a newline or a frame
+            newline = buffer.find(b'\n', pos)
+            sync = buffer.find(FRAME_SYNC[:1], pos)
+            if sync != -1 and (newline == -1 or sync < newline):
+                self.garbage_bytes += sync - pos  # Partial line cut off by a frame
+                pos = sync
+                continue
+            if newline == -1:
+                if end - pos > MAX_LINE_LENGTH:
+                    self.garbage_bytes += end - pos
+                    pos = end
+                break  # Wait for the end of the line
+            records.append(buffer[pos:newline].decode('utf-8', errors='replace').strip())
+            pos = newline + 1
+        del buffer[:pos]
+        return records
+
+    def _decode_frame(self, buffer, pos):
+        """Return the Frame at pos, or None if its CRC does not match."""
+        _, seq, *values, crc = FRAME.unpack_from(buffer, pos)
+        if crc16(bytes(buffer[pos + 2:pos + FRAME_SIZE - 2])) != crc:
+            self.crc_errors += 1
+            return None
+        if self.last_seq is not None and seq != 0:  # Sequence 0 means the firmware restarted
+            self.dropped_frames += (seq - self.last_seq - 1) & 0xFFFF
+        self.last_seq = seq
+        self.frames += 1
+        return Frame(seq, values)